@@ -28,19 +28,33 @@ from routes.horario_sucursal_routes import ws_horario_sucursal
 from routes.distrito_routes import ws_distrito
 from routes.tarjeta_routes import ws_tarjeta
 from routes.venta_routes import ws_venta
+from routes.trabajo_routes import ws_trabajo
 from config import Config
+from conexionBD import registrar_unidad_trabajo
+from tools.cache_http import aplicar_politica_por_defecto
+from tools.compresion import registrar_compresion
+from tools.json_rapido import ProveedorJSONRapido
+from tools.registro import configurar_registro, registrar_id_request
+import logging
 import os
 
+# ✅ LOGGING CON NIVELES Y COLA (no bloquea el request)
+configurar_registro()
+log = logging.getLogger(__name__)
+
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 
+# ✅ JSON: orjson si está instalado; Decimal y fechas se serializan sin conversión manual
+app.json = ProveedorJSONRapido(app)
+
 try:
     from flasgger import Swagger
     swagger = Swagger(app)
-    print("✅ Flasgger cargado correctamente")
+    log.info("Flasgger cargado correctamente")
 except Exception as e:
-    print(f"⚠  Advertencia - Flasgger: {e}")
+    log.warning("Flasgger no disponible: %s", e)
 
 # ✅ IMPRIMIR CONFIGURACIÓN AL INICIAR
 Config.print_config()
@@ -57,6 +71,9 @@ CORS(app, resources={
     }
 })
 
+# ✅ COMPRESIÓN gzip/brotli: registrada primero para que su after_request corra al final
+registrar_compresion(app)
+
 @app.before_request
 def handle_preflight():
     if request.method == "OPTIONS":
@@ -74,20 +91,18 @@ def add_header(response):
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, PATCH, DELETE, OPTIONS'
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
     
-    # Cache control
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '-1'
-    return response
+    # ✅ CACHE CONTROL: no-store salvo los endpoints marcados con @cache_publico
+    return aplicar_politica_por_defecto(response)
+
+# ✅ UNA SOLA CONEXIÓN Y TRANSACCIÓN POR REQUEST
+registrar_unidad_trabajo(app)
+
+# ✅ ID DE REQUEST EN CADA LÍNEA DEL LOG (header X-Request-ID)
+registrar_id_request(app)
 
 app.secret_key = Config.SECRET_KEY
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 
-try:
-    app.json.ensure_ascii = False
-except Exception:
-    pass
-
 # Registrar blueprints
 app.register_blueprint(ws_usuario)
 app.register_blueprint(ws_marca)
@@ -117,6 +132,7 @@ app.register_blueprint(ws_tipo_modelo)
 app.register_blueprint(ws_empresa)
 app.register_blueprint(ws_rol)
 app.register_blueprint(ws_persona)
+app.register_blueprint(ws_trabajo)
 
 @app.route('/uploads/<path:filename>')
 def serve_uploads(filename):
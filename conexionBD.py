@@ -1,17 +1,416 @@
+import logging
+import os
+import threading
+import time
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+from flask import g, has_app_context, jsonify
 from config import Config
 
+log = logging.getLogger(__name__)
+
+
+def conectar():
+    """Conexión nueva y dedicada (fuera del pool), p. ej. para LISTEN"""
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        dbname=Config.DB_NAME,
+        port=Config.DB_PORT,
+        cursor_factory=psycopg2.extras.RealDictCursor
+    )
+
+
+# ==========================================
+# CURSORES TIPADOS
+# Typecasters que se registran SOLO en el cursor que los pide (el resto del
+# código sigue recibiendo Decimal y datetime). Con ellos la fila sale de
+# psycopg2 lista para el encoder JSON:
+# - NUMERIC -> float
+# - timestamp/date/time -> el texto ISO que ya envía Postgres (DateStyle ISO),
+#   sin pasar por datetime
+# - json/jsonb (opcional) -> el texto tal cual, para devolver json_agg sin
+#   parsearlo y volver a serializarlo
+# Los valores por defecto ('' / 0) se resuelven en el SQL con COALESCE.
+# ==========================================
+
+OID_NUMERIC = (1700,)
+OID_FECHAS = (1082, 1083, 1114, 1184, 1266)    # date, time, timestamp, timestamptz, timetz
+OID_JSON = (114, 3802)                         # json, jsonb
+
+
+def _numerico_float(valor, cursor):
+    return float(valor) if valor is not None else None
+
+
+def _texto(valor, cursor):
+    return valor
+
+
+NUMERICO_FLOAT = psycopg2.extensions.new_type(OID_NUMERIC, 'NUMERICO_FLOAT', _numerico_float)
+FECHA_TEXTO = psycopg2.extensions.new_type(OID_FECHAS, 'FECHA_TEXTO', _texto)
+JSON_TEXTO = psycopg2.extensions.new_type(OID_JSON, 'JSON_TEXTO', _texto)
+
+
+def cursor_tipado(conexion, json_crudo=False):
+    """
+    Cursor (RealDictCursor) de `conexion` cuyas columnas NUMERIC llegan como
+    float y las fechas como texto ISO. Con `json_crudo` las columnas json/jsonb
+    llegan como texto sin parsear.
+    """
+    cursor = conexion.cursor()
+    psycopg2.extensions.register_type(NUMERICO_FLOAT, cursor)
+    psycopg2.extensions.register_type(FECHA_TEXTO, cursor)
+    if json_crudo:
+        psycopg2.extensions.register_type(JSON_TEXTO, cursor)
+    return cursor
+
+
+class PoolAgotado(psycopg2.OperationalError):
+    """No se liberó ninguna conexión del pool dentro del tiempo de espera"""
+
+
+class PoolConexiones:
+    """
+    Pool acotado de conexiones a PostgreSQL.
+    Se crea uno por proceso (cada worker de gunicorn tiene el suyo).
+    """
+
+    def __init__(self, minimo, maximo, timeout, ping_despues):
+        self.minimo = max(0, minimo)
+        self.maximo = max(1, maximo, self.minimo)
+        self.timeout = timeout
+        self.ping_despues = ping_despues
+        self._libres = []       # [(conexion, instante_devolucion)]
+        self._prestadas = 0
+        self._cond = threading.Condition()
+
+        # ✅ PRECALENTAR EL MÍNIMO (si la BD no responde se abrirán bajo demanda)
+        try:
+            for _ in range(self.minimo):
+                self._libres.append((self._nueva(), time.monotonic()))
+        except psycopg2.Error as e:
+            log.warning("Pool: no se pudo precalentar: %s", e)
+
+    def _nueva(self):
+        return conectar()
+
+    def obtener(self):
+        """Entrega una conexión sana; espera hasta `timeout` si se alcanzó el máximo"""
+        limite = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._libres and self._prestadas >= self.maximo:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise PoolAgotado(f"Pool agotado ({self.maximo} conexiones en uso)")
+                self._cond.wait(restante)
+            libre = self._libres.pop() if self._libres else None
+            self._prestadas += 1
+
+        try:
+            if libre is not None:
+                conexion, devuelta_en = libre
+                if self._sana(conexion, devuelta_en):
+                    return conexion
+                self._cerrar(conexion)
+            return self._nueva()
+        except Exception:
+            self._liberar_cupo()
+            raise
+
+    def devolver(self, conexion):
+        """Deja la conexión sin transacción pendiente y la regresa al pool"""
+        reutilizable = self._resetear(conexion)
+        with self._cond:
+            self._prestadas -= 1
+            if reutilizable and len(self._libres) + self._prestadas < self.maximo:
+                self._libres.append((conexion, time.monotonic()))
+                conexion = None
+            self._cond.notify()
+        if conexion is not None:
+            self._cerrar(conexion)
+
+    def cerrar_todo(self):
+        with self._cond:
+            libres, self._libres = self._libres, []
+        for conexion, _ in libres:
+            self._cerrar(conexion)
+
+    def _liberar_cupo(self):
+        with self._cond:
+            self._prestadas -= 1
+            self._cond.notify()
+
+    def _sana(self, conexion, devuelta_en):
+        if conexion.closed:
+            return False
+        # Solo se hace ping si la conexión estuvo ociosa (el servidor pudo cortarla)
+        if time.monotonic() - devuelta_en < self.ping_despues:
+            return True
+        try:
+            cursor = conexion.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conexion.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _resetear(self, conexion):
+        if conexion.closed:
+            return False
+        try:
+            estado = conexion.info.transaction_status
+            if estado == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if estado != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conexion.rollback()
+            if conexion.autocommit:
+                conexion.autocommit = False
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _cerrar(conexion):
+        try:
+            if not conexion.closed:
+                conexion.close()
+        except psycopg2.Error:
+            pass
+
+
+class ConexionPrestada:
+    """
+    Conexión psycopg2 tomada del pool. Expone la misma interfaz
+    (cursor, commit, rollback, ...) pero close() la devuelve al pool.
+    """
+    __slots__ = ('_conexion', '_pool')
+
+    def __init__(self, conexion, pool):
+        object.__setattr__(self, '_conexion', conexion)
+        object.__setattr__(self, '_pool', pool)
+
+    def __getattr__(self, nombre):
+        conexion = object.__getattribute__(self, '_conexion')
+        if conexion is None:
+            raise psycopg2.InterfaceError('connection already closed')
+        return getattr(conexion, nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._conexion, nombre, valor)
+
+    @property
+    def closed(self):
+        return self._conexion is None or self._conexion.closed
+
+    def close(self):
+        conexion = self._conexion
+        if conexion is not None:
+            object.__setattr__(self, '_conexion', None)
+            self._pool.devolver(conexion)
+
+    def __del__(self):
+        # Red de seguridad para los caminos de error que no llaman a close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pools_heredados = []
+
+
+def obtener_pool():
+    """Pool del proceso actual (se crea al primer uso dentro de cada worker)"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            if _pool is not None:
+                # Conexiones heredadas por fork: no se cierran desde el hijo
+                # porque terminarían la sesión del proceso padre.
+                _pools_heredados.append(_pool)
+            _pool = PoolConexiones(
+                Config.DB_POOL_MIN,
+                Config.DB_POOL_MAX,
+                Config.DB_POOL_TIMEOUT,
+                Config.DB_POOL_PING
+            )
+            _pool_pid = pid
+    return _pool
+
+
+class UnidadTrabajo:
+    """
+    Transacción única por request HTTP. Todas las Conexion() abiertas durante el
+    request comparten una sola conexión del pool; al terminar el request se hace
+    un único COMMIT (o ROLLBACK si hubo error o se llamó a descartar()).
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conexion = None
+        self._contador = 0
+        self.finalizada = False
+        self.descartada = False
+
+    def abrir(self):
+        if self.finalizada:
+            raise psycopg2.InterfaceError('La unidad de trabajo del request ya fue finalizada')
+        if self._conexion is None:
+            self._conexion = self._pool.obtener()
+        marca = None
+        if self._conexion.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            marca = self._nueva_marca()
+            self._ejecutar(f"SAVEPOINT {marca}")
+        return ConexionCompartida(self, marca)
+
+    def descartar(self):
+        """Fuerza ROLLBACK de todo lo hecho en el request"""
+        self.descartada = True
+
+    def finalizar(self, confirmar=True):
+        if self.finalizada:
+            return
+        self.finalizada = True
+        conexion, self._conexion = self._conexion, None
+        if conexion is None:
+            return
+        try:
+            if confirmar and not self.descartada:
+                conexion.commit()
+            else:
+                conexion.rollback()
+        finally:
+            self._pool.devolver(conexion)
+
+    def _nueva_marca(self):
+        self._contador += 1
+        return f"sp_{self._contador}"
+
+    def _ejecutar(self, sql):
+        cursor = self._conexion.cursor()
+        cursor.execute(sql)
+        cursor.close()
+
+
+class ConexionCompartida:
+    """
+    Vista de la conexión del request para un bloque de código (un método de modelo).
+    commit()/rollback() actúan sobre un SAVEPOINT propio, no sobre la transacción;
+    close() solo deshace el bloque si quedó en error.
+    """
+
+    def __init__(self, unidad, marca):
+        self._unidad = unidad
+        self._marca = marca       # None = inicio de la transacción
+        self._cerrada = False
+
+    def _conexion(self):
+        if self._cerrada or self._unidad.finalizada:
+            raise psycopg2.InterfaceError('connection already closed')
+        return self._unidad._conexion
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion(), nombre)
+
+    @property
+    def closed(self):
+        return self._cerrada or self._unidad.finalizada
+
+    def cursor(self, *args, **kwargs):
+        return self._conexion().cursor(*args, **kwargs)
+
+    def commit(self):
+        self._conexion()
+        marca = self._unidad._nueva_marca()
+        if self._marca:
+            self._unidad._ejecutar(f"RELEASE SAVEPOINT {self._marca}; SAVEPOINT {marca}")
+        else:
+            self._unidad._ejecutar(f"SAVEPOINT {marca}")
+        self._marca = marca
+
+    def rollback(self):
+        conexion = self._conexion()
+        if self._marca:
+            self._unidad._ejecutar(f"ROLLBACK TO SAVEPOINT {self._marca}")
+        else:
+            conexion.rollback()
+
+    def close(self):
+        if self.closed:
+            self._cerrada = True
+            return
+        estado = self._unidad._conexion.info.transaction_status
+        if estado == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            self.rollback()
+        self._cerrada = True
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def unidad_trabajo_actual():
+    """Unidad de trabajo del request en curso (None fuera de un request)"""
+    if not has_app_context():
+        return None
+    unidad = g.get('unidad_trabajo')
+    if unidad is None or unidad.finalizada:
+        return None
+    return unidad
+
+
+def registrar_unidad_trabajo(app):
+    """Engancha la transacción por request al ciclo de vida de Flask"""
+
+    @app.before_request
+    def iniciar_unidad_trabajo():
+        g.unidad_trabajo = UnidadTrabajo(obtener_pool())
+
+    @app.after_request
+    def confirmar_unidad_trabajo(response):
+        unidad = g.pop('unidad_trabajo', None)
+        if unidad is None:
+            return response
+        try:
+            unidad.finalizar(confirmar=response.status_code < 500)
+        except psycopg2.Error as e:
+            log.exception("Error al confirmar la transacción del request")
+            response = jsonify({
+                'status': False,
+                'data': None,
+                'message': f'Error al confirmar la transacción: {str(e)}'
+            })
+            response.status_code = 500
+        return response
+
+    @app.teardown_request
+    def cerrar_unidad_trabajo(exc):
+        # Solo llega aquí con la unidad abierta si hubo una excepción no controlada
+        unidad = g.pop('unidad_trabajo', None)
+        if unidad is not None:
+            unidad.finalizar(confirmar=False)
+
+
 class Conexion:
     def __init__(self):
-        self.dblink = psycopg2.connect(
-            host=Config.DB_HOST,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            dbname=Config.DB_NAME,
-            port=Config.DB_PORT,
-            cursor_factory=psycopg2.extras.RealDictCursor  
-        )
+        unidad = unidad_trabajo_actual()
+        if unidad is not None:
+            self.dblink = unidad.abrir()
+        else:
+            pool = obtener_pool()
+            self.dblink = ConexionPrestada(pool.obtener(), pool)
 
     def cursor(self):
         return self.dblink.cursor()
@@ -16,6 +16,45 @@ class Config:
     DB_NAME = os.environ.get('DB_NAME', 'cceliasa')
     DB_PORT = int(os.environ.get('DB_PORT', 5432))
     
+    # Pool de conexiones (por worker de gunicorn)
+    DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+    DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))   # segundos esperando una conexión libre
+    DB_POOL_PING = float(os.environ.get('DB_POOL_PING', 30))         # segundos ociosa antes de verificarla con SELECT 1
+    
+    # Snapshot del catálogo en memoria (se invalida por LISTEN/NOTIFY; el TTL es solo red de seguridad)
+    CATALOGO_TTL = float(os.environ.get('CATALOGO_TTL', 300))
+
+    # Primera página de reseñas por producto en memoria (se invalida por LISTEN/NOTIFY)
+    RESENIAS_CACHE_TTL = float(os.environ.get('RESENIAS_CACHE_TTL', 300))
+    RESENIAS_CACHE_MAXIMO = int(os.environ.get('RESENIAS_CACHE_MAXIMO', 2000))   # entradas por worker
+
+    # Compresión de respuestas (gzip, o brotli si el paquete está instalado)
+    COMPRESION_MINIMO = int(os.environ.get('COMPRESION_MINIMO', 1024))        # bytes; por debajo no compensa
+    COMPRESION_NIVEL_GZIP = int(os.environ.get('COMPRESION_NIVEL_GZIP', 6))
+    COMPRESION_NIVEL_BROTLI = int(os.environ.get('COMPRESION_NIVEL_BROTLI', 5))
+    COMPRESION_CACHE_MB = float(os.environ.get('COMPRESION_CACHE_MB', 32))     # cuerpos ya comprimidos por worker
+
+    # Registro (logging): DEBUG muestra el detalle por fila; en producción INFO
+    LOG_NIVEL = os.environ.get('LOG_NIVEL', 'INFO').upper()
+    LOG_FORMATO = os.environ.get('LOG_FORMATO', 'texto')                       # texto | json
+    LOG_COLA_MAXIMO = int(os.environ.get('LOG_COLA_MAXIMO', 10000))           # registros en espera; si se llena se descartan
+
+    # Cola de trabajos en segundo plano (proceso "worker" del Procfile)
+    TRABAJOS_HILOS = int(os.environ.get('TRABAJOS_HILOS', 2))
+    TRABAJOS_MAX_INTENTOS = int(os.environ.get('TRABAJOS_MAX_INTENTOS', 5))
+    TRABAJOS_VISIBILIDAD = float(os.environ.get('TRABAJOS_VISIBILIDAD', 600))   # segundos antes de dar por caído un trabajo en proceso
+    TRABAJOS_SONDEO = float(os.environ.get('TRABAJOS_SONDEO', 5))              # segundos entre sondeos si no llega ningún NOTIFY
+    IMAGEN_MAX_MB = float(os.environ.get('IMAGEN_MAX_MB', 10))                 # tope por imagen subida (Cloudinary rechaza más de 10 MB)
+
+    # Streams SSE del chat (cada stream abierto ocupa un hilo del worker web)
+    CHAT_SSE_MAXIMO = int(os.environ.get('CHAT_SSE_MAXIMO', 24))       # streams simultáneos por worker; el resto sondea
+    CHAT_SSE_DURACION = float(os.environ.get('CHAT_SSE_DURACION', 300))  # segundos antes de cerrar (el navegador reconecta solo)
+    CHAT_SSE_LATIDO = float(os.environ.get('CHAT_SSE_LATIDO', 15))       # comentario keep-alive para proxies
+
+    # Exportaciones en streaming: cada una mantiene una conexión propia mientras dura la descarga
+    EXPORTACIONES_MAXIMO = int(os.environ.get('EXPORTACIONES_MAXIMO', 4))     # simultáneas por worker; el resto recibe 503
+
     # ==========================================
     # CONFIGURACIÓN DE SEGURIDAD
     # ==========================================
@@ -38,6 +77,7 @@ class Config:
         print(f"👤 DB_USER: {Config.DB_USER}")
         print(f"🗄️  DB_NAME: {Config.DB_NAME}")
         print(f"🔌 DB_PORT: {Config.DB_PORT}")
+        print(f"🧵 DB_POOL: {Config.DB_POOL_MIN}-{Config.DB_POOL_MAX}")
         print(f"☁️  CLOUDINARY: {Config.CLOUDINARY_CLOUD_NAME}")
         print("=" * 50)
 
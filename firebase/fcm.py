@@ -3,57 +3,82 @@ import json
 import google.auth
 from google.auth.transport.requests import Request
 from google.oauth2 import service_account
+from concurrent.futures import ThreadPoolExecutor
+import logging
 import os
+import random
+import threading
+import time
 import datetime
 
+log = logging.getLogger(__name__)
 
-def notificar(device_token, title, body):
+SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+SERVICE_ACCOUNT_FILE = 'elias-aguirre-firebase-adminsdk-fbsvc-5a7e9a2652.json'
+
+# ✅ FCM_URL PERMITE APUNTAR A UN SERVIDOR LOCAL (firebase/mock_fcm.py) PARA PROBAR SIN RED
+FCM_URL = os.environ.get('FCM_URL', 'https://fcm.googleapis.com/v1/projects/elias-aguirre/messages:send')
+FCM_MOCK = os.environ.get('FCM_MOCK', '').lower() in ('1', 'true', 'si')
+FCM_CONCURRENCIA = int(os.environ.get('FCM_CONCURRENCIA', 8))
+FCM_REINTENTOS = int(os.environ.get('FCM_REINTENTOS', 3))
+FCM_TIMEOUT = float(os.environ.get('FCM_TIMEOUT', 10))
+
+# Resultados posibles de un envío
+ENVIADO = 'enviado'
+NO_REGISTRADO = 'no_registrado'   # FCM indica que el token ya no existe: se debe desactivar
+FALLIDO = 'fallido'
+
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+
+class ClienteFCM:
     """
-    Envía una notificación push a un dispositivo específico usando Firebase Cloud Messaging V1
+    Cliente FCM v1 reutilizable: credenciales cargadas una sola vez, access token
+    renovado solo cuando vence y sesión HTTP keep-alive compartida entre hilos.
     """
-    
-    print(f"📱 Enviando notificación a dispositivo: {device_token[:20]}...")
-    
-    SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
-    
-    # ✅ CARGAR CREDENCIALES DESDE VARIABLE DE ENTORNO O ARCHIVO
-    FIREBASE_CREDENTIALS = os.environ.get('FIREBASE_CREDENTIALS')
-    
-    try:
+
+    def __init__(self):
+        self._credenciales = None
+        self._lock = threading.Lock()
+        self._sesion = requests.Session()
+        adaptador = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=FCM_CONCURRENCIA)
+        self._sesion.mount('https://', adaptador)
+        self._sesion.mount('http://', adaptador)
+
+    def _cargar_credenciales(self):
+        FIREBASE_CREDENTIALS = os.environ.get('FIREBASE_CREDENTIALS')
         if FIREBASE_CREDENTIALS:
             # ✅ EN PRODUCCIÓN: Usar variable de entorno
-            print("🔑 Usando credenciales desde variable de entorno")
-            credentials_dict = json.loads(FIREBASE_CREDENTIALS)
-            credentials = service_account.Credentials.from_service_account_info(
-                credentials_dict,
-                scopes=SCOPES
-            )
-        else:
-            # ✅ EN DESARROLLO: Usar archivo local
-            print("🔑 Usando credenciales desde archivo local")
-            SERVICE_ACCOUNT_FILE = 'elias-aguirre-firebase-adminsdk-fbsvc-5a7e9a2652.json'
-            service_account_path = os.path.join(os.getcwd(), "firebase", SERVICE_ACCOUNT_FILE)
-            
-            if not os.path.isfile(service_account_path):
-                raise FileNotFoundError(f"El archivo {service_account_path} no existe.")
-            
-            credentials = service_account.Credentials.from_service_account_file(
-                service_account_path,
+            log.info("FCM: credenciales desde variable de entorno")
+            return service_account.Credentials.from_service_account_info(
+                json.loads(FIREBASE_CREDENTIALS),
                 scopes=SCOPES
             )
-        
-        credentials.refresh(Request())
-        access_token = credentials.token
-        
-        print("🔑 Token de acceso obtenido correctamente")
-        
-        FCM_URL = 'https://fcm.googleapis.com/v1/projects/elias-aguirre/messages:send'
-        
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json; UTF-8',
-        }
-        
+
+        # ✅ EN DESARROLLO: Usar archivo local
+        log.info("FCM: credenciales desde archivo local")
+        service_account_path = os.path.join(os.getcwd(), "firebase", SERVICE_ACCOUNT_FILE)
+        if not os.path.isfile(service_account_path):
+            raise FileNotFoundError(f"El archivo {service_account_path} no existe.")
+        return service_account.Credentials.from_service_account_file(
+            service_account_path,
+            scopes=SCOPES
+        )
+
+    def access_token(self, forzar=False):
+        """Token OAuth vigente (solo se pide uno nuevo si venció o se fuerza)"""
+        if FCM_MOCK:
+            return 'mock'
+        with self._lock:
+            if self._credenciales is None:
+                self._credenciales = self._cargar_credenciales()
+            if forzar or not self._credenciales.valid:
+                self._credenciales.refresh(Request())
+                log.info("FCM: token de acceso renovado")
+            return self._credenciales.token
+
+    def enviar(self, device_token, title, body):
+        """Envía a un dispositivo con reintentos y backoff. Devuelve ENVIADO, NO_REGISTRADO o FALLIDO"""
         message = {
             'message': {
                 'token': device_token,
@@ -75,24 +100,104 @@ def notificar(device_token, title, body):
                 }
             }
         }
-        
-        print("📡 Enviando notificación a Firebase...")
-        response = requests.post(FCM_URL, headers=headers, data=json.dumps(message))
-        
-        print(f"📊 Status Code: {response.status_code}")
-        
-        if response.status_code == 200:
-            print("✅ Notificación enviada exitosamente")
+        payload = json.dumps(message)
+        token_renovado = False
+
+        for intento in range(FCM_REINTENTOS + 1):
+            espera = None
+            try:
+                headers = {
+                    'Authorization': f'Bearer {self.access_token()}',
+                    'Content-Type': 'application/json; UTF-8',
+                }
+                response = self._sesion.post(FCM_URL, headers=headers, data=payload, timeout=FCM_TIMEOUT)
+
+                if response.status_code == 200:
+                    return ENVIADO
+
+                if _es_no_registrado(response):
+                    return NO_REGISTRADO
+
+                if response.status_code == 401 and not token_renovado:
+                    # El access token pudo revocarse antes de su vencimiento
+                    self.access_token(forzar=True)
+                    token_renovado = True
+                    continue
+
+                if response.status_code not in ESTADOS_REINTENTABLES:
+                    log.error("FCM %s: %s", response.status_code, response.text[:200])
+                    return FALLIDO
+
+                retry_after = response.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    espera = int(retry_after)
+            except requests.RequestException as e:
+                log.warning("Error de red con FCM: %s", e)
+
+            if intento < FCM_REINTENTOS:
+                time.sleep(espera if espera is not None else (0.5 * 2 ** intento) + random.uniform(0, 0.25))
+
+        return FALLIDO
+
+    def enviar_lote(self, tokens, title, body):
+        """
+        Envía a muchos dispositivos con concurrencia acotada.
+        Devuelve {'exitosos', 'fallidos', 'no_registrados': [tokens]}
+        """
+        resultados = {'exitosos': 0, 'fallidos': 0, 'no_registrados': []}
+        if not tokens:
+            return resultados
+
+        log.debug("Enviando notificación a %d dispositivos", len(tokens))
+        with ThreadPoolExecutor(max_workers=min(FCM_CONCURRENCIA, len(tokens))) as executor:
+            estados = executor.map(lambda t: self.enviar(t, title, body), tokens)
+            for token, estado in zip(tokens, estados):
+                if estado == ENVIADO:
+                    resultados['exitosos'] += 1
+                else:
+                    resultados['fallidos'] += 1
+                    if estado == NO_REGISTRADO:
+                        resultados['no_registrados'].append(token)
+
+        log.info("FCM: %d exitosas, %d fallidas, %d tokens no registrados",
+                 resultados['exitosos'], resultados['fallidos'], len(resultados['no_registrados']))
+        return resultados
+
+
+def _es_no_registrado(response):
+    if response.status_code == 404:
+        return True
+    try:
+        error = response.json().get('error', {})
+    except ValueError:
+        return False
+    for detalle in error.get('details', []):
+        if detalle.get('errorCode') == 'UNREGISTERED':
             return True
-        else:
-            print(f"❌ Error al enviar notificación")
-            print(f"📄 Response: {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"💥 Error en notificar(): {str(e)}")
-        import traceback
-        traceback.print_exc()
+    return False
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente():
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = ClienteFCM()
+    return _cliente
+
+
+def notificar(device_token, title, body):
+    """
+    Envía una notificación push a un dispositivo específico usando Firebase Cloud Messaging V1
+    """
+    try:
+        return obtener_cliente().enviar(device_token, title, body) == ENVIADO
+    except Exception:
+        log.exception("Error en notificar()")
         return False
 
 
@@ -100,19 +205,5 @@ def notificar_multiple(tokens, title, body):
     """
     Envía notificaciones a múltiples dispositivos
     """
-    resultados = {'exitosos': 0, 'fallidos': 0}
-    
-    print(f"📱 Enviando notificación a {len(tokens)} dispositivos...")
-    
-    for token in tokens:
-        try:
-            if notificar(token, title, body):
-                resultados['exitosos'] += 1
-            else:
-                resultados['fallidos'] += 1
-        except Exception as e:
-            print(f"❌ Error al enviar a token {token[:20]}...: {str(e)}")
-            resultados['fallidos'] += 1
-    
-    print(f"📊 Resumen: {resultados['exitosos']} exitosas, {resultados['fallidos']} fallidas")
-    return resultados
\ No newline at end of file
+    resultados = obtener_cliente().enviar_lote(tokens, title, body)
+    return {'exitosos': resultados['exitosos'], 'fallidos': resultados['fallidos']}
@@ -0,0 +1,99 @@
+"""
+Servidor FCM falso para probar el envío de notificaciones sin red.
+
+    python -m firebase.mock_fcm --puerto 8090
+
+y en otra terminal levantar la API con:
+
+    FCM_MOCK=1 FCM_URL=http://127.0.0.1:8090/v1/projects/elias-aguirre/messages:send
+
+Comportamiento según el token del dispositivo:
+- empieza con "unregistered": 404 UNREGISTERED (la API lo desactiva)
+- empieza con "retry": 503 la primera vez, luego 200 (prueba el backoff)
+- empieza con "invalid": 400 INVALID_ARGUMENT (falla sin reintentos)
+- cualquier otro: 200
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_lock = threading.Lock()
+_vistos = set()
+_contador = {'recibidos': 0}
+
+
+def _error(status, codigo, mensaje):
+    return status, {
+        'error': {
+            'code': status,
+            'message': mensaje,
+            'status': codigo,
+            'details': [{
+                '@type': 'type.googleapis.com/google.firebase.fcm.v1.FcmError',
+                'errorCode': 'UNREGISTERED' if status == 404 else codigo
+            }]
+        }
+    }
+
+
+class ManejadorFCM(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, como el FCM real
+    latencia = 0.0
+
+    def do_POST(self):
+        largo = int(self.headers.get('Content-Length', 0))
+        try:
+            token = json.loads(self.rfile.read(largo))['message']['token']
+        except (ValueError, KeyError, TypeError):
+            return self._responder(*_error(400, 'INVALID_ARGUMENT', 'Mensaje inválido'))
+
+        if self.latencia:
+            time.sleep(self.latencia)
+
+        with _lock:
+            _contador['recibidos'] += 1
+            primera_vez = token not in _vistos
+            _vistos.add(token)
+
+        if token.startswith('unregistered'):
+            return self._responder(*_error(404, 'NOT_FOUND', 'Requested entity was not found.'))
+        if token.startswith('invalid'):
+            return self._responder(*_error(400, 'INVALID_ARGUMENT', 'The registration token is not a valid FCM registration token'))
+        if token.startswith('retry') and primera_vez:
+            return self._responder(*_error(503, 'UNAVAILABLE', 'Servicio no disponible'))
+
+        self._responder(200, {'name': f'projects/elias-aguirre/messages/{_contador["recibidos"]}'})
+
+    def _responder(self, status, cuerpo):
+        datos = json.dumps(cuerpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, formato, *args):
+        print(f"📨 mock FCM: {formato % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor FCM falso')
+    parser.add_argument('--puerto', type=int, default=8090)
+    parser.add_argument('--latencia', type=float, default=0.0, help='Segundos de espera por mensaje')
+    args = parser.parse_args()
+
+    ManejadorFCM.latencia = args.latencia
+    servidor = ThreadingHTTPServer(('127.0.0.1', args.puerto), ManejadorFCM)
+    print(f"🚀 Mock FCM escuchando en http://127.0.0.1:{args.puerto}/v1/projects/elias-aguirre/messages:send")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == '__main__':
+    main()
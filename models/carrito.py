@@ -1,86 +1,73 @@
-from conexionBD import Conexion
+from conexionBD import Conexion, cursor_tipado
+
+
+def _url_cliente(columna):
+    """SQL: URL de imagen con %(base_url)s antepuesto si es relativa ('' si no hay)"""
+    return f"""CASE
+        WHEN {columna} IS NULL OR {columna} = '' THEN ''
+        WHEN %(base_url)s = '' OR {columna} LIKE 'http%%' THEN {columna}
+        WHEN {columna} LIKE '/%%' THEN %(base_url)s || {columna}
+        ELSE %(base_url)s || '/' || {columna}
+    END"""
+
 
 class Carrito:
     def __init__(self):
         pass
     
-    def listar_carrito(self, id_usuario):
-        """Lista el carrito agrupado por sucursal"""
+    def listar_carrito(self, id_usuario, base_url=''):
+        """
+        Lista el carrito agrupado por sucursal. Postgres arma el JSON completo
+        (json_agg) y se devuelve como texto, sin reconstruir filas en Python.
+        `base_url` se antepone a las imágenes relativas (clientes Android).
+        """
         try:
             con = Conexion().open
-            cursor = con.cursor()
-            
-            sql = """
-                SELECT 
-                    s.id_sucursal,
-                    s.nombre as sucursal,
-                    s.img_logo as sucursal_logo,  
-                    cc.id_carrito,
-                    cc.id_prod_color,
-                    cc.cantidad,
-                    ps.id_prod_sucursal,
-                    ps.nombre as producto_nombre,
-                    pc.talla,
-                    ps.genero,
-                    ps.material,
-                    pc.precio,
-                    pc.stock,
-                    pc.url_img,
-                    m.nombre as marca,
-                    c.nombre as categoria,
-                    col.nombre as color
-                FROM carrito_compra cc
-                INNER JOIN producto_color pc ON cc.id_prod_color = pc.id_prod_color
-                INNER JOIN producto_sucursal ps ON pc.id_prod_sucursal = ps.id_prod_sucursal
-                INNER JOIN sucursal s ON ps.id_sucursal = s.id_sucursal
-                INNER JOIN color col ON pc.id_color = col.id_color
-                LEFT JOIN marca m ON ps.id_marca = m.id_marca
-                LEFT JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
-                WHERE cc.id_usuario = %s AND cc.estado = TRUE AND pc.estado = TRUE
-                ORDER BY s.nombre, ps.nombre
+            cursor = cursor_tipado(con, json_crudo=True)
+            
+            sql = f"""
+                SELECT COALESCE(json_agg(suc ORDER BY suc.nombre_sucursal), '[]') AS sucursales
+                FROM (
+                    SELECT 
+                        s.id_sucursal,
+                        s.nombre as nombre_sucursal,
+                        {_url_cliente('s.img_logo')} as logo_sucursal,
+                        json_agg(json_build_object(
+                            'id_carrito', cc.id_carrito,
+                            'id_prod_color', cc.id_prod_color,
+                            'id_prod_sucursal', ps.id_prod_sucursal,
+                            'producto_nombre', ps.nombre,
+                            'cantidad', cc.cantidad,
+                            'precio', pc.precio,
+                            'stock', pc.stock,
+                            'url_img', {_url_cliente('pc.url_img')},
+                            'talla', COALESCE(pc.talla, ''),
+                            'genero', COALESCE(ps.genero, ''),
+                            'material', COALESCE(ps.material, ''),
+                            'marca', COALESCE(m.nombre, ''),
+                            'categoria', COALESCE(c.nombre, ''),
+                            'color', col.nombre
+                        ) ORDER BY ps.nombre) as productos,
+                        SUM(pc.precio * cc.cantidad) as subtotal
+                    FROM carrito_compra cc
+                    INNER JOIN producto_color pc ON cc.id_prod_color = pc.id_prod_color
+                    INNER JOIN producto_sucursal ps ON pc.id_prod_sucursal = ps.id_prod_sucursal
+                    INNER JOIN sucursal s ON ps.id_sucursal = s.id_sucursal
+                    INNER JOIN color col ON pc.id_color = col.id_color
+                    LEFT JOIN marca m ON ps.id_marca = m.id_marca
+                    LEFT JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
+                    WHERE cc.id_usuario = %(id_usuario)s AND cc.estado = TRUE AND pc.estado = TRUE
+                    GROUP BY s.id_sucursal, s.nombre, s.img_logo
+                ) suc
             """
             
-            cursor.execute(sql, (id_usuario,))
-            resultados = cursor.fetchall()
-            
-            # Agrupar por sucursal
-            sucursales = {}
-            for row in resultados:
-                id_sucursal = row['id_sucursal']
-                
-                if id_sucursal not in sucursales:
-                    sucursales[id_sucursal] = {
-                        'id_sucursal': id_sucursal,
-                        'nombre_sucursal': row['sucursal'],
-                        'logo_sucursal': row['sucursal_logo'] if row['sucursal_logo'] else '',  
-                        'productos': [],
-                        'subtotal': 0
-                    }
-                
-                producto = {
-                    'id_carrito': row['id_carrito'],
-                    'id_prod_color': row['id_prod_color'],
-                    'id_prod_sucursal': row['id_prod_sucursal'],
-                    'producto_nombre': row['producto_nombre'],
-                    'cantidad': row['cantidad'],
-                    'precio': float(row['precio']),
-                    'stock': row['stock'],
-                    'url_img': row['url_img'] if row['url_img'] else '',
-                    'talla': row['talla'] if row['talla'] else '',
-                    'genero': row['genero'] if row['genero'] else '',
-                    'material': row['material'] if row['material'] else '',
-                    'marca': row['marca'] if row['marca'] else '',
-                    'categoria': row['categoria'] if row['categoria'] else '',
-                    'color': row['color']
-                }
-                
-                sucursales[id_sucursal]['productos'].append(producto)
-                sucursales[id_sucursal]['subtotal'] += producto['precio'] * producto['cantidad']
+            cursor.execute(sql, {'id_usuario': id_usuario, 'base_url': base_url})
+            resultado = cursor.fetchone()
             
             cursor.close()
             con.close()
             
-            return True, list(sucursales.values())
+            return True, resultado['sucursales']
                 
         except Exception as e:
             return False, f"Error al listar carrito: {str(e)}"
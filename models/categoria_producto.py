@@ -1,4 +1,5 @@
 from conexionBD import Conexion
+from tools.cache_catalogo import catalogo
 
 class CategoriaProducto:
     def __init__(self):
@@ -238,6 +239,9 @@ class CategoriaProducto:
                 sql_update = "UPDATE categoria_producto SET img = %s WHERE id_categoria = %s"
                 cursor.execute(sql_update, [img, id_categoria])
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -1,5 +1,8 @@
-from conexionBD import Conexion
 import json
+import logging
+from conexionBD import Conexion
+
+log = logging.getLogger(__name__)
 
 class Conversacion:
     
@@ -15,7 +18,7 @@ class Conversacion:
             con = Conexion().open
             cursor = con.cursor()
             
-            print(f"🔍 Ejecutando fn_iniciar_conversacion({id_usuario}, {id_sucursal})")
+            log.debug("Ejecutando fn_iniciar_conversacion(%s, %s)", id_usuario, id_sucursal)
             
             # Llamar a la función PostgreSQL
             cursor.execute(
@@ -25,12 +28,8 @@ class Conversacion:
             
             row = cursor.fetchone()
             
-            print(f"📊 Row type: {type(row)}")
-            print(f"📊 Row keys (si es dict): {row.keys() if isinstance(row, dict) else 'No es dict'}")
-            print(f"📊 Row value: {row}")
-            
             if row is None:
-                print("❌ fetchone() devolvió None")
+                log.error("fn_iniciar_conversacion no devolvió filas")
                 if con:
                     con.rollback()
                 return {
@@ -42,14 +41,12 @@ class Conversacion:
             if isinstance(row, dict):
                 # Si es dict, acceder por key
                 resultado_jsonb = row.get('resultado') or row.get('fn_iniciar_conversacion')
-                print(f"📦 Es DICT - Resultado: {resultado_jsonb}")
             else:
                 # Si es tuple, acceder por índice
                 resultado_jsonb = row[0] if len(row) > 0 else None
-                print(f"📦 Es TUPLE - Resultado: {resultado_jsonb}")
             
             if resultado_jsonb is None:
-                print("❌ resultado_jsonb es None")
+                log.error("fn_iniciar_conversacion devolvió NULL")
                 if con:
                     con.rollback()
                 return {
@@ -57,17 +54,13 @@ class Conversacion:
                     'message': 'La función no devolvió datos'
                 }
             
-            print(f"📦 Tipo resultado_jsonb: {type(resultado_jsonb)}")
-            
             # Convertir a dict si es string
             if isinstance(resultado_jsonb, str):
                 conversacion_data = json.loads(resultado_jsonb)
-                print("✅ Convertido de string a dict")
             elif isinstance(resultado_jsonb, dict):
                 conversacion_data = resultado_jsonb
-                print("✅ Ya es dict")
             else:
-                print(f"❌ Tipo inesperado: {type(resultado_jsonb)}")
+                log.error("fn_iniciar_conversacion devolvió un tipo inesperado: %s", type(resultado_jsonb).__name__)
                 if con:
                     con.rollback()
                 return {
@@ -77,8 +70,7 @@ class Conversacion:
             
             con.commit()
             
-            print(f"✅ Conversación obtenida: {conversacion_data.get('id_conversacion')}")
-            print(f"📋 Data completa: {conversacion_data}")
+            log.debug("Conversación obtenida: %s", conversacion_data.get('id_conversacion'))
             
             return {
                 'success': True,
@@ -86,13 +78,7 @@ class Conversacion:
             }
                 
         except Exception as e:
-            print(f"❌ ERROR COMPLETO:")
-            print(f"   Tipo: {type(e).__name__}")
-            print(f"   Mensaje: {str(e)}")
-            
-            import traceback
-            print("📜 Traceback completo:")
-            traceback.print_exc()
+            log.exception("Error al iniciar conversación %s/%s", id_usuario, id_sucursal)
             
             if con:
                 try:
@@ -137,12 +123,14 @@ class Conversacion:
                     c.id_sucursal,
                     c.ultimo_mensaje,
                     c.fecha_ultimo_mensaje,
-                    c.mensajes_no_leidos_usuario,
+                    COALESCE(n.no_leidos, 0) AS mensajes_no_leidos_usuario,
                     c.created_at,
                     s.nombre as sucursal_nombre,
                     s.img_logo as sucursal_logo
                 FROM conversacion c
                 INNER JOIN sucursal s ON c.id_sucursal = s.id_sucursal
+                LEFT JOIN conversacion_no_leidos n
+                       ON n.id_conversacion = c.id_conversacion AND n.lado = 'USUARIO'
                 WHERE c.id_usuario = %s 
                   AND c.estado = TRUE
                 ORDER BY c.fecha_ultimo_mensaje DESC NULLS LAST
@@ -187,9 +175,7 @@ class Conversacion:
             }
             
         except Exception as e:
-            print(f"❌ Error en listar_por_usuario: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error en listar_por_usuario")
             return {
                 'success': False,
                 'message': str(e)
@@ -227,8 +213,8 @@ class Conversacion:
                     c.id_sucursal,
                     c.ultimo_mensaje,
                     c.fecha_ultimo_mensaje,
-                    c.mensajes_no_leidos_usuario,
-                    c.mensajes_no_leidos_sucursal,
+                    COALESCE(nu.no_leidos, 0) AS mensajes_no_leidos_usuario,
+                    COALESCE(ns.no_leidos, 0) AS mensajes_no_leidos_sucursal,
                     c.estado,
                     c.created_at,
                     u.nomusuario,
@@ -238,6 +224,10 @@ class Conversacion:
                 FROM conversacion c
                 INNER JOIN usuario u ON c.id_usuario = u.id_usuario
                 INNER JOIN sucursal s ON c.id_sucursal = s.id_sucursal
+                LEFT JOIN conversacion_no_leidos nu
+                       ON nu.id_conversacion = c.id_conversacion AND nu.lado = 'USUARIO'
+                LEFT JOIN conversacion_no_leidos ns
+                       ON ns.id_conversacion = c.id_conversacion AND ns.lado = 'SUCURSAL'
                 WHERE c.id_conversacion = %s
             """, (id_conversacion,))
             
@@ -287,10 +277,8 @@ class Conversacion:
                     }
                 }
             
-        except Exception as e:
-            print(f"❌ Error en obtener_por_id: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            log.exception("Error en obtener_por_id")
             return None
         
         finally:
@@ -342,9 +330,7 @@ class Conversacion:
                 }
                 
         except Exception as e:
-            print(f"❌ Error en archivar: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error en archivar")
             
             if con:
                 try:
@@ -367,4 +353,169 @@ class Conversacion:
                 try:
                     con.close()
                 except:
-                    pass
\ No newline at end of file
+                    pass
+    
+    
+    @staticmethod
+    def contar_no_leidos_empresa(id_empresa):
+        """
+        Mensajes de clientes sin leer en cada sucursal activa de una empresa (badge del dashboard)
+        """
+        con = None
+        cursor = None
+        
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            
+            cursor.execute("""
+                SELECT 
+                    s.id_sucursal,
+                    s.nombre,
+                    COALESCE(SUM(n.no_leidos), 0) AS no_leidos,
+                    COUNT(n.id_conversacion) AS conversaciones_con_no_leidos
+                FROM sucursal s
+                LEFT JOIN conversacion_no_leidos n
+                    ON n.id_sucursal = s.id_sucursal
+                   AND n.lado = 'SUCURSAL'
+                   AND n.activa
+                   AND n.no_leidos > 0
+                WHERE s.id_empresa = %s
+                  AND s.estado = TRUE
+                GROUP BY s.id_sucursal, s.nombre
+                ORDER BY s.nombre
+            """, (id_empresa,))
+            
+            sucursales = [{
+                'id_sucursal': row['id_sucursal'],
+                'nombre': row['nombre'],
+                'no_leidos': int(row['no_leidos']),
+                'conversaciones_con_no_leidos': row['conversaciones_con_no_leidos']
+            } for row in cursor.fetchall()]
+            
+            return {
+                'success': True,
+                'data': {
+                    'total': sum(s['no_leidos'] for s in sucursales),
+                    'sucursales': sucursales
+                }
+            }
+            
+        except Exception as e:
+            log.exception("Error en contar_no_leidos_empresa")
+            
+            return {
+                'success': False,
+                'message': str(e)
+            }
+        
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except:
+                    pass
+            if con:
+                try:
+                    con.close()
+                except:
+                    pass
+    
+    
+    @staticmethod
+    def listar_por_empresa(id_empresa, antes=None, limite=50):
+        """
+        Conversaciones activas de todas las sucursales de una empresa, de la más
+        reciente a la más antigua. Paginación por llave: `antes` es la tupla
+        (actividad, id_conversacion) de la última fila de la página anterior.
+        """
+        con = None
+        cursor = None
+        
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            
+            parametros = [id_empresa]
+            condicion = ""
+            if antes is not None:
+                condicion = "AND (COALESCE(c.fecha_ultimo_mensaje, c.created_at), c.id_conversacion) < (%s, %s)"
+                parametros.extend(antes)
+            
+            # Se pide uno extra para saber si quedan más
+            parametros.append(limite + 1)
+            
+            cursor.execute(f"""
+                SELECT 
+                    c.id_conversacion,
+                    c.id_usuario,
+                    c.id_sucursal,
+                    c.ultimo_mensaje,
+                    c.fecha_ultimo_mensaje,
+                    c.created_at,
+                    COALESCE(c.fecha_ultimo_mensaje, c.created_at) AS actividad,
+                    COALESCE(n.no_leidos, 0) AS mensajes_no_leidos_sucursal,
+                    s.nombre AS nombre_sucursal,
+                    u.nomusuario AS nombre_usuario,
+                    u.img_logo
+                FROM conversacion c
+                INNER JOIN sucursal s ON c.id_sucursal = s.id_sucursal
+                INNER JOIN usuario u ON c.id_usuario = u.id_usuario
+                LEFT JOIN conversacion_no_leidos n
+                    ON n.id_conversacion = c.id_conversacion
+                   AND n.lado = 'SUCURSAL'
+                WHERE s.id_empresa = %s
+                  AND c.estado = TRUE
+                  {condicion}
+                ORDER BY COALESCE(c.fecha_ultimo_mensaje, c.created_at) DESC, c.id_conversacion DESC
+                LIMIT %s
+            """, parametros)
+            
+            filas = cursor.fetchall()
+            hay_mas = len(filas) > limite
+            filas = filas[:limite]
+            
+            conversaciones = [{
+                'id_conversacion': row['id_conversacion'],
+                'id_usuario': row['id_usuario'],
+                'id_sucursal': row['id_sucursal'],
+                'nombre_sucursal': row['nombre_sucursal'],
+                'ultimo_mensaje': row['ultimo_mensaje'],
+                'fecha_ultimo_mensaje': row['fecha_ultimo_mensaje'].isoformat() if row['fecha_ultimo_mensaje'] else None,
+                'mensajes_no_leidos_sucursal': row['mensajes_no_leidos_sucursal'],
+                'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+                'nombre_usuario': row['nombre_usuario'],
+                'img_logo': row['img_logo']
+            } for row in filas]
+            
+            siguiente = None
+            if hay_mas and filas:
+                ultima = filas[-1]
+                siguiente = (ultima['actividad'].isoformat(), ultima['id_conversacion'])
+            
+            return {
+                'success': True,
+                'data': conversaciones,
+                'hay_mas': hay_mas,
+                'siguiente': siguiente
+            }
+            
+        except Exception as e:
+            log.exception("Error en listar_por_empresa")
+            
+            return {
+                'success': False,
+                'message': str(e)
+            }
+        
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except:
+                    pass
+            if con:
+                try:
+                    con.close()
+                except:
+                    pass
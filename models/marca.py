@@ -1,4 +1,5 @@
 from conexionBD import Conexion
+from tools.cache_catalogo import catalogo
 
 class Marca:
     def __init__(self):
@@ -111,6 +112,9 @@ class Marca:
             resultado = cursor.fetchone()
             codigo = resultado['resultado']
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -1,5 +1,9 @@
-from conexionBD import Conexion
 import json
+import logging
+from conexionBD import Conexion
+from tools.chat_eventos import emitir_mensaje, emitir_lectura
+
+log = logging.getLogger(__name__)
 
 class Mensaje:
     
@@ -15,8 +19,8 @@ class Mensaje:
             con = Conexion().open
             cursor = con.cursor()
             
-            print(f"📤 Enviando mensaje | Conversación: {id_conversacion} | Emisor: {id_emisor} ({tipo_emisor})")
-            print(f"   Contenido: \"{contenido}\"")
+            # El contenido del mensaje no se registra: es privado del usuario
+            log.debug("Enviando mensaje | conversación=%s emisor=%s (%s)", id_conversacion, id_emisor, tipo_emisor)
             
             # Llamar a la función PostgreSQL
             cursor.execute(
@@ -26,10 +30,8 @@ class Mensaje:
             
             row = cursor.fetchone()
             
-            print(f"📊 Row type: {type(row)}")
-            
             if row is None:
-                print("❌ fetchone() devolvió None")
+                log.error("fn_enviar_mensaje no devolvió filas")
                 if con:
                     con.rollback()
                 return {
@@ -40,13 +42,11 @@ class Mensaje:
             # Obtener resultado según tipo
             if isinstance(row, dict):
                 resultado_jsonb = row.get('resultado') or row.get('fn_enviar_mensaje')
-                print(f"📦 Es DICT - Resultado: {resultado_jsonb}")
             else:
                 resultado_jsonb = row[0] if len(row) > 0 else None
-                print(f"📦 Es TUPLE - Resultado: {resultado_jsonb}")
             
             if resultado_jsonb is None:
-                print("❌ resultado_jsonb es None")
+                log.error("fn_enviar_mensaje devolvió NULL")
                 if con:
                     con.rollback()
                 return {
@@ -60,7 +60,7 @@ class Mensaje:
             elif isinstance(resultado_jsonb, dict):
                 mensaje_data = resultado_jsonb
             else:
-                print(f"❌ Tipo inesperado: {type(resultado_jsonb)}")
+                log.error("fn_enviar_mensaje devolvió un tipo inesperado: %s", type(resultado_jsonb).__name__)
                 if con:
                     con.rollback()
                 return {
@@ -70,22 +70,18 @@ class Mensaje:
             
             # Verificar si la función devolvió success
             if mensaje_data.get('success'):
+                # ✅ AVISO A LOS STREAMS SSE (se entrega al confirmar)
+                emitir_mensaje(cursor, id_conversacion, mensaje_data.get('data', {}).get('id_mensaje'), tipo_emisor)
                 con.commit()
-                print(f"✅ Mensaje enviado: {mensaje_data.get('data', {}).get('id_mensaje')}")
+                log.debug("Mensaje enviado: %s", mensaje_data.get('data', {}).get('id_mensaje'))
                 return mensaje_data
             else:
                 con.rollback()
-                print(f"❌ Error en función SQL: {mensaje_data.get('message')}")
+                log.warning("fn_enviar_mensaje rechazó el mensaje: %s", mensaje_data.get('message'))
                 return mensaje_data
                 
         except Exception as e:
-            print(f"❌ ERROR COMPLETO en enviar():")
-            print(f"   Tipo: {type(e).__name__}")
-            print(f"   Mensaje: {str(e)}")
-            
-            import traceback
-            print("📜 Traceback:")
-            traceback.print_exc()
+            log.exception("Error al enviar mensaje en la conversación %s", id_conversacion)
             
             if con:
                 try:
@@ -114,84 +110,103 @@ class Mensaje:
     @staticmethod
     def listar_por_conversacion(id_conversacion, id_usuario):
         """
-        Lista todos los mensajes de una conversación
-        Marca automáticamente como leídos los mensajes de la sucursal
+        Lista todos los mensajes de una conversación.
+        Avanza la marca de lectura de quien consulta solo si hay mensajes nuevos del otro lado.
+        """
+        log.debug("Listando mensajes | conversación=%s usuario=%s", id_conversacion, id_usuario)
+        
+        resultado = Mensaje.listar_delta(id_conversacion, limite=None)
+        if not resultado.get('success'):
+            return resultado
+        
+        lectura = resultado['lectura']
+        if lectura:
+            tipo_lector = 'USUARIO' if lectura['id_usuario'] == id_usuario else 'SUCURSAL'
+            Mensaje.marcar_hasta_ventana(id_conversacion, tipo_lector, resultado['data'], lectura)
+        
+        log.debug("%d mensajes encontrados", len(resultado['data']))
+        return {
+            'success': True,
+            'data': resultado['data']
+        }
+    
+    
+    @staticmethod
+    def marcar_hasta_ventana(id_conversacion, tipo_lector, mensajes, lectura):
+        """Avanza la marca hasta el último mensaje recibido de la ventana, si supera la actual"""
+        lado = LADOS_LECTURA[tipo_lector]
+        recibidos = [m['id_mensaje'] for m in mensajes if m['tipo_emisor'] == lado['emisor_opuesto']]
+        if recibidos and max(recibidos) > lectura[lado['marca']]:
+            return Mensaje.marcar_leidos(id_conversacion, tipo_lector, max(recibidos))
+        return None
+    
+    
+    @staticmethod
+    def marcar_leidos(id_conversacion, tipo_lector, hasta_id=None):
+        """
+        Avanza la marca de lectura de un lado de la conversación (por defecto hasta
+        el último mensaje recibido). Solo escribe si la marca realmente avanza.
         """
         con = None
         cursor = None
         
+        lado = LADOS_LECTURA.get(tipo_lector)
+        if lado is None:
+            return {
+                'success': False,
+                'message': 'tipo_lector debe ser USUARIO o SUCURSAL'
+            }
+        
         try:
             con = Conexion().open
             cursor = con.cursor()
             
-            print(f"📨 Listando mensajes | Conversación: {id_conversacion} | Usuario: {id_usuario}")
-            
-            # Llamar a la función PostgreSQL
-            cursor.execute(
-                "SELECT fn_listar_mensajes(%s, %s) as resultado",
-                (id_conversacion, id_usuario)
-            )
+            log.debug("Marcando mensajes como leídos | conversación=%s lector=%s", id_conversacion, tipo_lector)
+            
+            cursor.execute(f"""
+                UPDATE conversacion c
+                SET {lado['marca']} = w.hasta,
+                    {lado['fecha']} = DATE_TRUNC('minute', LOCALTIMESTAMP)
+                FROM (
+                    SELECT COALESCE(%(hasta)s::bigint, (
+                        SELECT MAX(id_mensaje) FROM mensaje
+                        WHERE id_conversacion = %(id)s AND tipo_emisor = %(emisor)s
+                    )) AS hasta
+                ) w
+                WHERE c.id_conversacion = %(id)s
+                  AND w.hasta > c.{lado['marca']}
+                RETURNING c.id_sucursal, c.{lado['marca']} AS ultimo_leido
+            """, {'id': id_conversacion, 'hasta': hasta_id, 'emisor': lado['emisor_opuesto']})
             
             row = cursor.fetchone()
-            
-            print(f"📊 Row type: {type(row)}")
-            
             if row is None:
-                print("❌ fetchone() devolvió None")
+                # Ya estaba al día: no hubo escritura
                 return {
-                    'success': False,
-                    'message': 'No se obtuvo respuesta de la base de datos'
+                    'success': True,
+                    'message': 'Sin mensajes nuevos por marcar',
+                    'data': {'avanzo': False}
                 }
             
-            # Obtener resultado según tipo
-            if isinstance(row, dict):
-                resultado_jsonb = row.get('resultado') or row.get('fn_listar_mensajes')
-                print(f"📦 Es DICT")
-            else:
-                resultado_jsonb = row[0] if len(row) > 0 else None
-                print(f"📦 Es TUPLE")
-            
-            if resultado_jsonb is None:
-                print("❌ resultado_jsonb es None")
-                return {
-                    'success': False,
-                    'message': 'La función no devolvió datos'
-                }
-            
-            # Convertir a dict si es string
-            if isinstance(resultado_jsonb, str):
-                mensajes_data = json.loads(resultado_jsonb)
-            elif isinstance(resultado_jsonb, dict):
-                mensajes_data = resultado_jsonb
-            else:
-                print(f"❌ Tipo inesperado: {type(resultado_jsonb)}")
-                return {
-                    'success': False,
-                    'message': f'Formato de respuesta inválido: {type(resultado_jsonb)}'
-                }
-            
-            # Verificar si la función devolvió success
-            if mensajes_data.get('success'):
-                con.commit()
-                mensajes = mensajes_data.get('data', [])
-                print(f"✅ {len(mensajes)} mensajes encontrados")
-                return mensajes_data
-            else:
-                print(f"❌ Error en función SQL: {mensajes_data.get('message')}")
-                return mensajes_data
+            emitir_lectura(cursor, id_conversacion, row['id_sucursal'], tipo_lector, row['ultimo_leido'])
+            con.commit()
+            return {
+                'success': True,
+                'message': 'Mensajes marcados como leídos',
+                'data': {'avanzo': True, 'ultimo_leido': row['ultimo_leido']}
+            }
                 
         except Exception as e:
-            print(f"❌ ERROR COMPLETO en listar_por_conversacion():")
-            print(f"   Tipo: {type(e).__name__}")
-            print(f"   Mensaje: {str(e)}")
+            log.exception("Error en marcar_leidos")
             
-            import traceback
-            print("📜 Traceback:")
-            traceback.print_exc()
+            if con:
+                try:
+                    con.rollback()
+                except:
+                    pass
             
             return {
                 'success': False,
-                'message': f"{type(e).__name__}: {str(e)}"
+                'message': str(e)
             }
         
         finally:
@@ -208,9 +223,9 @@ class Mensaje:
     
     
     @staticmethod
-    def marcar_leidos(id_conversacion, tipo_lector):
+    def contar_no_leidos(id_usuario):
         """
-        Marca mensajes de una conversación como leídos
+        Cuenta total de mensajes no leídos de un usuario (suma de sus contadores por conversación)
         """
         con = None
         cursor = None
@@ -219,73 +234,26 @@ class Mensaje:
             con = Conexion().open
             cursor = con.cursor()
             
-            print(f"✔️ Marcando mensajes como leídos | Conversación: {id_conversacion} | Lector: {tipo_lector}")
-            
-            # Llamar a la función PostgreSQL
-            cursor.execute(
-                "SELECT fn_marcar_mensajes_leidos(%s, %s) as resultado",
-                (id_conversacion, tipo_lector)
-            )
+            cursor.execute("""
+                SELECT COALESCE(SUM(no_leidos), 0) AS count
+                FROM conversacion_no_leidos
+                WHERE id_usuario = %s
+                  AND lado = 'USUARIO'
+                  AND activa
+                  AND no_leidos > 0
+            """, (id_usuario,))
             
             row = cursor.fetchone()
             
             if row is None:
-                if con:
-                    con.rollback()
-                return {
-                    'success': False,
-                    'message': 'No se obtuvo respuesta de la base de datos'
-                }
-            
-            # Obtener resultado según tipo
-            if isinstance(row, dict):
-                resultado_jsonb = row.get('resultado') or row.get('fn_marcar_mensajes_leidos')
-            else:
-                resultado_jsonb = row[0] if len(row) > 0 else None
-            
-            if resultado_jsonb is None:
-                if con:
-                    con.rollback()
-                return {
-                    'success': False,
-                    'message': 'La función no devolvió datos'
-                }
+                return 0
             
-            # Convertir a dict si es string
-            if isinstance(resultado_jsonb, str):
-                result_data = json.loads(resultado_jsonb)
-            elif isinstance(resultado_jsonb, dict):
-                result_data = resultado_jsonb
-            else:
-                if con:
-                    con.rollback()
-                return {
-                    'success': False,
-                    'message': f'Formato de respuesta inválido: {type(resultado_jsonb)}'
-                }
+            count = row.get('count', 0)
+            return count if count is not None else 0
             
-            if result_data.get('success'):
-                con.commit()
-                return result_data
-            else:
-                con.rollback()
-                return result_data
-                
         except Exception as e:
-            print(f"❌ ERROR en marcar_leidos: {e}")
-            import traceback
-            traceback.print_exc()
-            
-            if con:
-                try:
-                    con.rollback()
-                except:
-                    pass
-            
-            return {
-                'success': False,
-                'message': str(e)
-            }
+            log.error("Error en contar_no_leidos: %s", e)
+            return 0
         
         finally:
             if cursor:
@@ -301,9 +269,14 @@ class Mensaje:
     
     
     @staticmethod
-    def contar_no_leidos(id_usuario):
+    def listar_delta(id_conversacion, after_id=None, before_id=None, limite=50):
         """
-        Cuenta total de mensajes no leídos de un usuario
+        Lista solo una ventana de la conversación (índice (id_conversacion, id_mensaje)):
+        - after_id: mensajes nuevos posteriores a ese ID (sincronización)
+        - before_id: los `limite` anteriores a ese ID (historial hacia atrás)
+        - sin IDs: los últimos `limite` mensajes (limite=None: todo el historial)
+        Siempre en orden ascendente. `leido` se deriva de la marca del otro lado;
+        no escribe nada.
         """
         con = None
         cursor = None
@@ -312,26 +285,75 @@ class Mensaje:
             con = Conexion().open
             cursor = con.cursor()
             
-            cursor.execute(
-                "SELECT fn_contar_mensajes_no_leidos_usuario(%s) as count",
-                (id_usuario,)
-            )
-            
-            row = cursor.fetchone()
-            
-            if row is None:
-                return 0
-            
-            if isinstance(row, dict):
-                count = row.get('count', 0)
+            cursor.execute("""
+                SELECT id_usuario, ultimo_leido_usuario, ultimo_leido_sucursal,
+                       fecha_leido_usuario, fecha_leido_sucursal
+                FROM conversacion
+                WHERE id_conversacion = %s
+            """, (id_conversacion,))
+            lectura = cursor.fetchone()
+            
+            parametros = [id_conversacion]
+            if after_id is not None:
+                condicion, orden = "AND m.id_mensaje > %s", "ASC"
+                parametros.append(after_id)
+            elif before_id is not None:
+                condicion, orden = "AND m.id_mensaje < %s", "DESC"
+                parametros.append(before_id)
+            elif limite is None:
+                condicion, orden = "", "ASC"
             else:
-                count = row[0] if len(row) > 0 else 0
+                condicion, orden = "", "DESC"
+            
+            # Se pide uno extra para saber si quedan más
+            limite_sql = ""
+            if limite is not None:
+                limite_sql = "LIMIT %s"
+                parametros.append(limite + 1)
+            
+            cursor.execute(f"""
+                SELECT 
+                    m.id_mensaje,
+                    m.id_emisor,
+                    m.tipo_emisor,
+                    m.contenido,
+                    m.tipo_mensaje,
+                    m.url_archivo,
+                    m.fecha_leido,
+                    m.created_at,
+                    u.nomusuario as nombre_emisor,
+                    u.img_logo as img_emisor
+                FROM mensaje m
+                INNER JOIN usuario u ON m.id_emisor = u.id_usuario
+                WHERE m.id_conversacion = %s
+                  {condicion}
+                ORDER BY m.id_mensaje {orden}
+                {limite_sql}
+            """, parametros)
+            
+            filas = cursor.fetchall()
+            hay_mas = limite is not None and len(filas) > limite
+            if limite is not None:
+                filas = filas[:limite]
+            if orden == "DESC":
+                filas.reverse()
+            
+            mensajes = [_serializar_mensaje(row, lectura) for row in filas]
             
-            return count if count is not None else 0
+            return {
+                'success': True,
+                'data': mensajes,
+                'hay_mas': hay_mas,
+                'lectura': lectura
+            }
             
         except Exception as e:
-            print(f"❌ ERROR en contar_no_leidos: {e}")
-            return 0
+            log.exception("Error en listar_delta")
+            
+            return {
+                'success': False,
+                'message': f"{type(e).__name__}: {str(e)}"
+            }
         
         finally:
             if cursor:
@@ -343,4 +365,44 @@ class Mensaje:
                 try:
                     con.close()
                 except:
-                    pass
\ No newline at end of file
+                    pass
+
+
+# Columnas de la marca de lectura de cada lado y de quién recibe mensajes
+LADOS_LECTURA = {
+    'USUARIO': {
+        'marca': 'ultimo_leido_usuario',
+        'fecha': 'fecha_leido_usuario',
+        'emisor_opuesto': 'SUCURSAL'
+    },
+    'SUCURSAL': {
+        'marca': 'ultimo_leido_sucursal',
+        'fecha': 'fecha_leido_sucursal',
+        'emisor_opuesto': 'USUARIO'
+    }
+}
+
+
+def _serializar_mensaje(row, lectura):
+    # Un mensaje está leído si no supera la marca de quien lo recibe
+    if lectura is None:
+        leido, fecha_marca = False, None
+    elif row['tipo_emisor'] == 'USUARIO':
+        leido, fecha_marca = row['id_mensaje'] <= lectura['ultimo_leido_sucursal'], lectura['fecha_leido_sucursal']
+    else:
+        leido, fecha_marca = row['id_mensaje'] <= lectura['ultimo_leido_usuario'], lectura['fecha_leido_usuario']
+    fecha_leido = (row['fecha_leido'] or fecha_marca) if leido else None
+    
+    return {
+        'id_mensaje': row['id_mensaje'],
+        'id_emisor': row['id_emisor'],
+        'tipo_emisor': row['tipo_emisor'],
+        'contenido': row['contenido'],
+        'tipo_mensaje': row['tipo_mensaje'],
+        'url_archivo': row['url_archivo'],
+        'leido': leido,
+        'fecha_leido': fecha_leido.isoformat() if fecha_leido else None,
+        'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+        'nombre_emisor': row['nombre_emisor'],
+        'img_emisor': row['img_emisor']
+    }
@@ -1,4 +1,5 @@
 from conexionBD import Conexion
+from tools.cache_catalogo import catalogo
 from flask import request
 
 
@@ -136,6 +137,9 @@ class ProductoColor:
             resultado = cursor.fetchone()
             id_prod_color = resultado['resultado']
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -230,6 +234,9 @@ class ProductoColor:
             """
             cursor.execute(sql_update, [id_prod_sucursal, id_color, talla.strip().upper(), precio, stock, url_img, id_prod_color])
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -260,6 +267,9 @@ class ProductoColor:
             sql_update = "UPDATE producto_color SET estado = %s WHERE id_prod_color = %s"
             cursor.execute(sql_update, [nuevo_estado, id_prod_color])
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -318,6 +328,9 @@ class ProductoColor:
             sql_delete = "DELETE FROM producto_color WHERE id_prod_color = %s"
             cursor.execute(sql_delete, [id_prod_color])
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -327,6 +340,42 @@ class ProductoColor:
         except Exception as e:
             return False, f"Error al eliminar producto color: {str(e)}"
     
+    # ============================================
+    # EXPORTACIÓN
+    # ============================================
+    
+    def consulta_exportacion(self, id_empresa=None):
+        """SQL y parámetros de la exportación de variantes (incluye inactivas), para un cursor de servidor"""
+        sql = """
+            SELECT 
+                pc.id_prod_color,
+                pc.id_prod_sucursal,
+                ps.nombre as nombre_producto,
+                c.nombre as nombre_color,
+                pc.talla,
+                pc.precio,
+                pc.stock,
+                pc.estado,
+                m.nombre as nombre_marca,
+                cat.nombre as nombre_categoria,
+                s.id_sucursal,
+                s.nombre as nombre_sucursal,
+                pc.url_img
+            FROM producto_color pc
+            INNER JOIN producto_sucursal ps ON pc.id_prod_sucursal = ps.id_prod_sucursal
+            INNER JOIN sucursal s ON ps.id_sucursal = s.id_sucursal
+            INNER JOIN color c ON pc.id_color = c.id_color
+            LEFT JOIN marca m ON ps.id_marca = m.id_marca
+            LEFT JOIN categoria_producto cat ON ps.id_categoria = cat.id_categoria
+        """
+        
+        parametros = []
+        if id_empresa:
+            sql += " WHERE s.id_empresa = %s"
+            parametros.append(id_empresa)
+        
+        return sql + " ORDER BY pc.id_prod_color", parametros
+    
     # ============================================
     # MÉTODOS AUXILIARES PARA SELECTS
     # ============================================
@@ -1,98 +1,340 @@
+import logging
 from conexionBD import Conexion
-from flask import request
-import os
+from tools.cache_catalogo import catalogo
+from tools.serializador_productos import (
+    cliente_actual, url_imagen, serializar_listado, CAMPOS_RELACIONADOS, ALIAS_RELACIONADOS
+)
 
+log = logging.getLogger(__name__)
+
+
+# ============================================
+# BÚSQUEDA (requiere sql/001_busqueda_productos.sql)
+# ============================================
+
+SQL_COINCIDENCIAS_FTS = """
+    SELECT ps.id_prod_sucursal,
+           ts_rank_cd(ps.busqueda, consulta.tsq) AS relevancia
+    FROM producto_sucursal ps, consulta
+    WHERE ps.estado = TRUE
+      AND ps.busqueda @@ consulta.tsq
+"""
+
+SQL_COINCIDENCIAS_TRGM = """
+    SELECT ps.id_prod_sucursal,
+           word_similarity(consulta.texto, ps.busqueda_texto) AS relevancia
+    FROM producto_sucursal ps, consulta
+    WHERE ps.estado = TRUE
+      AND consulta.texto <%% ps.busqueda_texto
+"""
+
+# Modo de búsqueda -> consulta de coincidencias. Se decide en la primera
+# página y viaja en el cursor ("offset|modo") para no mezclar modos al paginar.
+MODOS_BUSQUEDA = {
+    'texto': SQL_COINCIDENCIAS_FTS,
+    'aproximada': SQL_COINCIDENCIAS_TRGM
+}
+
+SQL_BUSQUEDA = """
+    WITH consulta AS (
+        SELECT websearch_to_tsquery('es_unaccent', %(q)s) AS tsq,
+               lower(f_unaccent(%(q)s)) AS texto
+    ),
+    coincidencias AS ({coincidencias}),
+    pagina AS (
+        SELECT * FROM coincidencias
+        ORDER BY relevancia DESC, id_prod_sucursal
+        LIMIT %(limite)s OFFSET %(offset)s
+    )
+    SELECT
+        pagina.relevancia,
+        ps.id_prod_sucursal,
+        ps.id_temporada,
+        ps.nombre,
+        ps.material,
+        ps.genero,
+        m.nombre as marca,
+        c.nombre as categoria,
+        pc.id_prod_color,
+        pc.talla,
+        pc.precio,
+        pc.stock,
+        pc.url_img,
+        col.nombre as color
+    FROM pagina
+    INNER JOIN producto_sucursal ps ON ps.id_prod_sucursal = pagina.id_prod_sucursal
+    LEFT JOIN marca m ON ps.id_marca = m.id_marca
+    LEFT JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
+    LEFT JOIN LATERAL (
+        SELECT id_prod_color, id_color, talla, precio, stock, url_img
+        FROM producto_color
+        WHERE id_prod_sucursal = ps.id_prod_sucursal AND estado = TRUE
+        ORDER BY talla, id_prod_color
+        LIMIT 1
+    ) pc ON TRUE
+    LEFT JOIN color col ON pc.id_color = col.id_color
+    ORDER BY pagina.relevancia DESC, ps.id_prod_sucursal
+"""
 
 
 class ProductoSucursal:
     def __init__(self):
         pass
     
-    def listar_productos(self):
-        """Lista productos con su primera talla y primer color"""
+    def _consultar_catalogo(self):
+        """Consulta completa del listado público (solo se ejecuta al recargar el snapshot)"""
+        con = Conexion().open
+        cursor = con.cursor()
+        
+        sql = """
+            SELECT DISTINCT ON (ps.id_prod_sucursal)
+                ps.id_prod_sucursal,
+                ps.id_temporada,
+                ps.id_categoria,
+                ps.nombre,
+                ps.material,
+                ps.genero,
+                m.nombre as marca,
+                c.nombre as categoria,
+                pc.id_prod_color,
+                pc.talla,
+                pc.precio,
+                pc.stock,
+                pc.url_img,
+                col.nombre as color
+            FROM producto_sucursal ps
+            LEFT JOIN marca m ON ps.id_marca = m.id_marca
+            LEFT JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
+            LEFT JOIN producto_color pc ON ps.id_prod_sucursal = pc.id_prod_sucursal AND pc.estado = TRUE
+            LEFT JOIN color col ON pc.id_color = col.id_color
+            WHERE ps.estado = TRUE
+            ORDER BY ps.id_prod_sucursal, pc.talla, pc.id_prod_color
+        """
+        
+        cursor.execute(sql)
+        resultados = cursor.fetchall()
+        
+        cursor.close()
+        con.close()
+        
+        return resultados
+    
+    def listar_productos(self, campos=None):
+        """Lista productos con su primera talla y primer color (servido desde el snapshot en memoria)"""
         try:
-            con = Conexion().open
-            cursor = con.cursor()
+            resultados, version = catalogo.filas(self._consultar_catalogo)
+            cliente = cliente_actual()
             
-            sql = """
-                SELECT DISTINCT ON (ps.id_prod_sucursal)
-                    ps.id_prod_sucursal,
-                    ps.id_temporada,
-                    ps.nombre,
-                    ps.material,
-                    ps.genero,
-                    m.nombre as marca,
-                    c.nombre as categoria,
-                    pc.id_prod_color,
-                    pc.talla,
-                    pc.precio,
-                    pc.stock,
-                    pc.url_img,
-                    col.nombre as color
-                FROM producto_sucursal ps
-                LEFT JOIN marca m ON ps.id_marca = m.id_marca
-                LEFT JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
-                LEFT JOIN producto_color pc ON ps.id_prod_sucursal = pc.id_prod_sucursal AND pc.estado = TRUE
-                LEFT JOIN color col ON pc.id_color = col.id_color
-                WHERE ps.estado = TRUE
-                ORDER BY ps.id_prod_sucursal, pc.talla, pc.id_prod_color
+            productos = catalogo.derivado(
+                ('listar_productos', cliente, campos),
+                version,
+                lambda: serializar_listado(resultados, cliente, campos)
+            )
+            
+            return True, productos
+                
+        except Exception as e:
+            return False, f"Error al listar productos: {str(e)}"
+    
+    def listar_por_temporada(self, id_temporada, campos=None):
+        """Productos de una temporada (filtrados sobre el snapshot del catálogo)"""
+        try:
+            resultados, version = catalogo.filas(self._consultar_catalogo)
+            cliente = cliente_actual()
+            
+            productos = catalogo.derivado(
+                ('por_temporada', id_temporada, cliente, campos),
+                version,
+                lambda: serializar_listado(
+                    [row for row in resultados if row['id_temporada'] == id_temporada],
+                    cliente,
+                    campos
+                )
+            )
+            
+            return True, productos
+                
+        except Exception as e:
+            return False, f"Error al listar productos por temporada: {str(e)}"
+    
+    def listar_relacionados(self, id_categoria, id_actual, campos=None, limite=10):
+        """Productos de la misma categoría excluyendo el actual (desde el snapshot del catálogo)"""
+        try:
+            resultados, version = catalogo.filas(self._consultar_catalogo)
+            
+            filas = []
+            for row in resultados:
+                if row['id_categoria'] == id_categoria and row['id_prod_sucursal'] != id_actual:
+                    filas.append(row)
+                    if len(filas) == limite:
+                        break
+            
+            productos = serializar_listado(
+                filas,
+                cliente_actual(),
+                campos,
+                campos_endpoint=CAMPOS_RELACIONADOS,
+                aliases=ALIAS_RELACIONADOS
+            )
+            
+            return True, productos
+                
+        except Exception as e:
+            return False, f"Error al listar productos relacionados: {str(e)}"
+    
+    def listar_productos_paginado(self, filtros, cursor_id=None, limite=20, campos=None):
+        """
+        Lista productos por páginas (keyset sobre id_prod_sucursal) con los filtros
+        resueltos en SQL. `filtros` admite: categoria, marca, genero, id_temporada,
+        id_sucursal, precio_min y precio_max.
+        """
+        try:
+            condiciones = ["ps.estado = TRUE"]
+            parametros = []
+            
+            if cursor_id:
+                condiciones.append("ps.id_prod_sucursal > %s")
+                parametros.append(cursor_id)
+            
+            # ✅ CATEGORÍA Y MARCA: POR ID O POR NOMBRE
+            for campo, columna_id, columna_nombre in (
+                ('categoria', 'ps.id_categoria', 'c.nombre'),
+                ('marca', 'ps.id_marca', 'm.nombre')
+            ):
+                valor = filtros.get(campo)
+                if valor:
+                    if str(valor).isdigit():
+                        condiciones.append(f"{columna_id} = %s")
+                        parametros.append(int(valor))
+                    else:
+                        condiciones.append(f"LOWER({columna_nombre}) = LOWER(%s)")
+                        parametros.append(valor)
+            
+            if filtros.get('genero'):
+                condiciones.append("LOWER(ps.genero) = LOWER(%s)")
+                parametros.append(filtros['genero'])
+            
+            if filtros.get('id_temporada'):
+                condiciones.append("ps.id_temporada = %s")
+                parametros.append(filtros['id_temporada'])
+            
+            if filtros.get('id_sucursal'):
+                condiciones.append("ps.id_sucursal = %s")
+                parametros.append(filtros['id_sucursal'])
+            
+            # ✅ EL RANGO DE PRECIO SE APLICA A LA VARIANTE QUE SE MUESTRA EN EL LISTADO
+            condiciones_precio = []
+            if filtros.get('precio_min') is not None:
+                condiciones_precio.append("precio >= %s")
+            if filtros.get('precio_max') is not None:
+                condiciones_precio.append("precio <= %s")
+            
+            sql = f"""
+                SELECT * FROM (
+                    SELECT DISTINCT ON (ps.id_prod_sucursal)
+                        ps.id_prod_sucursal,
+                        ps.id_temporada,
+                        ps.nombre,
+                        ps.material,
+                        ps.genero,
+                        m.nombre as marca,
+                        c.nombre as categoria,
+                        pc.id_prod_color,
+                        pc.talla,
+                        pc.precio,
+                        pc.stock,
+                        pc.url_img,
+                        col.nombre as color
+                    FROM producto_sucursal ps
+                    LEFT JOIN marca m ON ps.id_marca = m.id_marca
+                    LEFT JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
+                    LEFT JOIN producto_color pc ON ps.id_prod_sucursal = pc.id_prod_sucursal AND pc.estado = TRUE
+                    LEFT JOIN color col ON pc.id_color = col.id_color
+                    WHERE {" AND ".join(condiciones)}
+                    ORDER BY ps.id_prod_sucursal, pc.talla, pc.id_prod_color
+                ) p
+                {"WHERE " + " AND ".join(condiciones_precio) if condiciones_precio else ""}
+                ORDER BY id_prod_sucursal
+                LIMIT %s
             """
+            if filtros.get('precio_min') is not None:
+                parametros.append(filtros['precio_min'])
+            if filtros.get('precio_max') is not None:
+                parametros.append(filtros['precio_max'])
+            # Se pide una fila extra para saber si hay otra página
+            parametros.append(limite + 1)
             
-            cursor.execute(sql)
+            con = Conexion().open
+            cursor = con.cursor()
+            cursor.execute(sql, parametros)
             resultados = cursor.fetchall()
+            cursor.close()
+            con.close()
             
-            # ✅ DETECTAR ENTORNO Y CLIENTE
-            user_agent = request.headers.get('User-Agent', '').lower()
-            is_android = 'okhttp' in user_agent or 'android' in user_agent
+            hay_mas = len(resultados) > limite
+            resultados = resultados[:limite]
             
-            # ✅ DETERMINAR BASE_URL SEGÚN ENTORNO
-            if os.environ.get('RENDER'):
-                base_url = "https://usat-comercial-api.onrender.com" if is_android else ""
-            else:
-                base_url = "http://10.0.2.2:3007" if is_android else ""
+            productos = serializar_listado(resultados, cliente_actual(), campos)
             
-            productos = []
-            for row in resultados:
-                url_img = row['url_img'] if row['url_img'] else ''
-                
-                # ✅ CONSTRUIR URL COMPLETA SOLO PARA ANDROID
-                if url_img and is_android:
-                    if not url_img.startswith('http'):
-                        if not url_img.startswith('/'):
-                            url_img = '/' + url_img
-                        url_img = base_url + url_img
+            return True, {
+                'productos': productos,
+                'siguiente_cursor': resultados[-1]['id_prod_sucursal'] if hay_mas else None,
+                'hay_mas': hay_mas
+            }
                 
-                producto = {
-                    "id_prod_sucursal": row['id_prod_sucursal'],
-                    "id_temporada": row['id_temporada'],
-                    "idProducto": row['id_prod_sucursal'],           # ✅ AGREGAR
-                    "id_prod_color": row['id_prod_color'] if row['id_prod_color'] else None,
-                    "idProdColor": row['id_prod_color'] if row['id_prod_color'] else None,  # ✅ AGREGAR
-                    "nombre": row['nombre'],
-                    "nombreProducto": row['nombre'],                 # ✅ AGREGAR
-                    "talla": row['talla'] if row['talla'] else '',
-                    "material": row['material'] if row['material'] else '',
-                    "url_img": url_img,
-                    "urlImg": url_img,                               # ✅ AGREGAR
-                    "imagen": url_img,                               # ✅ AGREGAR
-                    "genero": row['genero'] if row['genero'] else 'Sin definir',
-                    "precio": float(row['precio']) if row['precio'] else 0.0,
-                    "stock": row['stock'] if row['stock'] else 0,
-                    "marca": row['marca'] if row['marca'] else '',
-                    "categoria": row['categoria'] if row['categoria'] else '',
-                    "nombreCategoria": row['categoria'] if row['categoria'] else '',  # ✅ AGREGAR
-                    "color": row['color'] if row['color'] else 'Sin color'
-                }
-                productos.append(producto)
+        except Exception as e:
+            return False, f"Error al listar productos: {str(e)}"
+    
+    def buscar(self, texto, offset=0, limite=20, campos=None, modo=None):
+        """
+        Busca productos activos por nombre, material, marca y categoría.
+        Usa full-text en español (sin acentos); si la primera página no tiene
+        coincidencias recurre a trigramas para tolerar errores de tipeo.
+        `modo` (del cursor) fija el de las páginas siguientes. Resultados
+        ordenados por relevancia.
+        """
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            
+            parametros = {
+                'q': texto,
+                'limite': limite + 1,   # una fila extra para saber si hay otra página
+                'offset': offset
+            }
+            
+            modo_pedido = modo
+            modo = modo_pedido or 'texto'
+            cursor.execute(SQL_BUSQUEDA.format(coincidencias=MODOS_BUSQUEDA[modo]), parametros)
+            resultados = cursor.fetchall()
+            
+            # ✅ SIN COINCIDENCIAS EXACTAS EN LA PRIMERA PÁGINA: BÚSQUEDA APROXIMADA
+            # (las páginas siguientes usan el modo que trae el cursor)
+            if not resultados and modo_pedido is None and offset == 0:
+                modo = 'aproximada'
+                cursor.execute(SQL_BUSQUEDA.format(coincidencias=MODOS_BUSQUEDA[modo]), parametros)
+                resultados = cursor.fetchall()
             
             cursor.close()
             con.close()
             
-            return True, productos
+            hay_mas = len(resultados) > limite
+            resultados = resultados[:limite]
+            
+            productos = serializar_listado(resultados, cliente_actual(), campos)
+            for producto, row in zip(productos, resultados):
+                producto['relevancia'] = round(float(row['relevancia']), 4)
+            
+            return True, {
+                'productos': productos,
+                'modo': modo,
+                'siguiente_cursor': f"{offset + limite}|{modo}" if hay_mas else None,
+                'hay_mas': hay_mas
+            }
                 
         except Exception as e:
-            return False, f"Error al listar productos: {str(e)}"
-        
+            return False, f"Error al buscar productos: {str(e)}"
+    
     def obtener_detalle_producto(self, id_prod_sucursal):
         """Obtiene detalle completo de un producto con todas sus tallas y colores"""
         try:
@@ -143,15 +385,7 @@ class ProductoSucursal:
             cursor.execute(sql_variantes, (id_prod_sucursal,))
             variantes = cursor.fetchall()
             
-            # ✅ DETECTAR ENTORNO Y CLIENTE
-            user_agent = request.headers.get('User-Agent', '').lower()
-            is_android = 'okhttp' in user_agent or 'android' in user_agent
-            
-            # ✅ DETERMINAR BASE_URL SEGÚN ENTORNO
-            if os.environ.get('RENDER'):
-                base_url = "https://usat-comercial-api.onrender.com" if is_android else ""
-            else:
-                base_url = "http://10.0.2.2:3007" if is_android else ""
+            cliente = cliente_actual()
             
             # ✅ AGRUPAR POR COLOR Y TALLA
             colores = {}
@@ -170,12 +404,7 @@ class ProductoSucursal:
                     }
                 
                 # ✅ CONSTRUIR URL COMPLETA PARA ANDROID
-                url_img = var['url_img'] if var['url_img'] else ''
-                if url_img and is_android:
-                    if not url_img.startswith('http'):
-                        if not url_img.startswith('/'):
-                            url_img = '/' + url_img
-                        url_img = base_url + url_img
+                url_img = url_imagen(var['url_img'], cliente)
                 
                 # ✅ INCLUIR id_prod_color EN CADA TALLA
                 colores[color_nombre]['tallas'][talla] = {
@@ -203,15 +432,12 @@ class ProductoSucursal:
             cursor.close()
             con.close()
             
-            print(f"✅ Producto: {resultado['nombre']}")
-            print(f"✅ Sucursal: {resultado['nombre_sucursal']}")
+            log.debug("Detalle de producto %s (%s) en %s", id_prod_sucursal, resultado['nombre'], resultado['nombre_sucursal'])
             
             return True, resultado
                 
         except Exception as e:
-            print(f"💥 ERROR en obtener_detalle_producto: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error en obtener_detalle_producto %s", id_prod_sucursal)
             return False, f"Error al obtener detalle: {str(e)}"
     
     def listar_todos(self, id_empresa=None):
@@ -347,6 +573,9 @@ class ProductoSucursal:
             resultado = cursor.fetchone()
             id_prod_sucursal = resultado['resultado']
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -433,6 +662,9 @@ class ProductoSucursal:
             """
             cursor.execute(sql_update, [id_sucursal, id_temporada, id_marca, id_categoria, id_tipo_modelo, nombre.strip(), material, genero, id_prod_sucursal])
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -463,6 +695,9 @@ class ProductoSucursal:
             sql_update = "UPDATE producto_sucursal SET estado = %s WHERE id_prod_sucursal = %s"
             cursor.execute(sql_update, [nuevo_estado, id_prod_sucursal])
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -506,6 +741,9 @@ class ProductoSucursal:
             sql_delete = "DELETE FROM producto_sucursal WHERE id_prod_sucursal = %s"
             cursor.execute(sql_delete, [id_prod_sucursal])
             
+            # ✅ INVALIDAR SNAPSHOT DEL CATÁLOGO (este worker y, vía NOTIFY, los demás)
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -538,6 +776,91 @@ class ProductoSucursal:
         except Exception as e:
             return 0
     
+    def estadisticas(self, id_empresa=None):
+        """
+        Estadísticas de variantes por producto (conteos, stock y rango de precios)
+        agrupadas en SQL, más un resumen de la empresa calculado sobre las mismas filas
+        """
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            
+            sql = """
+                SELECT 
+                    ps.id_prod_sucursal,
+                    ps.nombre,
+                    s.nombre as nombre_sucursal,
+                    m.nombre as nombre_marca,
+                    c.nombre as nombre_categoria,
+                    ps.estado,
+                    COUNT(pc.id_prod_color) as total_variantes,
+                    COUNT(pc.id_prod_color) FILTER (WHERE pc.estado = TRUE) as variantes_activas,
+                    COUNT(pc.id_prod_color) FILTER (WHERE pc.estado IS NOT TRUE) as variantes_inactivas,
+                    COALESCE(SUM(pc.stock) FILTER (WHERE pc.estado = TRUE), 0) as stock_total,
+                    MIN(pc.precio) FILTER (WHERE pc.estado = TRUE) as precio_min,
+                    MAX(pc.precio) FILTER (WHERE pc.estado = TRUE) as precio_max
+                FROM producto_sucursal ps
+                INNER JOIN sucursal s ON ps.id_sucursal = s.id_sucursal
+                INNER JOIN marca m ON ps.id_marca = m.id_marca
+                INNER JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
+                LEFT JOIN producto_color pc ON pc.id_prod_sucursal = ps.id_prod_sucursal
+            """
+            
+            parametros = []
+            if id_empresa:
+                sql += " WHERE s.id_empresa = %s"
+                parametros.append(id_empresa)
+            
+            sql += """
+                GROUP BY ps.id_prod_sucursal, ps.nombre, s.nombre, m.nombre, c.nombre, ps.estado
+                ORDER BY ps.id_prod_sucursal DESC
+            """
+            
+            cursor.execute(sql, parametros)
+            resultado = cursor.fetchall()
+            
+            cursor.close()
+            con.close()
+            
+            productos = []
+            for row in resultado:
+                productos.append({
+                    'id_prod_sucursal': row['id_prod_sucursal'],
+                    'nombre': row['nombre'],
+                    'nombre_sucursal': row['nombre_sucursal'],
+                    'nombre_marca': row['nombre_marca'],
+                    'nombre_categoria': row['nombre_categoria'],
+                    'estado': row['estado'],
+                    'total_variantes': row['total_variantes'],
+                    'variantes_activas': row['variantes_activas'],
+                    'variantes_inactivas': row['variantes_inactivas'],
+                    'stock_total': int(row['stock_total']),
+                    'precio_min': float(row['precio_min']) if row['precio_min'] is not None else None,
+                    'precio_max': float(row['precio_max']) if row['precio_max'] is not None else None
+                })
+            
+            activos = [p for p in productos if p['estado']]
+            precios_min = [p['precio_min'] for p in productos if p['precio_min'] is not None]
+            precios_max = [p['precio_max'] for p in productos if p['precio_max'] is not None]
+            
+            resumen = {
+                'total_productos': len(productos),
+                'productos_activos': len(activos),
+                'productos_inactivos': len(productos) - len(activos),
+                'productos_sin_variantes': sum(1 for p in productos if p['total_variantes'] == 0),
+                'productos_sin_stock': sum(1 for p in activos if p['stock_total'] == 0),
+                'total_variantes': sum(p['total_variantes'] for p in productos),
+                'variantes_activas': sum(p['variantes_activas'] for p in productos),
+                'stock_total': sum(p['stock_total'] for p in productos),
+                'precio_min': min(precios_min) if precios_min else None,
+                'precio_max': max(precios_max) if precios_max else None
+            }
+            
+            return True, {'productos': productos, 'resumen': resumen}
+                
+        except Exception as e:
+            return False, f"Error al obtener estadísticas: {str(e)}"
+    
     # ============================================
     # MÉTODOS AUXILIARES PARA SELECTS
     # ============================================
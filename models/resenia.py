@@ -1,4 +1,22 @@
 from conexionBD import Conexion
+from tools.cache_resenias import resenias_cache
+
+# Orden del listado por producto_sucursal: (ORDER BY, condición de la página siguiente).
+# El cursor siempre es (calificacion, fecha_resenia, id_resenia) de la última fila.
+ORDENES_RESENIAS = {
+    'recientes': (
+        "r.fecha_resenia DESC, r.id_resenia DESC",
+        "(r.fecha_resenia, r.id_resenia) < (%(fecha)s, %(id)s)"
+    ),
+    'mejores': (
+        "r.calificacion DESC, r.fecha_resenia DESC, r.id_resenia DESC",
+        "(r.calificacion, r.fecha_resenia, r.id_resenia) < (%(calificacion)s, %(fecha)s, %(id)s)"
+    ),
+    'peores': (
+        "r.calificacion ASC, r.fecha_resenia DESC, r.id_resenia DESC",
+        "(r.calificacion > %(calificacion)s OR (r.calificacion = %(calificacion)s AND (r.fecha_resenia, r.id_resenia) < (%(fecha)s, %(id)s)))"
+    )
+}
 
 class Resenia:
     def __init__(self):
@@ -122,6 +140,9 @@ class Resenia:
             resultado = cursor.fetchone()
             id_resenia = resultado['resultado']
             
+            if id_resenia and id_resenia > 0:
+                _invalidar_primera_pagina(cursor, _producto_de_resenia(cursor, id_resenia))
+            
             con.commit()
             cursor.close()
             con.close()
@@ -147,6 +168,9 @@ class Resenia:
             con = Conexion().open
             cursor = con.cursor()
             
+            # El producto se busca antes: la función puede cambiar o borrar la fila
+            id_prod_sucursal = _producto_de_resenia(cursor, id_resenia)
+            
             # Llamar a la función fn_resenia_modificar
             sql = "SELECT fn_resenia_modificar(%s, %s, %s, %s) as resultado"
             cursor.execute(sql, [id_resenia, titulo, comentario, calificacion])
@@ -154,6 +178,9 @@ class Resenia:
             resultado = cursor.fetchone()
             codigo = resultado['resultado']
             
+            if codigo == 0:
+                _invalidar_primera_pagina(cursor, id_prod_sucursal)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -175,6 +202,9 @@ class Resenia:
             con = Conexion().open
             cursor = con.cursor()
             
+            # El producto se busca antes: la función puede borrar la fila
+            id_prod_sucursal = _producto_de_resenia(cursor, id_resenia)
+            
             # Llamar a la función fn_resenia_eliminar
             sql = "SELECT fn_resenia_eliminar(%s) as resultado"
             cursor.execute(sql, [id_resenia])
@@ -182,6 +212,9 @@ class Resenia:
             resultado = cursor.fetchone()
             codigo = resultado['resultado']
             
+            if codigo == 0:
+                _invalidar_primera_pagina(cursor, id_prod_sucursal)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -194,25 +227,102 @@ class Resenia:
         except Exception as e:
             return False, f"Error al eliminar reseña: {str(e)}"
     
+    # ============================================
+    # LISTAR RESEÑAS POR PRODUCTO_SUCURSAL (PAGINADO)
+    # ============================================
+    def listar_por_producto_sucursal(self, id_prod_sucursal, orden='recientes', despues=None, limite=20):
+        """
+        Una página de reseñas de todos los colores de un producto_sucursal.
+        `despues` es el cursor (calificacion, fecha_resenia, id_resenia) de la
+        última fila de la página anterior. La primera página sale de la caché.
+        """
+        try:
+            if despues is None:
+                pagina = resenias_cache.obtener(
+                    (id_prod_sucursal, orden, limite),
+                    lambda: self._consultar_pagina(id_prod_sucursal, orden, None, limite)
+                )
+            else:
+                pagina = self._consultar_pagina(id_prod_sucursal, orden, despues, limite)
+            return True, pagina
+                
+        except Exception as e:
+            return False, f"Error al listar reseñas: {str(e)}"
+    
+    def _consultar_pagina(self, id_prod_sucursal, orden, despues, limite):
+        orden_sql, condicion_sql = ORDENES_RESENIAS[orden]
+        
+        parametros = {'id_prod_sucursal': id_prod_sucursal, 'limite': limite + 1}
+        condicion = ""
+        if despues is not None:
+            condicion = "AND " + condicion_sql
+            parametros['calificacion'], parametros['fecha'], parametros['id'] = despues
+        
+        con = Conexion().open
+        cursor = con.cursor()
+        
+        # Se pide una fila extra para saber si quedan más
+        sql = f"""
+            SELECT 
+                r.id_resenia,
+                r.id_usuario,
+                r.titulo,
+                r.comentario,
+                r.calificacion,
+                r.fecha_resenia AS fecha_orden,
+                TO_CHAR(r.fecha_resenia, 'YYYY-MM-DD HH24:MI') as fecha_resenia,
+                u.nomusuario as usuario,
+                p.nombres || ' ' || p.apellidos as nombre_completo,
+                u.img_logo as avatar_usuario
+            FROM resenia_producto r
+            INNER JOIN producto_color pc ON r.id_prod_color = pc.id_prod_color
+            INNER JOIN usuario u ON r.id_usuario = u.id_usuario
+            INNER JOIN persona p ON u.id_persona = p.id_persona
+            WHERE pc.id_prod_sucursal = %(id_prod_sucursal)s 
+              AND r.estado = TRUE
+              {condicion}
+            ORDER BY {orden_sql}
+            LIMIT %(limite)s
+        """
+        
+        cursor.execute(sql, parametros)
+        filas = cursor.fetchall()
+        
+        cursor.close()
+        con.close()
+        
+        hay_mas = len(filas) > limite
+        filas = filas[:limite]
+        
+        siguiente = None
+        if hay_mas:
+            ultima = filas[-1]
+            siguiente = f"{ultima['calificacion']}|{ultima['fecha_orden'].isoformat()}|{ultima['id_resenia']}"
+        
+        return {
+            'data': [{
+                'id_resenia': row['id_resenia'],
+                'id_usuario': row['id_usuario'],
+                'titulo': row['titulo'],
+                'comentario': row['comentario'],
+                'calificacion': row['calificacion'],
+                'fecha_resenia': row['fecha_resenia'],
+                'usuario': row['usuario'],
+                'nombre_completo': row['nombre_completo'],
+                'avatar_usuario': row['avatar_usuario'] if row['avatar_usuario'] else None
+            } for row in filas],
+            'hay_mas': hay_mas,
+            'siguiente': siguiente
+        }
+    
     # ============================================
     # OBTENER PROMEDIO DE CALIFICACIÓN
     # ============================================
     def obtener_promedio_calificacion(self, id_prod_color):
-        """Obtener el promedio de calificación de un producto"""
+        """Obtener el promedio de calificación de un producto (desde resenia_resumen_color)"""
         try:
-            con = Conexion().open
-            cursor = con.cursor()
-            
-            sql = "SELECT fn_resenia_promedio_calificacion(%s) as promedio"
-            cursor.execute(sql, [id_prod_color])
-            
-            resultado = cursor.fetchone()
-            
-            cursor.close()
-            con.close()
-            
-            promedio = float(resultado['promedio']) if resultado and resultado['promedio'] else 0.0
-            return True, promedio
+            resumen = self._resumen_color(id_prod_color)
+            return True, _promedio(resumen)
                 
         except Exception as e:
             return False, f"Error al obtener promedio: {str(e)}"
@@ -221,20 +331,10 @@ class Resenia:
     # CONTAR RESEÑAS
     # ============================================
     def contar_por_producto(self, id_prod_color):
-        """Contar total de reseñas de un producto"""
+        """Contar total de reseñas de un producto (desde resenia_resumen_color)"""
         try:
-            con = Conexion().open
-            cursor = con.cursor()
-            
-            sql = "SELECT fn_resenia_contar_por_producto(%s) as total"
-            cursor.execute(sql, [id_prod_color])
-            
-            resultado = cursor.fetchone()
-            
-            cursor.close()
-            con.close()
-            
-            return resultado['total'] if resultado else 0
+            resumen = self._resumen_color(id_prod_color)
+            return resumen['total'] if resumen else 0
                 
         except Exception as e:
             return 0
@@ -344,50 +444,116 @@ class Resenia:
     # ============================================
     def obtener_estadisticas(self, id_prod_color):
         """Obtener estadísticas detalladas de calificaciones de un producto"""
+        try:
+            resumen = self._resumen_color(id_prod_color) or {}
+            
+            return True, {
+                'total_resenias': resumen.get('total', 0),
+                'promedio': _promedio(resumen),
+                'cinco_estrellas': resumen.get('estrellas_5', 0),
+                'cuatro_estrellas': resumen.get('estrellas_4', 0),
+                'tres_estrellas': resumen.get('estrellas_3', 0),
+                'dos_estrellas': resumen.get('estrellas_2', 0),
+                'una_estrella': resumen.get('estrellas_1', 0)
+            }
+                
+        except Exception as e:
+            return False, f"Error al obtener estadísticas: {str(e)}"
+    
+    # ============================================
+    # ESTADÍSTICAS POR PRODUCTO_SUCURSAL (TODAS SUS VARIANTES)
+    # ============================================
+    def obtener_estadisticas_producto_sucursal(self, id_prod_sucursal):
+        """Promedio, total y distribución por estrellas de un producto_sucursal"""
+        try:
+            exito, resumenes = self.obtener_resumen_productos([id_prod_sucursal])
+            if not exito:
+                return False, resumenes
+            
+            return True, resumenes[0]
+                
+        except Exception as e:
+            return False, f"Error al obtener estadísticas: {str(e)}"
+    
+    # ============================================
+    # RESUMEN DE CALIFICACIONES EN LOTE (TARJETAS DEL CATÁLOGO)
+    # ============================================
+    def obtener_resumen_productos(self, ids_prod_sucursal):
+        """Promedio, total y distribución de varios producto_sucursal en una consulta (en el orden pedido)"""
         try:
             con = Conexion().open
             cursor = con.cursor()
             
             sql = """
-                SELECT 
-                    COUNT(*) as total_resenias,
-                    ROUND(AVG(calificacion), 1) as promedio,
-                    COUNT(CASE WHEN calificacion = 5 THEN 1 END) as cinco_estrellas,
-                    COUNT(CASE WHEN calificacion = 4 THEN 1 END) as cuatro_estrellas,
-                    COUNT(CASE WHEN calificacion = 3 THEN 1 END) as tres_estrellas,
-                    COUNT(CASE WHEN calificacion = 2 THEN 1 END) as dos_estrellas,
-                    COUNT(CASE WHEN calificacion = 1 THEN 1 END) as una_estrella
-                FROM resenia_producto
-                WHERE id_prod_color = %s
-                  AND estado = TRUE
+                SELECT id_prod_sucursal, total, suma,
+                       estrellas_1, estrellas_2, estrellas_3, estrellas_4, estrellas_5
+                FROM resenia_resumen_producto
+                WHERE id_prod_sucursal = ANY(%s)
             """
             
-            cursor.execute(sql, [id_prod_color])
-            resultado = cursor.fetchone()
+            cursor.execute(sql, [list(ids_prod_sucursal)])
+            por_id = {row['id_prod_sucursal']: row for row in cursor.fetchall()}
             
             cursor.close()
             con.close()
             
-            if resultado:
-                return True, {
-                    'total_resenias': resultado['total_resenias'],
-                    'promedio': float(resultado['promedio']) if resultado['promedio'] else 0.0,
-                    'cinco_estrellas': resultado['cinco_estrellas'],
-                    'cuatro_estrellas': resultado['cuatro_estrellas'],
-                    'tres_estrellas': resultado['tres_estrellas'],
-                    'dos_estrellas': resultado['dos_estrellas'],
-                    'una_estrella': resultado['una_estrella']
-                }
-            else:
-                return True, {
-                    'total_resenias': 0,
-                    'promedio': 0.0,
-                    'cinco_estrellas': 0,
-                    'cuatro_estrellas': 0,
-                    'tres_estrellas': 0,
-                    'dos_estrellas': 0,
-                    'una_estrella': 0
-                }
+            resumenes = []
+            for id_prod_sucursal in ids_prod_sucursal:
+                resumen = por_id.get(id_prod_sucursal, {})
+                resumenes.append({
+                    'id_prod_sucursal': id_prod_sucursal,
+                    'promedio': _promedio(resumen),
+                    'total': resumen.get('total', 0),
+                    'distribucion': {
+                        str(estrellas): resumen.get(f'estrellas_{estrellas}', 0)
+                        for estrellas in range(5, 0, -1)
+                    }
+                })
+            return True, resumenes
                 
         except Exception as e:
-            return False, f"Error al obtener estadísticas: {str(e)}"
\ No newline at end of file
+            return False, f"Error al obtener resumen de calificaciones: {str(e)}"
+    
+    def _resumen_color(self, id_prod_color):
+        con = Conexion().open
+        cursor = con.cursor()
+        
+        sql = """
+            SELECT total, suma,
+                   estrellas_1, estrellas_2, estrellas_3, estrellas_4, estrellas_5
+            FROM resenia_resumen_color
+            WHERE id_prod_color = %s
+        """
+        
+        cursor.execute(sql, [id_prod_color])
+        resultado = cursor.fetchone()
+        
+        cursor.close()
+        con.close()
+        
+        return resultado
+
+
+def _producto_de_resenia(cursor, id_resenia):
+    """id_prod_sucursal de la reseña (None si no existe)"""
+    cursor.execute("""
+        SELECT pc.id_prod_sucursal
+        FROM resenia_producto r
+        INNER JOIN producto_color pc ON r.id_prod_color = pc.id_prod_color
+        WHERE r.id_resenia = %s
+    """, [id_resenia])
+    row = cursor.fetchone()
+    return row['id_prod_sucursal'] if row else None
+
+
+def _invalidar_primera_pagina(cursor, id_prod_sucursal):
+    """Encola la invalidación de la caché de reseñas del producto (misma transacción)"""
+    if id_prod_sucursal is not None:
+        resenias_cache.invalidar(id_prod_sucursal, cursor)
+
+
+def _promedio(resumen):
+    """Promedio a un decimal a partir de la suma y el total precalculados"""
+    if not resumen or not resumen.get('total'):
+        return 0.0
+    return round(float(resumen['suma']) / resumen['total'], 1)
@@ -0,0 +1,76 @@
+from conexionBD import Conexion
+from tools.cola_trabajos import CANAL_TRABAJOS
+from tools.escucha_pg import notificar
+
+# Columnas expuestas por la API (los datos binarios nunca se devuelven)
+COLUMNAS_TRABAJO = """
+    id_trabajo, tipo, payload, estado, intentos, max_intentos,
+    ejecutar_en, tomado_en, tomado_por, resultado, ultimo_error,
+    fecha_creacion, fecha_fin
+"""
+
+
+class Trabajo:
+    def obtener(self, id_trabajo):
+        """Estado de un trabajo de la cola"""
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            cursor.execute(f"SELECT {COLUMNAS_TRABAJO} FROM trabajo WHERE id_trabajo = %s", [id_trabajo])
+            trabajo = cursor.fetchone()
+            cursor.close()
+            con.close()
+            if not trabajo:
+                return False, 'Trabajo no encontrado'
+            return True, trabajo
+        except Exception as e:
+            return False, f"Error: {str(e)}"
+
+    def listar(self, estado=None, tipo=None, limite=50):
+        """Últimos trabajos, con filtro opcional por estado (p. ej. 'muerto') y tipo"""
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            cursor.execute(f"""
+                SELECT {COLUMNAS_TRABAJO}
+                FROM trabajo
+                WHERE (%(estado)s::varchar IS NULL OR estado = %(estado)s)
+                  AND (%(tipo)s::varchar IS NULL OR tipo = %(tipo)s)
+                ORDER BY id_trabajo DESC
+                LIMIT %(limite)s
+            """, {'estado': estado, 'tipo': tipo, 'limite': limite})
+            trabajos = cursor.fetchall()
+
+            cursor.execute("SELECT estado, COUNT(*) AS total FROM trabajo GROUP BY estado")
+            resumen = {row['estado']: row['total'] for row in cursor.fetchall()}
+            cursor.close()
+            con.close()
+            return True, {'trabajos': trabajos, 'resumen': resumen}
+        except Exception as e:
+            return False, f"Error: {str(e)}"
+
+    def reintentar(self, id_trabajo):
+        """Devuelve a la cola un trabajo muerto, con sus intentos en cero"""
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            cursor.execute("""
+                UPDATE trabajo
+                SET estado = 'pendiente', intentos = 0, ejecutar_en = now(),
+                    fecha_fin = NULL
+                WHERE id_trabajo = %s AND estado = 'muerto'
+                RETURNING id_trabajo, tipo
+            """, [id_trabajo])
+            trabajo = cursor.fetchone()
+            if not trabajo:
+                con.rollback()
+                cursor.close()
+                con.close()
+                return False, 'Solo se pueden reintentar trabajos en estado muerto'
+            notificar(cursor, CANAL_TRABAJOS, trabajo['tipo'])
+            con.commit()
+            cursor.close()
+            con.close()
+            return True, 'Trabajo devuelto a la cola'
+        except Exception as e:
+            return False, f"Error: {str(e)}"
@@ -1,4 +1,19 @@
-from conexionBD import Conexion
+import logging
+from conexionBD import Conexion, cursor_tipado
+from tools.cache_catalogo import catalogo
+
+# Granularidad del reporte -> unidad de date_trunc
+GRANULARIDADES_REPORTE = {
+    'dia': 'day',
+    'semana': 'week',
+    'mes': 'month',
+    'anio': 'year'
+}
+
+# Mensaje de registrar_uso_cupon cuando otra compra ya registró el cupón
+CUPON_YA_USADO = 'El cupón ya fue usado'
+
+log = logging.getLogger(__name__)
 
 class Venta:
     def __init__(self):
@@ -6,15 +21,10 @@ class Venta:
     
     def crear_venta_completa(self, id_usuario, id_sucursal, id_tarjeta, id_cupon=None):
         """Crear venta completa desde el carrito con soporte de cupones"""
+        con = Conexion().open
+        cursor = con.cursor()
         try:
-            con = Conexion().open
-            cursor = con.cursor()
-            
-            print(f"\n🔍 EJECUTANDO fn_crear_venta_completa:")
-            print(f"   Usuario: {id_usuario}")
-            print(f"   Sucursal: {id_sucursal}")
-            print(f"   Tarjeta: {id_tarjeta}")
-            print(f"   Cupón: {id_cupon if id_cupon else 'Sin cupón'}")
+            log.debug("fn_crear_venta_completa: usuario=%s sucursal=%s cupón=%s", id_usuario, id_sucursal, id_cupon)
             
             # ✅ PASAR id_cupon A LA FUNCIÓN
             cursor.execute("""
@@ -23,36 +33,29 @@ class Venta:
             
             resultado = cursor.fetchone()
             
-            print(f"\n📊 RESULTADO DE LA FUNCIÓN:")
-            print(f"   ID Venta: {resultado['id_venta']}")
-            print(f"   Código: {resultado['codigo_venta']}")
-            print(f"   Mensaje: {resultado['mensaje']}")
-            
-            con.commit()
-            cursor.close()
-            con.close()
+            if resultado:
+                log.debug("fn_crear_venta_completa -> venta %s (%s): %s",
+                          resultado['id_venta'], resultado['codigo_venta'], resultado['mensaje'])
             
+            venta_info = None
             if resultado and resultado['id_venta'] > 0:
-                # ✅ OBTENER EL TOTAL DESDE LA BD (YA CON DESCUENTO)
-                con2 = Conexion().open
-                cursor2 = con2.cursor()
-                
-                cursor2.execute("""
+                # ✅ OBTENER EL TOTAL DESDE LA BD (YA CON DESCUENTO) EN LA MISMA CONEXIÓN
+                cursor.execute("""
                     SELECT total, descuento, subtotal, impuesto 
                     FROM venta 
                     WHERE id_venta = %s
                 """, [resultado['id_venta']])
-                venta_info = cursor2.fetchone()
-                
-                cursor2.close()
-                con2.close()
-                
+                venta_info = cursor.fetchone()
+            
+            # ✅ EL STOCK CAMBIÓ: INVALIDAR SNAPSHOT DEL CATÁLOGO
+            catalogo.invalidar(cursor)
+            
+            con.commit()
+            
+            if resultado and resultado['id_venta'] > 0:
                 total_venta = float(venta_info['total']) if venta_info else 0.0
                 descuento = float(venta_info['descuento']) if venta_info else 0.0
                 
-                print(f"   ✅ Total recuperado: {total_venta}")
-                print(f"   ✅ Descuento aplicado: {descuento}")
-                
                 return True, {
                     'id_venta': resultado['id_venta'],
                     'codigo_venta': resultado['codigo_venta'],
@@ -63,10 +66,148 @@ class Venta:
             else:
                 return False, resultado['mensaje'] if resultado else 'Error al crear venta'
         except Exception as e:
-            print(f"\n💥 ERROR EN crear_venta_completa: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            # ✅ DESHACER EL SAVEPOINT: LA CONEXIÓN COMPARTIDA SIGUE USABLE PARA LA SIGUIENTE SUCURSAL
+            con.rollback()
+            log.exception("Error en crear_venta_completa")
             return False, f"Error: {str(e)}"
+        finally:
+            cursor.close()
+            con.close()
+    
+    def crear_ventas_por_sucursal(self, id_usuario, sucursales, id_tarjeta, id_cupon=None):
+        """
+        Crea las ventas de todas las sucursales del carrito con una sola llamada SQL
+        (fn_crear_venta_completa por sucursal vía LATERAL). El cupón solo se aplica
+        en la venta de su propia sucursal. Devuelve (ventas_creadas, errores).
+        """
+        con = None
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            
+            cursor.execute("""
+                SELECT s.id_sucursal, r.id_venta, r.codigo_venta, r.mensaje
+                FROM unnest(%s::int[]) WITH ORDINALITY AS s(id_sucursal, orden)
+                CROSS JOIN LATERAL fn_crear_venta_completa(
+                    %s, s.id_sucursal, %s,
+                    CASE WHEN s.id_sucursal = (SELECT id_sucursal FROM cupon WHERE id_cupon = %s)
+                         THEN %s::int END
+                ) AS r
+                ORDER BY s.orden
+            """, [sucursales, id_usuario, id_tarjeta, id_cupon, id_cupon])
+            resultados = cursor.fetchall()
+            
+            ids_creados = [r['id_venta'] for r in resultados if r['id_venta'] and r['id_venta'] > 0]
+            totales = {}
+            if ids_creados:
+                # ✅ TOTALES (YA CON DESCUENTO) DE TODAS LAS VENTAS EN UNA CONSULTA
+                cursor.execute("""
+                    SELECT id_venta, total, descuento
+                    FROM venta
+                    WHERE id_venta = ANY(%s)
+                """, [ids_creados])
+                totales = {row['id_venta']: row for row in cursor.fetchall()}
+            
+            # ✅ EL STOCK CAMBIÓ: INVALIDAR SNAPSHOT DEL CATÁLOGO
+            catalogo.invalidar(cursor)
+            
+            con.commit()
+            cursor.close()
+            con.close()
+        except Exception as e:
+            # Una sucursal lanzó una excepción y abortó la llamada conjunta:
+            # se reintenta una por una para aislarla y reportar el resto.
+            log.warning("Falló la venta conjunta (%s), reintentando por sucursal", e)
+            if con is not None and not con.closed:
+                con.rollback()
+                con.close()
+            return self._crear_ventas_una_por_una(id_usuario, sucursales, id_tarjeta, id_cupon)
+        
+        ventas_creadas = []
+        errores = []
+        for row in resultados:
+            if row['id_venta'] and row['id_venta'] > 0:
+                venta_info = totales.get(row['id_venta'])
+                ventas_creadas.append({
+                    'id_venta': row['id_venta'],
+                    'codigo_venta': row['codigo_venta'],
+                    'total': float(venta_info['total']) if venta_info else 0.0,
+                    'descuento': float(venta_info['descuento']) if venta_info else 0.0,
+                    'mensaje': row['mensaje']
+                })
+            else:
+                errores.append({
+                    'id_sucursal': row['id_sucursal'],
+                    'error': row['mensaje'] if row['mensaje'] else 'Error al crear venta'
+                })
+        
+        return ventas_creadas, errores
+    
+    def _crear_ventas_una_por_una(self, id_usuario, sucursales, id_tarjeta, id_cupon=None):
+        """Camino de respaldo: una venta por sucursal, cada una aislada en su propio savepoint"""
+        id_sucursal_cupon = None
+        if id_cupon:
+            try:
+                con = Conexion().open
+                cursor = con.cursor()
+                cursor.execute("SELECT id_sucursal FROM cupon WHERE id_cupon = %s", [id_cupon])
+                cupon_info = cursor.fetchone()
+                if cupon_info:
+                    id_sucursal_cupon = cupon_info['id_sucursal']
+                cursor.close()
+                con.close()
+            except Exception as e:
+                log.warning("Error al obtener sucursal del cupón %s: %s", id_cupon, e)
+        
+        ventas_creadas = []
+        errores = []
+        for id_sucursal in sucursales:
+            cupon_para_esta_venta = id_cupon if id_sucursal == id_sucursal_cupon else None
+            exito, resultado = self.crear_venta_completa(id_usuario, id_sucursal, id_tarjeta, cupon_para_esta_venta)
+            if exito:
+                ventas_creadas.append(resultado)
+            else:
+                errores.append({
+                    'id_sucursal': id_sucursal,
+                    'error': resultado
+                })
+        return ventas_creadas, errores
+    
+    def registrar_uso_cupon(self, id_cupon, id_usuario, id_venta):
+        """
+        Registra el uso del cupón en la venta e incrementa su contador. Va en
+        la transacción de la compra: si el request falla, el uso tampoco queda.
+        El índice único (sql/010) evita el doble uso entre compras simultáneas.
+        """
+        con = Conexion().open
+        cursor = con.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO cupon_usuario (id_cupon, id_usuario, id_venta, fecha_uso)
+                VALUES (%s, %s, %s, NOW())
+                ON CONFLICT (id_cupon, id_usuario) DO NOTHING
+            """, [id_cupon, id_usuario, id_venta])
+
+            if cursor.rowcount == 0:
+                # Otra compra simultánea del mismo usuario registró el cupón primero
+                log.info("El usuario %s ya usó el cupón %s", id_usuario, id_cupon)
+                return False, CUPON_YA_USADO
+
+            cursor.execute("""
+                UPDATE cupon
+                SET cantidad_usada = cantidad_usada + 1
+                WHERE id_cupon = %s
+            """, [id_cupon])
+
+            con.commit()
+            return True, f'Cupón registrado en venta {id_venta}'
+        except Exception as e:
+            con.rollback()
+            log.exception("Error al registrar el uso del cupón %s", id_cupon)
+            return False, f"Error: {str(e)}"
+        finally:
+            cursor.close()
+            con.close()
     
     def crear_venta_multiple(self, id_usuario, id_sucursal, id_tarjeta):
         """Crear venta vacía (para agregar detalles después)"""
@@ -103,6 +244,9 @@ class Venta:
             
             resultado = cursor.fetchone()
             
+            # ✅ EL STOCK CAMBIÓ: INVALIDAR SNAPSHOT DEL CATÁLOGO
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -122,19 +266,20 @@ class Venta:
         """Listar productos comprados individualmente (sin agrupar por venta)"""
         try:
             con = Conexion().open
-            cursor = con.cursor()
+            # NUMERIC -> float y fecha -> texto ISO: las filas van directo al JSON
+            cursor = cursor_tipado(con)
             
             sql = """
                 SELECT 
                     dv.id_detalle_venta,
                     v.id_venta,
                     v.codigo_qr as codigo_venta,
-                    v.created_at as fecha_venta,
-                    dv.sub_total as total,
+                    COALESCE(v.created_at::text, '') as fecha_venta,
+                    COALESCE(dv.sub_total, 0) as total,
                     v.estado,
                     s.nombre as nombre_sucursal,
                     ps.nombre as nombre_producto,
-                    pc.url_img as url_img_producto,
+                    COALESCE(pc.url_img, '') as url_img_producto,
                     c.nombre as color,
                     pc.talla as talla
                 FROM detalle_venta dv
@@ -153,47 +298,10 @@ class Venta:
             cursor.close()
             con.close()
             
-            print(f"\n{'='*60}")
-            print(f"📊 PRODUCTOS ENCONTRADOS PARA USUARIO {id_usuario}: {len(resultados)}")
-            print(f"{'='*60}")
-            
-            if resultados:
-                productos = []
-                for row in resultados:
-                    url_img = row['url_img_producto'] if row['url_img_producto'] else ''
-                    
-                    print(f"\n🔍 Producto:")
-                    print(f"   - Nombre: {row['nombre_producto']}")
-                    print(f"   - Sucursal: {row['nombre_sucursal']}")
-                    print(f"   - Color: {row['color']}")
-                    print(f"   - Talla: {row['talla']}")
-                    print(f"   - Precio: {row['total']}")
-                    print(f"   - URL Original: {url_img}")
-                    
-                    producto = {
-                        'id_detalle_venta': row['id_detalle_venta'],
-                        'id_venta': row['id_venta'],
-                        'codigo_venta': row['codigo_venta'],
-                        'fecha_venta': str(row['fecha_venta']) if row['fecha_venta'] else '',
-                        'total': float(row['total']) if row['total'] else 0.0,
-                        'estado': row['estado'],
-                        'nombre_sucursal': row['nombre_sucursal'],
-                        'nombre_producto': row['nombre_producto'],
-                        'url_img_producto': url_img,
-                        'color': row['color'],
-                        'talla': row['talla']
-                    }
-                    productos.append(producto)
-                
-                print(f"\n✅ Total productos procesados: {len(productos)}")
-                return True, productos
-            else:
-                print("\n⚠️ No se encontraron productos")
-                return True, []
+            log.debug("Productos comprados por el usuario %s: %d", id_usuario, len(resultados))
+            return True, resultados
         except Exception as e:
-            print(f"\n💥 ERROR: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error al listar compras del usuario %s", id_usuario)
             return False, f"Error: {str(e)}"
     
     def obtener_detalle(self, id_venta):
@@ -267,6 +375,9 @@ class Venta:
             cursor.execute("SELECT fn_cancelar_venta(%s) as resultado", [id_venta])
             resultado = cursor.fetchone()
             
+            # ✅ EL STOCK CAMBIÓ: INVALIDAR SNAPSHOT DEL CATÁLOGO
+            catalogo.invalidar(cursor)
+            
             con.commit()
             cursor.close()
             con.close()
@@ -276,4 +387,87 @@ class Venta:
             else:
                 return False, 'Error al cancelar venta'
         except Exception as e:
-            return False, f"Error: {str(e)}"
\ No newline at end of file
+            return False, f"Error: {str(e)}"
+    
+    def reporte_por_sucursal(self, id_sucursal, desde, hasta, granularidad='dia'):
+        """
+        Totales de una sucursal entre dos fechas (inclusive) agrupados por
+        día, semana, mes o año, leídos de los acumulados de venta_diaria
+        """
+        try:
+            con = Conexion().open
+            cursor = con.cursor()
+            
+            cursor.execute("""
+                SELECT 
+                    date_trunc(%s, fecha)::date as periodo,
+                    SUM(ventas) as ventas,
+                    SUM(ventas_canceladas) as ventas_canceladas,
+                    SUM(ventas_entregadas) as ventas_entregadas,
+                    SUM(subtotal) as subtotal,
+                    SUM(descuento) as descuento,
+                    SUM(impuesto) as impuesto,
+                    SUM(total) as total,
+                    SUM(total_cancelado) as total_cancelado,
+                    SUM(productos) as productos,
+                    SUM(unidades) as unidades,
+                    SUM(cupones_usados) as cupones_usados
+                FROM venta_diaria
+                WHERE id_sucursal = %s
+                  AND fecha BETWEEN %s AND %s
+                GROUP BY 1
+                ORDER BY 1
+            """, [GRANULARIDADES_REPORTE[granularidad], id_sucursal, desde, hasta])
+            
+            resultados = cursor.fetchall()
+            
+            cursor.close()
+            con.close()
+            
+            montos = ('subtotal', 'descuento', 'impuesto', 'total', 'total_cancelado')
+            conteos = ('ventas', 'ventas_canceladas', 'ventas_entregadas', 'productos', 'unidades', 'cupones_usados')
+            
+            periodos = []
+            for row in resultados:
+                periodo = {'periodo': row['periodo'].isoformat()}
+                periodo.update({campo: float(row[campo]) for campo in montos})
+                periodo.update({campo: int(row[campo]) for campo in conteos})
+                periodos.append(periodo)
+            
+            resumen = {campo: round(sum(p[campo] for p in periodos), 2) for campo in montos}
+            resumen.update({campo: sum(p[campo] for p in periodos) for campo in conteos})
+            
+            return True, {'periodos': periodos, 'resumen': resumen}
+        except Exception as e:
+            return False, f"Error: {str(e)}"
+    
+    def consulta_exportacion(self, id_sucursal, desde=None, hasta=None):
+        """SQL y parámetros de la exportación venta por venta de una sucursal, para un cursor de servidor"""
+        sql = """
+            SELECT 
+                v.id_venta,
+                v.codigo_qr as codigo_venta,
+                v.created_at as fecha_venta,
+                u.nomusuario as nombre_usuario,
+                v.subtotal,
+                v.descuento,
+                v.impuesto,
+                v.total,
+                v.estado,
+                v.entregado,
+                (SELECT COUNT(*) FROM detalle_venta dv WHERE dv.id_venta = v.id_venta AND dv.estado = TRUE) as cantidad_productos
+            FROM venta v
+            INNER JOIN usuario u ON v.id_usuario = u.id_usuario
+            WHERE v.id_sucursal = %s
+        """
+        
+        parametros = [id_sucursal]
+        if desde:
+            sql += " AND v.created_at >= %s"
+            parametros.append(desde)
+        if hasta:
+            # hasta es inclusive: todo el día
+            sql += " AND v.created_at < %s::date + 1"
+            parametros.append(hasta)
+        
+        return sql + " ORDER BY v.created_at, v.id_venta", parametros
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
-import os
 from models.carrito import Carrito
+from tools.serializador_productos import cliente_actual
+from tools.json_rapido import respuesta_json_crudo
 
 ws_carrito = Blueprint('ws_carrito', __name__)
 
@@ -24,38 +25,12 @@ def listar_carrito(id_usuario):
     """
     try:
         carrito = Carrito()
-        exito, resultado = carrito.listar_carrito(id_usuario)
+        # Las URLs relativas se completan en el SQL (solo Android recibe la URL absoluta)
+        exito, resultado = carrito.listar_carrito(id_usuario, cliente_actual().base_url)
         
         if exito:
-            user_agent = request.headers.get('User-Agent', '').lower()
-            is_android = 'okhttp' in user_agent or 'android' in user_agent
-            
-            if os.environ.get('RENDER'):
-                base_url = "https://usat-comercial-api.onrender.com" if is_android else ""
-            else:
-                base_url = "http://10.0.2.2:3007" if is_android else ""
-            
-            for sucursal in resultado:
-                logo_url = sucursal.get('logo_sucursal', '')
-                if logo_url and is_android:
-                    if not logo_url.startswith('http'):
-                        if not logo_url.startswith('/'):
-                            logo_url = '/' + logo_url
-                        sucursal['logo_sucursal'] = base_url + logo_url
-                
-                for producto in sucursal['productos']:
-                    url_img = producto.get('url_img', '')
-                    if url_img and is_android:
-                        if not url_img.startswith('http'):
-                            if not url_img.startswith('/'):
-                                url_img = '/' + url_img
-                            producto['url_img'] = base_url + url_img
-            
-            return jsonify({
-                'status': True,
-                'data': resultado,
-                'message': 'Carrito listado correctamente'
-            }), 200
+            # El JSON viene armado desde Postgres: se envía sin parsear
+            return respuesta_json_crudo(resultado, 'Carrito listado correctamente'), 200
         else:
             return jsonify({
                 'status': False,
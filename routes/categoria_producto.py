@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from models.categoria_producto import CategoriaProducto
-import cloudinary.uploader
+from tools.cache_http import cache_publico
+from tools.trabajos import subir_a_cloudinary
 
 ws_categoria_producto = Blueprint('ws_categoria_producto', __name__)
 
@@ -9,35 +10,12 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def subir_a_cloudinary(file, folder):
-    """Subir imagen a Cloudinary"""
-    try:
-        if not file:
-            return None
-        
-        print(f"📤 Subiendo categoría a Cloudinary: {file.filename}")
-        
-        resultado = cloudinary.uploader.upload(
-            file,
-            folder=f"centro_comercial/{folder}",
-            resource_type="auto",
-            overwrite=True,
-            invalidate=True
-        )
-        
-        url = resultado['secure_url']
-        print(f"✅ URL Cloudinary: {url}")
-        return url
-        
-    except Exception as e:
-        print(f"❌ Error Cloudinary: {str(e)}")
-        return None
-
 # ============================================
 # ENDPOINTS EXISTENTES (Frontend público)
 # ============================================
 
 @ws_categoria_producto.route('/categorias/listar', methods=['GET'])
+@cache_publico(max_age=300, stale_while_revalidate=3600)
 def listar_categorias():
     """
     Listar categorías activas para el frontend público
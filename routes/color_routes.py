@@ -1,10 +1,12 @@
 from flask import Blueprint, jsonify, request
 from models.color import Color
+from tools.cache_http import cache_publico
 
 ws_color = Blueprint('ws_color', __name__)
 color_model = Color()
 
 @ws_color.route('/colores/listar', methods=['GET'])
+@cache_publico()
 def listar_colores():
     """
     Listar todos los colores
@@ -1,11 +1,18 @@
+import logging
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from models.conversacion import Conversacion
 from models.mensaje import Mensaje
 from conexionBD import Conexion
 from config import Config
 
+LIMITE_BANDEJA = 50
+LIMITE_BANDEJA_MAXIMO = 200
+
 ws_conversacion = Blueprint('conversacion', __name__)
 
+log = logging.getLogger(__name__)
+
 # =====================================================
 # INICIAR O RECUPERAR CONVERSACIÓN
 # =====================================================
@@ -45,12 +52,10 @@ def iniciar_conversacion():
         id_usuario = data.get('id_usuario')
         id_sucursal = data.get('id_sucursal')
         
-        print(f"📩 POST /conversacion/iniciar")
-        print(f"   Usuario: {id_usuario}")
-        print(f"   Sucursal: {id_sucursal}")
+        log.debug("Iniciar conversación: usuario=%s sucursal=%s", id_usuario, id_sucursal)
         
         if not id_usuario or not id_sucursal:
-            print("❌ Faltan datos requeridos")
+            log.warning("Faltan datos requeridos")
             return jsonify({
                 'status': False,
                 'message': 'Faltan datos requeridos'
@@ -58,9 +63,7 @@ def iniciar_conversacion():
         
         resultado = Conversacion.buscar_o_crear(id_usuario, id_sucursal)
         
-        print(f"📤 Resultado Model:")
-        print(f"   Success: {resultado.get('success')}")
-        print(f"   Data: {resultado.get('data')}")
+        log.debug("Iniciar conversación -> success=%s", resultado.get('success'))
         
         if resultado.get('success'):
             return jsonify({
@@ -75,9 +78,7 @@ def iniciar_conversacion():
             }), 400
             
     except Exception as e:
-        print(f"❌ EXCEPTION en route: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en iniciar_conversacion")
         
         return jsonify({
             'status': False,
@@ -110,13 +111,13 @@ def listar_conversaciones(id_usuario):
         description: Error interno del servidor
     """
     try:
-        print(f"📋 Listando conversaciones del usuario: {id_usuario}")
+        log.debug("Listando conversaciones del usuario: %s", id_usuario)
         
         resultado = Conversacion.listar_por_usuario(id_usuario)
         
         if resultado.get('success'):
             conversaciones = resultado.get('data', [])
-            print(f"✅ {len(conversaciones)} conversaciones encontradas")
+            log.debug("%d conversaciones encontradas", len(conversaciones))
             
             return jsonify({
                 'status': True,
@@ -129,7 +130,7 @@ def listar_conversaciones(id_usuario):
             }), 400
             
     except Exception as e:
-        print(f"❌ Error en listar_conversaciones: {e}")
+        log.exception("Error en listar_conversaciones")
         return jsonify({
             'status': False,
             'message': str(e)
@@ -161,7 +162,7 @@ def obtener_conversacion(id_conversacion):
         description: Error interno del servidor
     """
     try:
-        print(f"🔍 Obteniendo conversación: {id_conversacion}")
+        log.debug("Obteniendo conversación: %s", id_conversacion)
         
         conversacion = Conversacion.obtener_por_id(id_conversacion)
         
@@ -177,7 +178,7 @@ def obtener_conversacion(id_conversacion):
             }), 404
             
     except Exception as e:
-        print(f"❌ Error en obtener_conversacion: {e}")
+        log.exception("Error en obtener_conversacion")
         return jsonify({
             'status': False,
             'message': str(e)
@@ -223,7 +224,7 @@ def archivar_conversacion():
         id_conversacion = data.get('id_conversacion')
         id_usuario = data.get('id_usuario')
         
-        print(f"🗄️ Archivando conversación: {id_conversacion}")
+        log.debug("Archivando conversación: %s", id_conversacion)
         
         resultado = Conversacion.archivar(id_conversacion, id_usuario)
         
@@ -239,7 +240,7 @@ def archivar_conversacion():
             }), 400
             
     except Exception as e:
-        print(f"❌ Error en archivar_conversacion: {e}")
+        log.exception("Error en archivar_conversacion")
         return jsonify({
             'status': False,
             'message': str(e)
@@ -277,7 +278,7 @@ def contar_no_leidos(id_usuario):
         }), 200
         
     except Exception as e:
-        print(f"❌ Error en contar_no_leidos: {e}")
+        log.exception("Error en contar_no_leidos")
         return jsonify({
             'status': False,
             'message': str(e)
@@ -309,7 +310,7 @@ def listar_conversaciones_por_sucursal(id_sucursal):
         description: Error interno del servidor
     """
     try:
-        print(f"📋 Listando conversaciones de sucursal: {id_sucursal}")
+        log.debug("Listando conversaciones de sucursal: %s", id_sucursal)
         
         con = Conexion().open
         cursor = con.cursor()
@@ -321,12 +322,14 @@ def listar_conversaciones_por_sucursal(id_sucursal):
                 c.id_sucursal,
                 c.ultimo_mensaje,
                 c.fecha_ultimo_mensaje,
-                c.mensajes_no_leidos_sucursal,
+                COALESCE(n.no_leidos, 0) AS mensajes_no_leidos_sucursal,
                 c.created_at,
                 u.nomusuario as nombre_usuario,
                 u.img_logo
             FROM conversacion c
             INNER JOIN usuario u ON c.id_usuario = u.id_usuario
+            LEFT JOIN conversacion_no_leidos n
+                   ON n.id_conversacion = c.id_conversacion AND n.lado = 'SUCURSAL'
             WHERE c.id_sucursal = %s 
               AND c.estado = TRUE
             ORDER BY c.fecha_ultimo_mensaje DESC NULLS LAST
@@ -349,7 +352,7 @@ def listar_conversaciones_por_sucursal(id_sucursal):
         cursor.close()
         con.close()
         
-        print(f"✅ {len(conversaciones)} conversaciones encontradas")
+        log.debug("%d conversaciones encontradas", len(conversaciones))
         
         return jsonify({
             'status': True,
@@ -357,8 +360,114 @@ def listar_conversaciones_por_sucursal(id_sucursal):
         }), 200
         
     except Exception as e:
-        print(f"❌ Error en listar_conversaciones_por_sucursal: {e}")
+        log.exception("Error en listar_conversaciones_por_sucursal")
         return jsonify({
             'status': False,
             'message': str(e)
         }), 500
+
+
+# =====================================================
+# NO LEÍDOS POR SUCURSAL DE UNA EMPRESA (PARA WEB)
+# =====================================================
+@ws_conversacion.route('/conversacion/no-leidos-empresa/<int:id_empresa>', methods=['GET'])
+def contar_no_leidos_empresa(id_empresa):
+    """
+    Mensajes de clientes sin leer en todas las sucursales de una empresa (una sola consulta)
+    ---
+    tags:
+      - Conversaciones
+    parameters:
+      - name: id_empresa
+        in: path
+        required: true
+        type: integer
+        description: ID de la empresa
+    responses:
+      200:
+        description: Total y conteo por sucursal obtenidos correctamente
+      500:
+        description: Error interno del servidor
+    """
+    resultado = Conversacion.contar_no_leidos_empresa(id_empresa)
+    
+    if not resultado['success']:
+        return jsonify({
+            'status': False,
+            'message': resultado.get('message', 'Error al contar mensajes no leídos')
+        }), 500
+    
+    return jsonify({
+        'status': True,
+        'data': resultado['data']
+    }), 200
+
+
+# =====================================================
+# LISTAR CONVERSACIONES POR EMPRESA (BANDEJA WEB)
+# =====================================================
+@ws_conversacion.route('/conversacion/listar-por-empresa/<int:id_empresa>', methods=['GET'])
+def listar_conversaciones_por_empresa(id_empresa):
+    """
+    Conversaciones de todas las sucursales de una empresa, por última actividad
+    ---
+    tags:
+      - Conversaciones
+    parameters:
+      - name: id_empresa
+        in: path
+        required: true
+        type: integer
+        description: ID de la empresa
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        description: Conversaciones por página (por defecto 50, máximo 200)
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Valor de paginacion.siguiente de la página anterior
+    responses:
+      200:
+        description: Conversaciones listadas correctamente
+      400:
+        description: Cursor inválido
+      500:
+        description: Error interno del servidor
+    """
+    limite = request.args.get('limit', default=LIMITE_BANDEJA, type=int)
+    limite = max(1, min(limite, LIMITE_BANDEJA_MAXIMO))
+    
+    antes = None
+    cursor_pagina = request.args.get('cursor')
+    if cursor_pagina:
+        try:
+            actividad, id_conversacion = cursor_pagina.rsplit('|', 1)
+            antes = (datetime.fromisoformat(actividad), int(id_conversacion))
+        except ValueError:
+            return jsonify({
+                'status': False,
+                'message': 'cursor inválido'
+            }), 400
+    
+    resultado = Conversacion.listar_por_empresa(id_empresa, antes, limite)
+    
+    if not resultado['success']:
+        return jsonify({
+            'status': False,
+            'message': resultado.get('message', 'Error al listar conversaciones')
+        }), 500
+    
+    siguiente = resultado['siguiente']
+    
+    return jsonify({
+        'status': True,
+        'data': resultado['data'],
+        'paginacion': {
+            'limit': limite,
+            'hay_mas': resultado['hay_mas'],
+            'siguiente': f"{siguiente[0]}|{siguiente[1]}" if siguiente else None
+        }
+    }), 200
@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify, request
 from models.cupon import Cupon
 from conexionBD import Conexion
-import firebase.fcm as fcm
+from tools.trabajos import encolar_notificacion
 
 ws_cupon = Blueprint('ws_cupon', __name__)
 
@@ -189,7 +189,7 @@ def crear_cupon():
             # ✅ ENVIAR NOTIFICACIÓN PUSH A TODOS LOS USUARIOS
             try:
                 print("\n" + "="*60)
-                print("🔔 ENVIANDO NOTIFICACIONES PUSH")
+                print("🔔 ENCOLANDO NOTIFICACIONES PUSH")
                 print("="*60)
                 
                 # Obtener nombre de la sucursal
@@ -201,15 +201,15 @@ def crear_cupon():
                 cursor.close()
                 con.close()
                 
-                # Obtener todos los tokens FCM activos
-                tokens_enviados = enviar_notificacion_nuevo_cupon(
+                # El worker de trabajos la envía a todos los tokens FCM activos
+                id_trabajo_notificacion = enviar_notificacion_nuevo_cupon(
                     codigo=data['codigo'],
                     descripcion=data['descripcion'],
                     porcentaje=float(data['porcentaje_descuento']),
                     nombre_sucursal=nombre_sucursal
                 )
                 
-                print(f"✅ Notificaciones enviadas: {tokens_enviados}")
+                print(f"✅ Notificación encolada (trabajo {id_trabajo_notificacion})")
                 print("="*60 + "\n")
                 
             except Exception as e:
@@ -223,7 +223,7 @@ def crear_cupon():
                 'message': 'Cupón creado correctamente',
                 'data': {
                     'id_cupon': resultado,
-                    'notificaciones_enviadas': tokens_enviados if 'tokens_enviados' in locals() else 0
+                    'id_trabajo_notificacion': id_trabajo_notificacion if 'id_trabajo_notificacion' in locals() else None
                 }
             }), 201
         else:
@@ -244,7 +244,8 @@ def crear_cupon():
 
 def enviar_notificacion_nuevo_cupon(codigo, descripcion, porcentaje, nombre_sucursal):
     """
-    Envía notificación push a todos los usuarios activos sobre un nuevo cupón
+    Encola la notificación push del nuevo cupón para todos los usuarios activos.
+    El worker de trabajos la envía y desactiva los tokens que FCM ya no reconoce.
     
     Args:
         codigo (str): Código del cupón
@@ -253,65 +254,11 @@ def enviar_notificacion_nuevo_cupon(codigo, descripcion, porcentaje, nombre_sucu
         nombre_sucursal (str): Nombre de la sucursal
     
     Returns:
-        int: Cantidad de notificaciones enviadas exitosamente
+        int: ID del trabajo encolado
     """
-    try:
-        con = Conexion().open
-        cursor = con.cursor()
-        
-        # Obtener todos los tokens FCM activos
-        cursor.execute("""
-            SELECT DISTINCT uf.token, uf.id_usuario
-            FROM usuario_fcm uf
-            INNER JOIN usuario u ON uf.id_usuario = u.id_usuario
-            WHERE uf.estado = TRUE AND u.estado = TRUE
-        """)
-        
-        tokens = cursor.fetchall()
-        cursor.close()
-        con.close()
-        
-        if not tokens:
-            print("⚠️ No hay usuarios con tokens FCM activos")
-            return 0
-        
-        print(f"📱 Usuarios con FCM activos: {len(tokens)}")
-        
-        # Preparar mensaje de notificación
-        titulo = f"🎉 ¡Nuevo Cupón {porcentaje}% OFF!"
-        cuerpo = f"Usa el código {codigo} en {nombre_sucursal}. {descripcion}"
-        
-        # Enviar notificaciones
-        exitosas = 0
-        for row in tokens:
-            token = row['token']
-            id_usuario = row['id_usuario']
-            
-            try:
-                resultado = fcm.notificar(
-                    device_token=token,
-                    title=titulo,
-                    body=cuerpo
-                )
-                
-                if resultado:
-                    exitosas += 1
-                    print(f"   ✅ Notificación enviada al usuario {id_usuario}")
-                else:
-                    print(f"   ❌ Error al enviar a usuario {id_usuario}")
-                    
-            except Exception as e:
-                print(f"   ❌ Error al notificar usuario {id_usuario}: {str(e)}")
-                continue
-        
-        print(f"\n📊 Resultado: {exitosas}/{len(tokens)} notificaciones exitosas")
-        return exitosas
-        
-    except Exception as e:
-        print(f"❌ Error en enviar_notificacion_nuevo_cupon: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return 0
+    titulo = f"🎉 ¡Nuevo Cupón {porcentaje}% OFF!"
+    cuerpo = f"Usa el código {codigo} en {nombre_sucursal}. {descripcion}"
+    return encolar_notificacion(titulo, cuerpo)
 
 
 @ws_cupon.route('/cupones/modificar/<int:id_cupon>', methods=['PUT'])
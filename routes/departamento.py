@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, render_template
 from models.departamento import Departamento
+from tools.cache_http import cache_publico
 
 ws_departamento = Blueprint('ws_departamento', __name__)
 departamento_model = Departamento()
@@ -14,6 +15,7 @@ def departamentos_page():
 # ==================== API ENDPOINTS ====================
 
 @ws_departamento.route('/departamentos/listar', methods=['GET'])
+@cache_publico(max_age=3600, stale_while_revalidate=86400)
 def listar():
     """
     Listar departamentos
@@ -1,10 +1,12 @@
 from flask import Blueprint, request, jsonify
 from models.distrito import Distrito
+from tools.cache_http import cache_publico
 
 ws_distrito = Blueprint('ws_distrito', __name__)
 distrito_model = Distrito()
 
 @ws_distrito.route('/distritos/listar/<int:id_prov>', methods=['GET'])
+@cache_publico(max_age=3600, stale_while_revalidate=86400)
 def listar_por_provincia(id_prov):
     """
     Listar distritos por provincia
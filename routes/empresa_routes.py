@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify, request
 from conexionBD import Conexion
 from werkzeug.utils import secure_filename
-import cloudinary.uploader
+from tools.trabajos import subir_a_cloudinary
 
 ws_empresa = Blueprint('ws_empresa', __name__)
 
@@ -11,30 +11,6 @@ def allowed_file(filename):
     """Verificar extensión permitida"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def subir_a_cloudinary(file, folder):
-    """Subir archivo a Cloudinary"""
-    try:
-        if not file:
-            return None
-        
-        print(f"📤 Subiendo a Cloudinary: {file.filename} → {folder}")
-        
-        resultado = cloudinary.uploader.upload(
-            file,
-            folder=f"centro_comercial/{folder}",
-            resource_type="auto",
-            overwrite=True,
-            invalidate=True
-        )
-        
-        url = resultado['secure_url']
-        print(f"✅ URL Cloudinary: {url}")
-        return url
-        
-    except Exception as e:
-        print(f"❌ Error Cloudinary: {str(e)}")
-        return None
-
 @ws_empresa.route('/empresas/listar-admin', methods=['GET'])
 def listar_empresas_admin():
     """
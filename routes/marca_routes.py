@@ -1,9 +1,11 @@
 from flask import Blueprint, jsonify, request
 from models.marca import Marca
+from tools.cache_http import cache_publico
 
 ws_marca = Blueprint('ws_marca', __name__)
 
 @ws_marca.route('/marcas/listar', methods=['GET'])
+@cache_publico()
 def listar_marcas():
     """
     Listar todas las marcas
@@ -1,10 +1,69 @@
-from flask import Blueprint, request, jsonify
+import logging
+from flask import Blueprint, request, jsonify, Response
 from models.mensaje import Mensaje
-from conexionBD import Conexion
 from config import Config
+from tools import chat_eventos
+from tools.chat_eventos import difusion_chat
+import json
+import queue
+import time
 
 ws_mensaje = Blueprint('mensaje', __name__)
 
+log = logging.getLogger(__name__)
+
+# Parámetros de sincronización incremental en /mensaje/listar y /mensaje/listar-web
+PARAMETROS_DELTA = ('after_id', 'before_id', 'limit')
+LIMITE_MENSAJES = 50
+LIMITE_MENSAJES_MAXIMO = 200
+
+
+def _listar_delta(id_conversacion, tipo_lector=None, id_usuario=None):
+    """
+    Responde solo la ventana pedida de la conversación. Con after_id y nada
+    nuevo devuelve 204 sin cuerpo. La marca de lectura de quien consulta solo
+    avanza si en la ventana llegaron mensajes del otro participante.
+    """
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limite = request.args.get('limit', default=LIMITE_MENSAJES, type=int)
+    limite = max(1, min(limite, LIMITE_MENSAJES_MAXIMO))
+
+    if after_id is not None and before_id is not None:
+        return jsonify({
+            'status': False,
+            'message': 'Use after_id o before_id, no ambos'
+        }), 400
+
+    resultado = Mensaje.listar_delta(id_conversacion, after_id, before_id, limite)
+    if not resultado.get('success'):
+        return jsonify({
+            'status': False,
+            'message': resultado.get('message')
+        }), 500
+
+    mensajes = resultado['data']
+    if after_id is not None and not mensajes:
+        return '', 204
+
+    lectura = resultado['lectura']
+    if before_id is None and lectura:
+        if tipo_lector is None:
+            tipo_lector = 'USUARIO' if lectura['id_usuario'] == id_usuario else 'SUCURSAL'
+        Mensaje.marcar_hasta_ventana(id_conversacion, tipo_lector, mensajes, lectura)
+
+    return jsonify({
+        'status': True,
+        'data': mensajes,
+        'paginacion': {
+            'limit': limite,
+            'hay_mas': resultado['hay_mas'],
+            'primer_id': mensajes[0]['id_mensaje'] if mensajes else None,
+            'ultimo_id': mensajes[-1]['id_mensaje'] if mensajes else after_id
+        }
+    }), 200
+
+
 # =====================================================
 # ENVIAR MENSAJE
 # =====================================================
@@ -73,7 +132,7 @@ def enviar_mensaje():
         tipo_mensaje = data.get('tipo_mensaje', 'TEXTO')
         url_archivo = data.get('url_archivo')
         
-        print(f"📤 Enviando mensaje | Conversación: {id_conversacion} | Emisor: {id_emisor} ({tipo_emisor})")
+        log.debug("Enviando mensaje | Conversación: %s | Emisor: %s (%s)", id_conversacion, id_emisor, tipo_emisor)
         
         if not all([id_conversacion, id_emisor, tipo_emisor, contenido]):
             return jsonify({
@@ -91,7 +150,7 @@ def enviar_mensaje():
         )
         
         if resultado.get('success'):
-            print(f"✅ Mensaje enviado: ID {resultado.get('data', {}).get('id_mensaje')}")
+            log.debug("Mensaje enviado: ID %s", resultado.get('data', {}).get('id_mensaje'))
             
             # TODO: Aquí se puede agregar lógica para enviar notificación FCM
             
@@ -101,14 +160,14 @@ def enviar_mensaje():
                 'message': 'Mensaje enviado correctamente'
             }), 200
         else:
-            print(f"❌ Error: {resultado.get('message')}")
+            log.warning("Mensaje rechazado: %s", resultado.get('message'))
             return jsonify({
                 'status': False,
                 'message': resultado.get('message')
             }), 400
             
     except Exception as e:
-        print(f"❌ Error en enviar_mensaje: {e}")
+        log.exception("Error en enviar_mensaje")
         return jsonify({
             'status': False,
             'message': str(e)
@@ -122,7 +181,7 @@ def enviar_mensaje():
 def listar_mensajes(id_conversacion, id_usuario):
     """
     Lista todos los mensajes de una conversación.
-    Automáticamente marca los mensajes como leídos.
+    Avanza la marca de lectura de quien consulta (solo escribe si hay mensajes nuevos).
     ---
     tags:
       - Mensajes
@@ -137,22 +196,44 @@ def listar_mensajes(id_conversacion, id_usuario):
         required: true
         type: integer
         description: ID del usuario que solicita los mensajes
+      - name: after_id
+        in: query
+        required: false
+        type: integer
+        description: Solo mensajes posteriores a este ID (204 si no hay nuevos)
+      - name: before_id
+        in: query
+        required: false
+        type: integer
+        description: Historial anterior a este ID (para scroll hacia atrás)
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        default: 50
+        description: Máximo de mensajes (hasta 200). Solo, devuelve los últimos N
     responses:
       200:
         description: Mensajes obtenidos correctamente
+      204:
+        description: Con after_id, no hay mensajes nuevos
       400:
-        description: Error en la operación
+        description: Se enviaron after_id y before_id a la vez
       500:
         description: Error interno del servidor
     """
     try:
-        print(f"📨 Listando mensajes | Conversación: {id_conversacion} | Usuario: {id_usuario}")
+        log.debug("Listando mensajes | Conversación: %s | Usuario: %s", id_conversacion, id_usuario)
+        
+        # ✅ SINCRONIZACIÓN INCREMENTAL (sin parámetros se mantiene el historial completo)
+        if any(p in request.args for p in PARAMETROS_DELTA):
+            return _listar_delta(id_conversacion, id_usuario=id_usuario)
         
         resultado = Mensaje.listar_por_conversacion(id_conversacion, id_usuario)
         
         if resultado.get('success'):
             mensajes = resultado.get('data', [])
-            print(f"✅ {len(mensajes)} mensajes encontrados")
+            log.debug("%d mensajes encontrados", len(mensajes))
             
             return jsonify({
                 'status': True,
@@ -165,7 +246,7 @@ def listar_mensajes(id_conversacion, id_usuario):
             }), 400
             
     except Exception as e:
-        print(f"❌ Error en listar_mensajes: {e}")
+        log.exception("Error en listar_mensajes")
         return jsonify({
             'status': False,
             'message': str(e)
@@ -201,6 +282,9 @@ def marcar_leidos():
             tipo_lector:
               type: string
               description: Tipo de lector (USUARIO o SUCURSAL)
+            hasta_id:
+              type: integer
+              description: Opcional. Último mensaje leído (por defecto, el último recibido)
           required:
             - id_conversacion
             - tipo_lector
@@ -216,14 +300,16 @@ def marcar_leidos():
         data = request.json
         id_conversacion = data.get('id_conversacion')
         tipo_lector = data.get('tipo_lector')
+        hasta_id = data.get('hasta_id')
         
-        print(f"✔️ Marcando mensajes como leídos | Conversación: {id_conversacion} | Lector: {tipo_lector}")
+        log.debug("Marcando mensajes como leídos | Conversación: %s | Lector: %s", id_conversacion, tipo_lector)
         
-        resultado = Mensaje.marcar_leidos(id_conversacion, tipo_lector)
+        resultado = Mensaje.marcar_leidos(id_conversacion, tipo_lector, int(hasta_id) if hasta_id else None)
         
         if resultado.get('success'):
             return jsonify({
                 'status': True,
+                'data': resultado.get('data'),
                 'message': resultado.get('message')
             }), 200
         else:
@@ -233,7 +319,7 @@ def marcar_leidos():
             }), 400
             
     except Exception as e:
-        print(f"❌ Error en marcar_leidos: {e}")
+        log.exception("Error en marcar_leidos")
         return jsonify({
             'status': False,
             'message': str(e)
@@ -242,7 +328,7 @@ def marcar_leidos():
 # ✅ AGREGAR AL FINAL DEL ARCHIVO
 
 # =====================================================
-# LISTAR MENSAJES PARA WEB (MARCA COMO LEÍDOS PARA SUCURSAL)
+# LISTAR MENSAJES PARA WEB (AVANZA LA MARCA DE LECTURA DE LA SUCURSAL)
 # =====================================================
 @ws_mensaje.route('/mensaje/listar-web/<int:id_conversacion>/<int:id_sucursal>', methods=['GET'])
 def listar_mensajes_web(id_conversacion, id_sucursal):
@@ -262,76 +348,53 @@ def listar_mensajes_web(id_conversacion, id_sucursal):
         required: true
         type: integer
         description: ID de la sucursal
+      - name: after_id
+        in: query
+        required: false
+        type: integer
+        description: Solo mensajes posteriores a este ID (204 si no hay nuevos)
+      - name: before_id
+        in: query
+        required: false
+        type: integer
+        description: Historial anterior a este ID (para scroll hacia atrás)
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        default: 50
+        description: Máximo de mensajes (hasta 200). Solo, devuelve los últimos N
     responses:
       200:
         description: Mensajes obtenidos correctamente y marcados como leídos para la sucursal
+      204:
+        description: Con after_id, no hay mensajes nuevos
+      400:
+        description: Se enviaron after_id y before_id a la vez
       500:
         description: Error interno del servidor
     """
     try:
-        print(f"📨 Listando mensajes web | Conversación: {id_conversacion} | Sucursal: {id_sucursal}")
+        log.debug("Listando mensajes web | Conversación: %s | Sucursal: %s", id_conversacion, id_sucursal)
         
-        con = Conexion().open
-        cursor = con.cursor()
+        # ✅ SINCRONIZACIÓN INCREMENTAL (sin parámetros se mantiene el historial completo)
+        if any(p in request.args for p in PARAMETROS_DELTA):
+            return _listar_delta(id_conversacion, 'SUCURSAL')
         
-        # Obtener mensajes
-        cursor.execute("""
-            SELECT 
-                m.id_mensaje,
-                m.id_emisor,
-                m.tipo_emisor,
-                m.contenido,
-                m.tipo_mensaje,
-                m.url_archivo,
-                m.leido,
-                m.fecha_leido,
-                m.created_at,
-                u.nomusuario as nombre_emisor,
-                u.img_logo as img_emisor
-            FROM mensaje m
-            INNER JOIN usuario u ON m.id_emisor = u.id_usuario
-            WHERE m.id_conversacion = %s
-            ORDER BY m.created_at ASC
-        """, (id_conversacion,))
-        
-        mensajes = []
-        for row in cursor.fetchall():
-            mensajes.append({
-                'id_mensaje': row['id_mensaje'],
-                'id_emisor': row['id_emisor'],
-                'tipo_emisor': row['tipo_emisor'],
-                'contenido': row['contenido'],
-                'tipo_mensaje': row['tipo_mensaje'],
-                'url_archivo': row['url_archivo'],
-                'leido': row['leido'],
-                'fecha_leido': row['fecha_leido'].isoformat() if row['fecha_leido'] else None,
-                'created_at': row['created_at'].isoformat() if row['created_at'] else None,
-                'nombre_emisor': row['nombre_emisor'],
-                'img_emisor': row['img_emisor']
-            })
-        
-        # Marcar mensajes de usuario como leídos
-        cursor.execute("""
-            UPDATE mensaje
-            SET leido = TRUE,
-                fecha_leido = DATE_TRUNC('minute', LOCALTIMESTAMP)
-            WHERE id_conversacion = %s
-              AND tipo_emisor = 'USUARIO'
-              AND leido = FALSE
-        """, (id_conversacion,))
+        resultado = Mensaje.listar_delta(id_conversacion, limite=None)
+        if not resultado.get('success'):
+            return jsonify({
+                'status': False,
+                'message': resultado.get('message')
+            }), 500
         
-        # Resetear contador
-        cursor.execute("""
-            UPDATE conversacion
-            SET mensajes_no_leidos_sucursal = 0
-            WHERE id_conversacion = %s
-        """, (id_conversacion,))
+        mensajes = resultado['data']
         
-        con.commit()
-        cursor.close()
-        con.close()
+        # ✅ SOLO SE ESCRIBE SI LA MARCA DE LECTURA DE LA SUCURSAL AVANZA
+        if resultado['lectura']:
+            Mensaje.marcar_hasta_ventana(id_conversacion, 'SUCURSAL', mensajes, resultado['lectura'])
         
-        print(f"✅ {len(mensajes)} mensajes encontrados")
+        log.debug("%d mensajes encontrados", len(mensajes))
         
         return jsonify({
             'status': True,
@@ -339,8 +402,99 @@ def listar_mensajes_web(id_conversacion, id_sucursal):
         }), 200
         
     except Exception as e:
-        print(f"❌ Error en listar_mensajes_web: {e}")
+        log.exception("Error en listar_mensajes_web")
         return jsonify({
             'status': False,
             'message': str(e)
         }), 500
+
+
+# =====================================================
+# STREAMS EN TIEMPO REAL (SERVER-SENT EVENTS)
+# Reemplazan el sondeo cada pocos segundos: el cliente recibe un evento
+# "mensaje" cuando alguien escribe y recién ahí recarga. Si el stream no
+# está disponible (503 o desconexión) el cliente vuelve a sondear.
+# =====================================================
+def _stream_eventos(claves):
+    cola = difusion_chat.abrir(claves, Config.CHAT_SSE_MAXIMO)
+    if cola is None:
+        return jsonify({
+            'status': False,
+            'message': 'Demasiados streams abiertos, use el sondeo'
+        }), 503
+
+    def generar():
+        yield "retry: 3000\n\n"
+        fin = time.monotonic() + Config.CHAT_SSE_DURACION
+        while time.monotonic() < fin:
+            try:
+                evento = cola.get(timeout=Config.CHAT_SSE_LATIDO)
+            except queue.Empty:
+                yield ": latido\n\n"
+                continue
+            id_evento = f"id: {evento['id_mensaje']}\n" if evento.get('id_mensaje') else ''
+            yield f"{id_evento}event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+
+    response = Response(generar(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # call_on_close corre aunque el cliente se vaya antes de leer el primer evento
+    response.call_on_close(lambda: difusion_chat.cerrar(cola, claves))
+    return response
+
+
+@ws_mensaje.route('/mensaje/stream/conversacion/<int:id_conversacion>', methods=['GET'])
+def stream_conversacion(id_conversacion):
+    """
+    Stream SSE de los mensajes nuevos de una conversación
+    ---
+    tags:
+      - Mensajes
+    produces:
+      - text/event-stream
+    parameters:
+      - name: id_conversacion
+        in: path
+        required: true
+        type: integer
+        description: ID de la conversación
+    responses:
+      200:
+        description: 'Eventos "mensaje" ({id_conversacion, id_sucursal, id_mensaje, tipo_emisor}) y "resync" (recargar todo)'
+      503:
+        description: Límite de streams del servidor alcanzado; usar sondeo
+    """
+    return _stream_eventos([chat_eventos.conversacion(id_conversacion)])
+
+
+@ws_mensaje.route('/mensaje/stream/sucursales', methods=['GET'])
+def stream_sucursales():
+    """
+    Stream SSE de los mensajes nuevos en todas las conversaciones de una o varias sucursales
+    ---
+    tags:
+      - Mensajes
+    produces:
+      - text/event-stream
+    parameters:
+      - name: ids
+        in: query
+        required: true
+        type: string
+        description: IDs de sucursal separados por coma (ej. 1,2,3)
+    responses:
+      200:
+        description: 'Eventos "mensaje" y "resync", igual que el stream por conversación'
+      400:
+        description: Falta el parámetro ids
+      503:
+        description: Límite de streams del servidor alcanzado; usar sondeo
+    """
+    ids = [i for i in request.args.get('ids', '').split(',') if i.strip().isdigit()]
+    if not ids:
+        return jsonify({
+            'status': False,
+            'message': 'Debe indicar al menos una sucursal en ids'
+        }), 400
+
+    return _stream_eventos([chat_eventos.sucursal(i) for i in ids])
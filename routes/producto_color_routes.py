@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request
 from conexionBD import Conexion
 from models.producto_color import ProductoColor
-import cloudinary.uploader
+from tools.trabajos import subir_a_cloudinary
+from tools.exportacion import responder_exportacion, FORMATOS_EXPORTACION, ExportacionesOcupadas
 
 ws_producto_color = Blueprint('ws_producto_color', __name__)
 producto_color = ProductoColor()
@@ -12,30 +13,6 @@ def allowed_file(filename):
     """Verificar extensión permitida"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def subir_a_cloudinary(file, folder):
-    """Subir imagen a Cloudinary"""
-    try:
-        if not file:
-            return None
-        
-        print(f"📤 Subiendo producto a Cloudinary: {file.filename}")
-        
-        resultado = cloudinary.uploader.upload(
-            file,
-            folder=f"centro_comercial/{folder}",
-            resource_type="auto",
-            overwrite=True,
-            invalidate=True
-        )
-        
-        url = resultado['secure_url']
-        print(f"✅ URL Cloudinary: {url}")
-        return url
-        
-    except Exception as e:
-        print(f"❌ Error Cloudinary: {str(e)}")
-        return None
-
 @ws_producto_color.route('/productos-color/listar', methods=['GET'])
 def listar_productos_color():
     """
@@ -610,3 +587,57 @@ def listar_colores_activos():
             'message': f'Error en el servidor: {str(e)}',
             'data': []
         }), 500
+
+
+@ws_producto_color.route('/productos-color/exportar', methods=['GET'])
+def exportar_productos_color():
+    """
+    ---
+    tags:
+      - Administración de Productos
+    summary: Exportar variantes de productos
+    description: Descarga todas las variantes (color/talla, precio, stock) en CSV o NDJSON, enviadas en streaming desde un cursor de servidor
+    parameters:
+      - name: id_empresa
+        in: query
+        type: integer
+        description: ID de la empresa para filtrar
+      - name: formato
+        in: query
+        type: string
+        enum: [csv, ndjson]
+        required: false
+        description: Formato del archivo (por defecto csv)
+    responses:
+      200:
+        description: Archivo de variantes
+      400:
+        description: Formato inválido
+      500:
+        description: Error en el servidor
+      503:
+        description: Demasiadas exportaciones en curso, reintentar más tarde
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({
+            'status': False,
+            'message': f"formato debe ser uno de: {', '.join(FORMATOS_EXPORTACION)}"
+        }), 400
+    
+    try:
+        id_empresa = request.args.get('id_empresa', type=int)
+        sql, parametros = producto_color.consulta_exportacion(id_empresa)
+        nombre = f'productos_color_empresa_{id_empresa}' if id_empresa else 'productos_color'
+        return responder_exportacion(sql, parametros, formato, nombre)
+    except ExportacionesOcupadas as e:
+        return jsonify({
+            'status': False,
+            'data': None,
+            'message': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'status': False,
+            'message': f'Error en el servidor: {str(e)}'
+        }), 500
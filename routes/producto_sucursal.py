@@ -1,18 +1,94 @@
+import logging
 from flask import Blueprint, jsonify, request  # ← IMPORTANTE: debe incluir 'request'
-from conexionBD import Conexion
-from models.producto_sucursal import ProductoSucursal
+from models.producto_sucursal import ProductoSucursal, MODOS_BUSQUEDA
+from tools.perfil_respuesta import campos_solicitados
+from tools.serializador_productos import CAMPOS_RELACIONADOS
+from tools.cache_catalogo import catalogo
+from tools.cache_http import cache_publico
 
 ws_producto_sucursal = Blueprint('ws_producto_sucursal', __name__)
+
+log = logging.getLogger(__name__)
+
 producto_sucursal = ProductoSucursal()
 
+PARAMETROS_PAGINACION = ('limit', 'cursor')
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+# Parámetros con los que /productos/listar sigue sirviéndose del snapshot del catálogo
+PARAMETROS_PERFIL = {'perfil', 'fields'}
+
+
+def _sello_listado():
+    """Versión del snapshot si la respuesta sale de él (el modo paginado consulta la BD)"""
+    if set(request.args) - PARAMETROS_PERFIL:
+        return None
+    return catalogo.sello()
+
+
 @ws_producto_sucursal.route('/productos/listar', methods=['GET'])
+@cache_publico(max_age=30, stale_while_revalidate=120, version=_sello_listado)
 def listar_productos():
     """
     ---
     tags:
       - Productos
     summary: Listar todos los productos
-    description: Obtiene una lista de todos los productos disponibles
+    description: |
+      Sin parámetros devuelve el catálogo completo en un solo arreglo (compatibilidad con versiones antiguas de la app).
+      Si se envía `limit`, `cursor` o algún filtro, responde paginado por cursor (keyset sobre id_prod_sucursal).
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Productos por página (1-100, por defecto 20)
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: Valor de `siguiente_cursor` de la página anterior
+      - name: categoria
+        in: query
+        type: string
+        required: false
+        description: ID o nombre de la categoría
+      - name: marca
+        in: query
+        type: string
+        required: false
+        description: ID o nombre de la marca
+      - name: genero
+        in: query
+        type: string
+        required: false
+      - name: id_temporada
+        in: query
+        type: integer
+        required: false
+      - name: id_sucursal
+        in: query
+        type: integer
+        required: false
+      - name: precio_min
+        in: query
+        type: number
+        required: false
+      - name: precio_max
+        in: query
+        type: number
+        required: false
+      - name: perfil
+        in: query
+        type: string
+        required: false
+        description: "'compacto' para recibir solo los nombres canónicos (también vía header X-Perfil-Respuesta)"
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Campos canónicos separados por coma (implica perfil compacto)
     responses:
       200:
         description: Productos obtenidos correctamente
@@ -31,7 +107,48 @@ def listar_productos():
         description: Error interno del servidor
     """
     try:
-        resultado, productos = producto_sucursal.listar_productos()
+        filtros = {
+            'categoria': request.args.get('categoria'),
+            'marca': request.args.get('marca'),
+            'genero': request.args.get('genero'),
+            'id_temporada': request.args.get('id_temporada', type=int),
+            'id_sucursal': request.args.get('id_sucursal', type=int),
+            'precio_min': request.args.get('precio_min', type=float),
+            'precio_max': request.args.get('precio_max', type=float)
+        }
+        
+        # ✅ PERFIL DE RESPUESTA: None = formato legado con alias
+        campos = campos_solicitados()
+        
+        # ✅ MODO PAGINADO SOLO SI EL CLIENTE LO PIDE (las apps antiguas esperan el arreglo completo)
+        paginado = any(request.args.get(p) for p in PARAMETROS_PAGINACION) or any(v is not None for v in filtros.values())
+        
+        if paginado:
+            limite = request.args.get('limit', default=LIMITE_POR_DEFECTO, type=int)
+            limite = max(1, min(limite, LIMITE_MAXIMO))
+            cursor_id = request.args.get('cursor', type=int)
+            
+            resultado, pagina = producto_sucursal.listar_productos_paginado(filtros, cursor_id, limite, campos)
+            
+            if resultado:
+                return jsonify({
+                    'status': True,
+                    'data': pagina['productos'],
+                    'paginacion': {
+                        'limit': limite,
+                        'siguiente_cursor': pagina['siguiente_cursor'],
+                        'hay_mas': pagina['hay_mas']
+                    },
+                    'message': f'Se encontraron {len(pagina["productos"])} productos'
+                }), 200
+            else:
+                return jsonify({
+                    'status': False,
+                    'data': None,
+                    'message': pagina
+                }), 500
+        
+        resultado, productos = producto_sucursal.listar_productos(campos)
         
         if resultado:
             return jsonify({
@@ -54,6 +171,109 @@ def listar_productos():
         }), 500
     
 
+@ws_producto_sucursal.route('/productos/buscar', methods=['GET'])
+def buscar_productos():
+    """
+    ---
+    tags:
+      - Productos
+    summary: Buscar productos
+    description: |
+      Búsqueda por nombre, material, marca y categoría (español, sin distinguir acentos).
+      Si no hay coincidencias exactas devuelve coincidencias aproximadas (errores de tipeo).
+      Resultados ordenados por relevancia y paginados.
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Texto a buscar (mínimo 2 caracteres)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Productos por página (1-100, por defecto 20)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Valor de `siguiente_cursor` de la página anterior ("offset|modo")
+      - name: perfil
+        in: query
+        type: string
+        required: false
+        description: "'compacto' para recibir solo los nombres canónicos (también vía header X-Perfil-Respuesta)"
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Campos canónicos separados por coma (implica perfil compacto)
+    responses:
+      200:
+        description: Búsqueda realizada correctamente
+      400:
+        description: Texto de búsqueda o cursor inválido
+      500:
+        description: Error interno del servidor
+    """
+    try:
+        texto = (request.args.get('q') or '').strip()
+        
+        if len(texto) < 2:
+            return jsonify({
+                'status': False,
+                'data': None,
+                'message': 'El texto de búsqueda debe tener al menos 2 caracteres'
+            }), 400
+        
+        limite = request.args.get('limit', default=LIMITE_POR_DEFECTO, type=int)
+        limite = max(1, min(limite, LIMITE_MAXIMO))
+        
+        # ✅ EL CURSOR LLEVA EL MODO DECIDIDO EN LA PRIMERA PÁGINA
+        offset, modo = 0, None
+        cursor_pagina = request.args.get('cursor')
+        if cursor_pagina:
+            try:
+                offset_texto, modo = cursor_pagina.split('|')
+                offset = int(offset_texto)
+                if offset < 0 or modo not in MODOS_BUSQUEDA:
+                    raise ValueError(cursor_pagina)
+            except ValueError:
+                return jsonify({
+                    'status': False,
+                    'data': None,
+                    'message': 'cursor inválido'
+                }), 400
+        
+        resultado, pagina = producto_sucursal.buscar(texto, offset, limite, campos_solicitados(), modo)
+        
+        if resultado:
+            return jsonify({
+                'status': True,
+                'data': pagina['productos'],
+                'paginacion': {
+                    'limit': limite,
+                    'siguiente_cursor': pagina['siguiente_cursor'],
+                    'hay_mas': pagina['hay_mas']
+                },
+                'modo': pagina['modo'],
+                'message': f'Se encontraron {len(pagina["productos"])} productos'
+            }), 200
+        else:
+            return jsonify({
+                'status': False,
+                'data': None,
+                'message': pagina
+            }), 500
+            
+    except Exception as e:
+        return jsonify({
+            'status': False,
+            'data': None,
+            'message': f'Error interno: {str(e)}'
+        }), 500
+
+
 @ws_producto_sucursal.route('/productos/detalle/<int:id_prod_sucursal>', methods=['GET'])
 def detalle_producto(id_prod_sucursal):
     """
@@ -128,6 +348,16 @@ def productos_relacionados(id_categoria, id_actual):
         type: integer
         required: true
         description: ID del producto actual a excluir
+      - name: perfil
+        in: query
+        type: string
+        required: false
+        description: "'compacto' para recibir solo los nombres canónicos (también vía header X-Perfil-Respuesta)"
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Campos canónicos separados por coma (implica perfil compacto)
     responses:
       200:
         description: Productos relacionados obtenidos correctamente
@@ -146,97 +376,19 @@ def productos_relacionados(id_categoria, id_actual):
         description: Error interno del servidor
     """
     try:
-        con = Conexion().open
-        cursor = con.cursor()
-        
-        # ✅ DETECTAR ENTORNO
-        user_agent = request.headers.get('User-Agent', '').lower()
-        is_android = 'okhttp' in user_agent or 'android' in user_agent
-        
-        import os
-        if os.environ.get('RENDER'):
-            base_url = "https://usat-comercial-api.onrender.com" if is_android else ""
-        else:
-            base_url = "http://10.0.2.2:3007" if is_android else ""
-        
-        sql = """
-            SELECT DISTINCT ON (ps.id_prod_sucursal)
-                ps.id_prod_sucursal,
-                ps.nombre,
-                ps.material,
-                ps.genero,
-                m.nombre as marca,
-                c.nombre as categoria,
-                pc.id_prod_color,
-                pc.talla,
-                pc.precio,
-                pc.stock,
-                pc.url_img,
-                col.nombre as color
-            FROM producto_sucursal ps
-            LEFT JOIN marca m ON ps.id_marca = m.id_marca
-            LEFT JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
-            LEFT JOIN producto_color pc ON ps.id_prod_sucursal = pc.id_prod_sucursal AND pc.estado = TRUE
-            LEFT JOIN color col ON pc.id_color = col.id_color
-            WHERE ps.estado = TRUE 
-              AND ps.id_categoria = %s 
-              AND ps.id_prod_sucursal != %s
-            ORDER BY ps.id_prod_sucursal, pc.talla, pc.id_prod_color
-            LIMIT 10
-        """
-        
-        cursor.execute(sql, (id_categoria, id_actual))
-        resultados = cursor.fetchall()
+        # ✅ PERFIL DE RESPUESTA: None = formato legado con alias
+        campos = campos_solicitados(CAMPOS_RELACIONADOS)
         
-        productos = []
-        for row in resultados:
-            url_img = row['url_img'] if row['url_img'] else ''
-            
-            # ✅ AGREGAR BASE_URL PARA ANDROID
-            if url_img and is_android:
-                if not url_img.startswith('http'):
-                    if not url_img.startswith('/'):
-                        url_img = '/' + url_img
-                    url_img = base_url + url_img
-            
-            # ✅ CRÍTICO: Enviar TODOS los aliases posibles
-            producto = {
-                # ✅ IDs (todos los formatos)
-                "id_prod_sucursal": row['id_prod_sucursal'],
-                "idProdSucursal": row['id_prod_sucursal'],      # ← AGREGAR
-                "idProducto": row['id_prod_sucursal'],           # ← AGREGAR
-                "id_prod_color": row['id_prod_color'] if row['id_prod_color'] else None,
-                "idProdColor": row['id_prod_color'] if row['id_prod_color'] else None,  # ← AGREGAR
-                
-                # ✅ Nombre (todos los formatos)
-                "nombre": row['nombre'],
-                "nombreProducto": row['nombre'],                 # ← AGREGAR
-                
-                # ✅ URLs (todos los formatos)
-                "url_img": url_img,
-                "urlImg": url_img,                               # ← AGREGAR
-                "imagen": url_img,                               # ← AGREGAR
-                
-                # ✅ Otros campos
-                "talla": row['talla'] if row['talla'] else '',
-                "material": row['material'] if row['material'] else '',
-                "genero": row['genero'] if row['genero'] else 'Sin definir',
-                "precio": float(row['precio']) if row['precio'] else 0.0,
-                "stock": row['stock'] if row['stock'] else 0,
-                "marca": row['marca'] if row['marca'] else '',
-                "categoria": row['categoria'] if row['categoria'] else '',
-                "nombreCategoria": row['categoria'] if row['categoria'] else '',  # ← AGREGAR
-                "color": row['color'] if row['color'] else 'Sin color'
-            }
-            productos.append(producto)
+        resultado, productos = producto_sucursal.listar_relacionados(id_categoria, id_actual, campos)
         
-        cursor.close()
-        con.close()
+        if not resultado:
+            return jsonify({
+                'status': False,
+                'data': [],
+                'message': productos
+            }), 500
         
-        # ✅ LOG PARA DEBUGGING
-        print(f"🔍 Productos relacionados encontrados: {len(productos)}")
-        if productos:
-            print(f"📦 Primer producto: {productos[0]}")
+        log.debug("Productos relacionados encontrados: %d", len(productos))
         
         return jsonify({
             'status': True,
@@ -245,9 +397,7 @@ def productos_relacionados(id_categoria, id_actual):
         }), 200
             
     except Exception as e:
-        import traceback
-        print(f"❌ ERROR en productos_relacionados: {str(e)}")
-        traceback.print_exc()
+        log.exception("Error en productos_relacionados")
         
         return jsonify({
             'status': False,
@@ -705,7 +855,7 @@ def estadisticas_productos():
     tags:
       - Administración de Productos
     summary: Obtener estadísticas de productos
-    description: Obtiene estadísticas con filtro opcional por empresa
+    description: Variantes, stock y rango de precios por producto, más un resumen de la empresa, en una sola consulta
     parameters:
       - name: id_empresa
         in: query
@@ -723,6 +873,8 @@ def estadisticas_productos():
               type: string
             data:
               type: array
+            resumen:
+              type: object
       500:
         description: Error en el servidor
     """
@@ -730,7 +882,7 @@ def estadisticas_productos():
         # ✅ OBTENER id_empresa DEL QUERY PARAM
         id_empresa = request.args.get('id_empresa', type=int)
         
-        exito, productos = producto_sucursal.listar_todos(id_empresa)
+        exito, estadisticas = producto_sucursal.estadisticas(id_empresa)
         
         if not exito:
             return jsonify({
@@ -738,23 +890,11 @@ def estadisticas_productos():
                 'message': 'Error al obtener estadísticas'
             }), 500
         
-        estadisticas = []
-        for p in productos:
-            total_colores = producto_sucursal.contar_colores(p['id_prod_sucursal'])
-            estadisticas.append({
-                'id_prod_sucursal': p['id_prod_sucursal'],
-                'nombre': p['nombre'],
-                'nombre_sucursal': p['nombre_sucursal'],
-                'nombre_marca': p['nombre_marca'],
-                'nombre_categoria': p['nombre_categoria'],
-                'estado': p['estado'],
-                'total_variantes': total_colores
-            })
-        
         return jsonify({
             'status': True,
             'message': 'Estadísticas obtenidas correctamente',
-            'data': estadisticas
+            'data': estadisticas['productos'],
+            'resumen': estadisticas['resumen']
         }), 200
             
     except Exception as e:
@@ -1029,83 +1169,14 @@ def productos_por_temporada(id_temporada):
         description: Error interno del servidor
     """
     try:
-        con = Conexion().open
-        cursor = con.cursor()
-        
-        # ✅ DETECTAR ENTORNO
-        user_agent = request.headers.get('User-Agent', '').lower()
-        is_android = 'okhttp' in user_agent or 'android' in user_agent
-        
-        import os
-        if os.environ.get('RENDER'):
-            base_url = "https://usat-comercial-api.onrender.com" if is_android else ""
-        else:
-            base_url = "http://10.0.2.2:3007" if is_android else ""
+        resultado, productos = producto_sucursal.listar_por_temporada(id_temporada, campos_solicitados())
         
-        sql = """
-            SELECT DISTINCT ON (ps.id_prod_sucursal)
-                ps.id_prod_sucursal,
-                ps.id_temporada,
-                ps.nombre,
-                ps.material,
-                ps.genero,
-                m.nombre as marca,
-                c.nombre as categoria,
-                pc.id_prod_color,
-                pc.talla,
-                pc.precio,
-                pc.stock,
-                pc.url_img,
-                col.nombre as color
-            FROM producto_sucursal ps
-            LEFT JOIN marca m ON ps.id_marca = m.id_marca
-            LEFT JOIN categoria_producto c ON ps.id_categoria = c.id_categoria
-            LEFT JOIN producto_color pc ON ps.id_prod_sucursal = pc.id_prod_sucursal AND pc.estado = TRUE
-            LEFT JOIN color col ON pc.id_color = col.id_color
-            WHERE ps.estado = TRUE 
-              AND ps.id_temporada = %s
-            ORDER BY ps.id_prod_sucursal, pc.talla, pc.id_prod_color
-        """
-        
-        cursor.execute(sql, (id_temporada,))
-        resultados = cursor.fetchall()
-        
-        productos = []
-        for row in resultados:
-            url_img = row['url_img'] if row['url_img'] else ''
-            
-            # ✅ AGREGAR BASE_URL PARA ANDROID
-            if url_img and is_android:
-                if not url_img.startswith('http'):
-                    if not url_img.startswith('/'):
-                        url_img = '/' + url_img
-                    url_img = base_url + url_img
-            
-            producto = {
-                "id_prod_sucursal": row['id_prod_sucursal'],
-                "idProducto": row['id_prod_sucursal'],
-                "id_temporada": row['id_temporada'],
-                "id_prod_color": row['id_prod_color'] if row['id_prod_color'] else None,
-                "idProdColor": row['id_prod_color'] if row['id_prod_color'] else None,
-                "nombre": row['nombre'],
-                "nombreProducto": row['nombre'],
-                "talla": row['talla'] if row['talla'] else '',
-                "material": row['material'] if row['material'] else '',
-                "url_img": url_img,
-                "urlImg": url_img,
-                "imagen": url_img,
-                "genero": row['genero'] if row['genero'] else 'Sin definir',
-                "precio": float(row['precio']) if row['precio'] else 0.0,
-                "stock": row['stock'] if row['stock'] else 0,
-                "marca": row['marca'] if row['marca'] else '',
-                "categoria": row['categoria'] if row['categoria'] else '',
-                "nombreCategoria": row['categoria'] if row['categoria'] else '',
-                "color": row['color'] if row['color'] else 'Sin color'
-            }
-            productos.append(producto)
-        
-        cursor.close()
-        con.close()
+        if not resultado:
+            return jsonify({
+                'status': False,
+                'data': [],
+                'message': productos
+            }), 500
         
         return jsonify({
             'status': True,
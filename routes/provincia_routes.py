@@ -1,10 +1,12 @@
 from flask import Blueprint, request, jsonify
 from models.provincia import Provincia
+from tools.cache_http import cache_publico
 
 ws_provincia = Blueprint('ws_provincia', __name__)
 provincia_model = Provincia()
 
 @ws_provincia.route('/provincias/listar/<int:id_dep>', methods=['GET'])
+@cache_publico(max_age=3600, stale_while_revalidate=86400)
 def listar_por_departamento(id_dep):
     """
     Listar provincias por departamento
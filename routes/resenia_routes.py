@@ -1,9 +1,16 @@
+import logging
+from datetime import datetime
 from flask import Blueprint, jsonify, request
-from models.resenia import Resenia
+from models.resenia import Resenia, ORDENES_RESENIAS
 from conexionBD import Conexion
 
+LIMITE_RESENIAS = 20
+LIMITE_RESENIAS_MAXIMO = 50
+
 ws_resenia = Blueprint('ws_resenia', __name__)
 
+log = logging.getLogger(__name__)
+
 # ============================================
 # LISTAR RESEÑAS POR PRODUCTO_COLOR
 # ============================================
@@ -359,11 +366,7 @@ def modificar_resenia(id_resenia):
         description: Error en el servidor
     """
     try:
-        print(f"=== MODIFICAR RESEÑA ===")
-        print(f"id_resenia: {id_resenia}")
-        
         data = request.get_json()
-        print(f"Body recibido: {data}")
         
         # Validaciones
         if not data:
@@ -385,9 +388,8 @@ def modificar_resenia(id_resenia):
         comentario = data.get('comentario', '').strip()
         calificacion = data.get('calificacion')
         
-        print(f"Título: {titulo}")
-        print(f"Comentario: {comentario}")
-        print(f"Calificación: {calificacion}")
+        # El texto de la reseña no se registra
+        log.debug("Modificar reseña %s: calificación=%s", id_resenia, calificacion)
         
         # Validaciones adicionales
         if not titulo or not comentario:
@@ -406,7 +408,7 @@ def modificar_resenia(id_resenia):
         resenia = Resenia()
         exito, mensaje = resenia.modificar(id_resenia, titulo, comentario, calificacion)
         
-        print(f"Resultado: exito={exito}, mensaje={mensaje}")
+        log.debug("Modificar reseña %s: exito=%s, %s", id_resenia, exito, mensaje)
         
         if exito:
             return jsonify({
@@ -420,9 +422,7 @@ def modificar_resenia(id_resenia):
             }), 400
             
     except Exception as e:
-        print(f"💥 ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
@@ -463,13 +463,10 @@ def eliminar_resenia(id_resenia):
         description: Error en el servidor
     """
     try:
-        print(f"=== ELIMINAR RESEÑA ===")
-        print(f"id_resenia: {id_resenia}")
-        
         resenia = Resenia()
         exito, mensaje = resenia.eliminar(id_resenia)
         
-        print(f"Resultado: exito={exito}, mensaje={mensaje}")
+        log.debug("Eliminar reseña %s: exito=%s, %s", id_resenia, exito, mensaje)
         
         if exito:
             return jsonify({
@@ -483,9 +480,7 @@ def eliminar_resenia(id_resenia):
             }), 400
             
     except Exception as e:
-        print(f"💥 ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
@@ -818,13 +813,29 @@ def listar_resenias_por_producto_sucursal(id_prod_sucursal):
     tags:
       - Reseñas
     summary: Listar reseñas por producto sucursal
-    description: Obtiene TODAS las reseñas de TODOS los colores de un producto_sucursal
+    description: Reseñas de TODOS los colores de un producto_sucursal, paginadas. La primera página se sirve desde caché.
     parameters:
       - name: id_prod_sucursal
         in: path
         type: integer
         required: true
         description: ID del producto sucursal
+      - name: orden
+        in: query
+        type: string
+        required: false
+        enum: [recientes, mejores, peores]
+        description: Orden de las reseñas (por defecto recientes)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Reseñas por página (por defecto 20, máximo 50)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Valor de paginacion.siguiente de la página anterior
     responses:
       200:
         description: Reseñas obtenidas correctamente
@@ -858,80 +869,71 @@ def listar_resenias_por_producto_sucursal(id_prod_sucursal):
                     type: string
                   avatar_usuario:
                     type: string
+            paginacion:
+              type: object
+              properties:
+                orden:
+                  type: string
+                limit:
+                  type: integer
+                hay_mas:
+                  type: boolean
+                siguiente:
+                  type: string
+      400:
+        description: Orden o cursor inválido
       500:
         description: Error interno del servidor
     """
+    orden = request.args.get('orden', 'recientes')
+    if orden not in ORDENES_RESENIAS:
+        return jsonify({
+            'status': False,
+            'message': f"orden debe ser uno de: {', '.join(ORDENES_RESENIAS)}",
+            'data': []
+        }), 400
+    
+    limite = request.args.get('limit', default=LIMITE_RESENIAS, type=int)
+    limite = max(1, min(limite, LIMITE_RESENIAS_MAXIMO))
+    
+    despues = None
+    cursor_pagina = request.args.get('cursor')
+    if cursor_pagina:
+        try:
+            calificacion, fecha, id_resenia = cursor_pagina.split('|')
+            despues = (int(calificacion), datetime.fromisoformat(fecha), int(id_resenia))
+        except ValueError:
+            return jsonify({
+                'status': False,
+                'message': 'cursor inválido',
+                'data': []
+            }), 400
+    
     try:
-        print(f"=== LISTAR RESEÑAS POR PRODUCTO_SUCURSAL ===")
-        print(f"id_prod_sucursal recibido: {id_prod_sucursal}")
-        
-        con = Conexion().open
-        cursor = con.cursor()
-        
-        # ✅ SQL CORRECTO con id_usuario
-        sql = """
-            SELECT 
-                r.id_resenia,
-                r.id_usuario,
-                r.titulo,
-                r.comentario,
-                r.calificacion,
-                TO_CHAR(r.fecha_resenia, 'YYYY-MM-DD HH24:MI') as fecha_resenia,
-                u.nomusuario as usuario,
-                p.nombres || ' ' || p.apellidos as nombre_completo,
-                u.img_logo as avatar_usuario
-            FROM resenia_producto r
-            INNER JOIN producto_color pc ON r.id_prod_color = pc.id_prod_color
-            INNER JOIN usuario u ON r.id_usuario = u.id_usuario
-            INNER JOIN persona p ON u.id_persona = p.id_persona
-            WHERE pc.id_prod_sucursal = %s 
-              AND r.estado = TRUE
-            ORDER BY r.fecha_resenia DESC
-        """
-        
-        print(f"Ejecutando SQL con id_prod_sucursal = {id_prod_sucursal}")
-        cursor.execute(sql, [id_prod_sucursal])
-        resultado = cursor.fetchall()
-        
-        print(f"Filas obtenidas: {len(resultado) if resultado else 0}")
-        
-        cursor.close()
-        con.close()
+        resenia = Resenia()
+        exito, pagina = resenia.listar_por_producto_sucursal(id_prod_sucursal, orden, despues, limite)
         
-        if resultado:
-            resenias = []
-            for row in resultado:
-                print(f"  ✅ Reseña ID {row['id_resenia']} - Usuario ID {row['id_usuario']}: {row['titulo']}")
-                resenias.append({
-                    'id_resenia': row['id_resenia'],
-                    'id_usuario': row['id_usuario'],  # ✅ CRÍTICO
-                    'titulo': row['titulo'],
-                    'comentario': row['comentario'],
-                    'calificacion': row['calificacion'],
-                    'fecha_resenia': row['fecha_resenia'],
-                    'usuario': row['usuario'],
-                    'nombre_completo': row['nombre_completo'],
-                    'avatar_usuario': row['avatar_usuario'] if row['avatar_usuario'] else None
-                })
-            
-            print(f"Total reseñas devueltas: {len(resenias)}")
-            return jsonify({
-                'status': True,
-                'message': 'Reseñas obtenidas correctamente',
-                'data': resenias
-            }), 200
-        else:
-            print("⚠️ No hay reseñas para este producto_sucursal")
+        if not exito:
             return jsonify({
-                'status': True,
-                'message': 'No hay reseñas para este producto',
+                'status': False,
+                'message': pagina,
                 'data': []
-            }), 200
+            }), 500
+        
+        return jsonify({
+            'status': True,
+            'message': 'Reseñas obtenidas correctamente' if pagina['data'] else 'No hay reseñas para este producto',
+            'data': pagina['data'],
+            'paginacion': {
+                'orden': orden,
+                'limit': limite,
+                'hay_mas': pagina['hay_mas'],
+                'siguiente': pagina['siguiente']
+            }
+        }), 200
             
     except Exception as e:
-        print(f"💥 ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
@@ -992,9 +994,7 @@ def obtener_id_det_vent():
         id_usuario = data.get('id_usuario')
         id_prod_color = data.get('id_prod_color')
         
-        print(f"=== OBTENER ID_DET_VENT ===")
-        print(f"id_usuario: {id_usuario}")
-        print(f"id_prod_color: {id_prod_color}")
+        log.debug("Buscar detalle de venta | usuario=%s id_prod_color=%s", id_usuario, id_prod_color)
         
         if not id_usuario or not id_prod_color:
             return jsonify({
@@ -1016,18 +1016,15 @@ def obtener_id_det_vent():
             LIMIT 1
         """
         
-        print(f"Ejecutando SQL...")
         cursor.execute(sql, [id_usuario, id_prod_color])
         resultado = cursor.fetchone()
         
-        print(f"Resultado: {resultado}")
-        
         cursor.close()
         con.close()
         
         if resultado:
             id_det_vent = resultado['id_detalle_venta']
-            print(f"✅ id_detalle_venta encontrado: {id_det_vent}")
+            log.debug("id_detalle_venta encontrado: %s", id_det_vent)
             
             return jsonify({
                 'status': True,
@@ -1037,16 +1034,14 @@ def obtener_id_det_vent():
                 }
             }), 200
         else:
-            print(f"❌ No se encontró compra")
+            log.debug("Sin compra del producto %s para el usuario %s", id_prod_color, id_usuario)
             return jsonify({
                 'status': False,
                 'message': 'No has comprado este producto aún'
             }), 400
             
     except Exception as e:
-        print(f"💥 ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
@@ -1105,65 +1100,93 @@ def obtener_estadisticas_producto_sucursal(id_prod_sucursal):
         description: Error en el servidor
     """
     try:
-        print(f"=== ESTADÍSTICAS PRODUCTO_SUCURSAL ===")
-        print(f"id_prod_sucursal: {id_prod_sucursal}")
-        
-        con = Conexion().open
-        cursor = con.cursor()
-        
-        sql = """
-            SELECT 
-                COALESCE(AVG(r.calificacion), 0) as promedio,
-                COUNT(r.id_resenia) as total,
-                COUNT(CASE WHEN r.calificacion = 5 THEN 1 END) as estrellas_5,
-                COUNT(CASE WHEN r.calificacion = 4 THEN 1 END) as estrellas_4,
-                COUNT(CASE WHEN r.calificacion = 3 THEN 1 END) as estrellas_3,
-                COUNT(CASE WHEN r.calificacion = 2 THEN 1 END) as estrellas_2,
-                COUNT(CASE WHEN r.calificacion = 1 THEN 1 END) as estrellas_1
-            FROM resenia_producto r
-            INNER JOIN producto_color pc ON r.id_prod_color = pc.id_prod_color
-            WHERE pc.id_prod_sucursal = %s 
-              AND r.estado = TRUE
-        """
-        
-        cursor.execute(sql, [id_prod_sucursal])
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        con.close()
+        resenia = Resenia()
+        exito, estadisticas = resenia.obtener_estadisticas_producto_sucursal(id_prod_sucursal)
         
-        if resultado:
-            estadisticas = {
-                'promedio': round(float(resultado['promedio']), 1),
-                'total': resultado['total'],
-                'distribucion': {
-                    '5': resultado['estrellas_5'],
-                    '4': resultado['estrellas_4'],
-                    '3': resultado['estrellas_3'],
-                    '2': resultado['estrellas_2'],
-                    '1': resultado['estrellas_1']
-                }
-            }
-            
-            print(f"✅ Estadísticas: {estadisticas}")
-            
+        if exito:
             return jsonify({
                 'status': True,
-                'data': estadisticas,
+                'data': {
+                    'promedio': estadisticas['promedio'],
+                    'total': estadisticas['total'],
+                    'distribucion': estadisticas['distribucion']
+                },
                 'message': 'Estadísticas obtenidas'
             }), 200
         else:
             return jsonify({
                 'status': False,
-                'message': 'No se pudieron obtener estadísticas'
+                'message': estadisticas
             }), 500
             
     except Exception as e:
-        print(f"💥 ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
             'message': f'Error: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+# ============================================
+# ✅ RESUMEN DE CALIFICACIONES EN LOTE (CATÁLOGO)
+# ============================================
+MAXIMO_RESUMEN_LOTE = 200
+
+@ws_resenia.route('/resenias/resumen-productos', methods=['GET'])
+def obtener_resumen_productos():
+    """
+    ---
+    tags:
+      - Estadísticas
+    summary: Calificaciones de varios productos
+    description: Promedio, total y distribución por estrellas de una lista de producto_sucursal en una sola consulta (estrellas de las tarjetas del catálogo)
+    parameters:
+      - name: ids
+        in: query
+        type: string
+        required: true
+        description: IDs de producto_sucursal separados por coma (máximo 200)
+    responses:
+      200:
+        description: Resumen obtenido (en el mismo orden de ids; los productos sin reseñas vienen en 0)
+      400:
+        description: Lista de ids inválida
+      500:
+        description: Error en el servidor
+    """
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({
+            'status': False,
+            'message': 'ids debe ser una lista de enteros separados por coma'
+        }), 400
+    
+    if not ids or len(ids) > MAXIMO_RESUMEN_LOTE:
+        return jsonify({
+            'status': False,
+            'message': f'Se requieren entre 1 y {MAXIMO_RESUMEN_LOTE} ids'
+        }), 400
+    
+    try:
+        resenia = Resenia()
+        exito, resumenes = resenia.obtener_resumen_productos(ids)
+        
+        if exito:
+            return jsonify({
+                'status': True,
+                'data': resumenes,
+                'message': 'Resumen obtenido correctamente'
+            }), 200
+        else:
+            return jsonify({
+                'status': False,
+                'message': resumenes
+            }), 500
+            
+    except Exception as e:
+        return jsonify({
+            'status': False,
+            'message': f'Error en el servidor: {str(e)}'
+        }), 500
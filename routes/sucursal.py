@@ -2,7 +2,7 @@ from flask import Blueprint, jsonify, request
 from models.sucursal import Sucursal
 from conexionBD import Conexion
 from werkzeug.utils import secure_filename
-import cloudinary.uploader
+from tools.trabajos import subir_a_cloudinary
 import os
 
 ws_sucursal = Blueprint('ws_sucursal', __name__)
@@ -13,39 +13,6 @@ def allowed_file(filename):
     """Verificar si el archivo tiene una extensión permitida"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def subir_a_cloudinary(file, folder):
-    """
-    Subir archivo a Cloudinary y retornar URL pública
-    
-    Args:
-        file: Archivo de Flask (request.files)
-        folder: Carpeta en Cloudinary (ej: 'sucursales/logos')
-    
-    Returns:
-        str: URL pública de Cloudinary o None si falla
-    """
-    try:
-        if not file:
-            return None
-        
-        print(f"📤 Subiendo a Cloudinary: {file.filename} → {folder}")
-        
-        resultado = cloudinary.uploader.upload(
-            file,
-            folder=f"centro_comercial/{folder}",
-            resource_type="auto",
-            overwrite=True,
-            invalidate=True
-        )
-        
-        url = resultado['secure_url']
-        print(f"✅ URL Cloudinary: {url}")
-        return url
-        
-    except Exception as e:
-        print(f"❌ Error Cloudinary: {str(e)}")
-        return None
-
 @ws_sucursal.route('/sucursales/listar-por-empresa/<int:id_empresa>', methods=['GET'])
 def listar_por_empresa(id_empresa):
     """
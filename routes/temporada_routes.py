@@ -1,9 +1,11 @@
 from flask import Blueprint, jsonify, request
 from models.temporada import Temporada
+from tools.cache_http import cache_publico
 
 ws_temporada = Blueprint('ws_temporada', __name__)
 
 @ws_temporada.route('/temporadas/listar', methods=['GET'])
+@cache_publico()
 def listar_temporadas():
     """
     ---
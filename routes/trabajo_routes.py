@@ -0,0 +1,104 @@
+from flask import Blueprint, jsonify, request
+from models.trabajo import Trabajo
+
+ws_trabajo = Blueprint('ws_trabajo', __name__)
+
+ESTADOS_TRABAJO = ('pendiente', 'en_proceso', 'completado', 'muerto')
+LIMITE_MAXIMO = 200
+
+
+@ws_trabajo.route('/trabajos/<int:id_trabajo>', methods=['GET'])
+def obtener_trabajo(id_trabajo):
+    """
+    Estado de un trabajo en segundo plano
+    ---
+    tags:
+      - Trabajos
+    parameters:
+      - name: id_trabajo
+        in: path
+        required: true
+        type: integer
+        description: ID devuelto al encolar (p. ej. id_trabajo_notificacion)
+    responses:
+      200:
+        description: Estado del trabajo (pendiente, en_proceso, completado o muerto)
+      404:
+        description: Trabajo no encontrado
+    """
+    exito, resultado = Trabajo().obtener(id_trabajo)
+    if not exito:
+        codigo = 404 if resultado == 'Trabajo no encontrado' else 500
+        return jsonify({'status': False, 'data': None, 'message': resultado}), codigo
+
+    return jsonify({'status': True, 'data': resultado, 'message': 'Trabajo obtenido'}), 200
+
+
+@ws_trabajo.route('/trabajos/listar', methods=['GET'])
+def listar_trabajos():
+    """
+    Listar trabajos de la cola (por defecto los últimos 50)
+    ---
+    tags:
+      - Trabajos
+    parameters:
+      - name: estado
+        in: query
+        required: false
+        type: string
+        enum: [pendiente, en_proceso, completado, muerto]
+        description: Usar "muerto" para ver la cola de trabajos fallidos
+      - name: tipo
+        in: query
+        required: false
+        type: string
+        description: subir_imagen, notificacion_push o post_venta
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        default: 50
+    responses:
+      200:
+        description: Trabajos y resumen de cantidades por estado
+      400:
+        description: Estado no válido
+    """
+    estado = request.args.get('estado')
+    tipo = request.args.get('tipo')
+    limite = request.args.get('limit', default=50, type=int)
+
+    if estado and estado not in ESTADOS_TRABAJO:
+        return jsonify({
+            'status': False,
+            'data': None,
+            'message': f"Estado no válido. Use: {', '.join(ESTADOS_TRABAJO)}"
+        }), 400
+
+    exito, resultado = Trabajo().listar(estado, tipo, max(1, min(limite, LIMITE_MAXIMO)))
+    if not exito:
+        return jsonify({'status': False, 'data': None, 'message': resultado}), 500
+
+    return jsonify({'status': True, 'data': resultado, 'message': 'Trabajos obtenidos'}), 200
+
+
+@ws_trabajo.route('/trabajos/reintentar/<int:id_trabajo>', methods=['POST'])
+def reintentar_trabajo(id_trabajo):
+    """
+    Devolver a la cola un trabajo muerto
+    ---
+    tags:
+      - Trabajos
+    parameters:
+      - name: id_trabajo
+        in: path
+        required: true
+        type: integer
+    responses:
+      200:
+        description: Trabajo devuelto a la cola
+      400:
+        description: El trabajo no está en estado muerto
+    """
+    exito, mensaje = Trabajo().reintentar(id_trabajo)
+    return jsonify({'status': exito, 'data': None, 'message': mensaje}), 200 if exito else 400
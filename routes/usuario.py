@@ -1,14 +1,18 @@
+import logging
 from flask import Blueprint, request, jsonify, render_template, session
 from models.usuario import Usuario
 import jwt
 from datetime import datetime, timedelta
 from conexionBD import Conexion
 from config import Config
-import cloudinary.uploader
+from tools.trabajos import subir_a_cloudinary
+from tools.exportacion import responder_exportacion, FORMATOS_EXPORTACION, ExportacionesOcupadas
 
 ws_usuario = Blueprint('ws_usuario', __name__)
 usuario_model = Usuario()
 
+log = logging.getLogger(__name__)
+
 # Clave secreta para JWT
 SECRET_KEY = Config.SECRET_KEY
 
@@ -18,30 +22,6 @@ def allowed_file(filename):
     """Verificar extensión permitida"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def subir_a_cloudinary(file, folder):
-    """Subir imagen a Cloudinary"""
-    try:
-        if not file:
-            return None
-        
-        print(f"📤 Subiendo foto de usuario a Cloudinary: {file.filename}")
-        
-        resultado = cloudinary.uploader.upload(
-            file,
-            folder=f"centro_comercial/{folder}",
-            resource_type="auto",
-            overwrite=True,
-            invalidate=True
-        )
-        
-        url = resultado['secure_url']
-        print(f"✅ URL Cloudinary: {url}")
-        return url
-        
-    except Exception as e:
-        print(f"❌ Error Cloudinary: {str(e)}")
-        return None
-
 # ==================== VISTAS HTML ====================
 
 @ws_usuario.route('/login', methods=['GET'])
@@ -114,32 +94,21 @@ def login():
         description: Error en el servidor
     """
     try:
-        print("\n" + "="*60)
-        print("🔐 INICIANDO PROCESO DE LOGIN")
-        print("="*60)
-        
         data = request.get_json()
         email = data.get('email')
         password = data.get('password')
         
-        print(f"📧 Email recibido: {email}")
-        print(f"🔑 Password recibido: {'*' * len(password) if password else 'None'}")
-        
         if not email or not password:
-            print("❌ ERROR: Email o contraseña vacíos")
             return jsonify({
                 'status': False,
                 'message': 'Email y contraseña son requeridos'
             }), 400
         
         # Llamar al modelo
-        print("🔍 Llamando a usuario_model.login()...")
         exito, resultado = usuario_model.login(email, password)
         
-        print(f"📊 Resultado del login: {exito}")
-        
         if not exito:
-            print(f"❌ Login fallido: {resultado}")
+            log.info("Login fallido: %s", resultado)
             return jsonify({
                 'status': False,
                 'message': resultado
@@ -147,10 +116,7 @@ def login():
         
         # ✅ AGREGAR id_empresa AL USER_DATA
         user_data = resultado
-        print("✅ Login exitoso!")
-        print(f"👤 Usuario: {user_data.get('nomusuario')}")
-        print(f"🎭 Roles: {[r['nombre'] for r in user_data.get('roles', [])]}")
-        print(f"🏢 ID Empresa: {user_data.get('id_empresa', 'None')}")
+        log.info("Login exitoso: usuario %s (empresa %s)", user_data['id_usuario'], user_data.get('id_empresa'))
         
         # Generar token JWT
         token = jwt.encode({
@@ -159,11 +125,6 @@ def login():
             'exp': datetime.utcnow() + timedelta(days=7)
         }, SECRET_KEY, algorithm='HS256')
         
-        print(f"🎟️ Token generado: {token[:50]}...")
-        print("="*60)
-        print("✅ LOGIN COMPLETADO CON ÉXITO")
-        print("="*60 + "\n")
-        
         return jsonify({
             'status': True,
             'message': 'Login exitoso',
@@ -172,9 +133,7 @@ def login():
         }), 200
         
     except Exception as e:
-        print(f"\n💥 ERROR CRÍTICO EN LOGIN: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en login")
         return jsonify({
             'status': False,
             'message': f'Error en el servidor: {str(e)}'
@@ -697,9 +656,7 @@ def postular_empresa():
         }), 201
             
     except Exception as e:
-        print(f"💥 ERROR COMPLETO: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
@@ -893,9 +850,7 @@ def registrar_completo():
         }), 201
             
     except Exception as e:
-        print(f"Error en registro completo: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en registro completo")
         return jsonify({
             'status': False,
             'message': f'Error: {str(e)}'
@@ -985,9 +940,7 @@ def actualizar_foto():
         }), 200
         
     except Exception as e:
-        print(f"💥 ERROR en actualizar_foto: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en actualizar_foto")
         return jsonify({
             'status': False,
             'message': f'Error al actualizar foto: {str(e)}'
@@ -1332,9 +1285,7 @@ def actualizar_perfil():
         }), 200
         
     except Exception as e:
-        print(f"💥 ERROR en actualizar_perfil: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en actualizar_perfil")
         return jsonify({
             'status': False,
             'message': f'Error al actualizar perfil: {str(e)}'
@@ -1402,14 +1353,6 @@ def registro_google():
         apellidos = data.get('apellidos', '').strip()
         img_logo = data.get('img_logo')
         
-        print("\n" + "="*60)
-        print("🔵 REGISTRO/LOGIN CON GOOGLE")
-        print("="*60)
-        print(f"📧 Email: {email}")
-        print(f"🆔 Google ID: {google_id}")
-        print(f"👤 Nombre: {nombres} {apellidos}")
-        print("="*60)
-        
         # Validar datos obligatorios
         if not all([google_id, email, nombres, apellidos]):
             return jsonify({
@@ -1430,8 +1373,6 @@ def registro_google():
         cursor.close()
         con.close()
         
-        print(f"📊 Resultado SQL: {resultado}")
-        
         if resultado['success']:
             user_data = resultado['data']
             
@@ -1441,10 +1382,7 @@ def registro_google():
                 'email': user_data['email'],
                 'exp': datetime.utcnow() + timedelta(days=7)
             }, SECRET_KEY, algorithm='HS256')
-            
-            print(f"✅ Google Sign-In exitoso")
-            print(f"🎟️ Token generado")
-            print("="*60 + "\n")
+            log.info("Google Sign-In exitoso: usuario %s", user_data['id_usuario'])
             
             return jsonify({
                 'status': True,
@@ -1453,16 +1391,14 @@ def registro_google():
                 'user': user_data
             }), 200
         else:
-            print(f"❌ Error: {resultado['message']}")
+            log.info("Google Sign-In rechazado: %s", resultado['message'])
             return jsonify({
                 'status': False,
                 'message': resultado['message']
             }), 400
             
     except Exception as e:
-        print(f"\n💥 ERROR EN GOOGLE SIGN-IN: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en Google Sign-In")
         return jsonify({
             'status': False,
             'message': f'Error: {str(e)}'
@@ -1520,8 +1456,6 @@ def login_google():
                 'message': 'Google ID no proporcionado'
             }), 400
         
-        print(f"\n🔵 LOGIN CON GOOGLE ID: {google_id}")
-        
         # Llamar a función SQL
         con = Conexion().open
         cursor = con.cursor()
@@ -1544,8 +1478,7 @@ def login_google():
                 'email': user_data['email'],
                 'exp': datetime.utcnow() + timedelta(days=7)
             }, SECRET_KEY, algorithm='HS256')
-            
-            print(f"✅ Login Google exitoso\n")
+            log.info("Login Google exitoso: usuario %s", user_data['id_usuario'])
             
             return jsonify({
                 'status': True,
@@ -1560,7 +1493,7 @@ def login_google():
             }), 404
             
     except Exception as e:
-        print(f"💥 ERROR: {str(e)}")
+        log.exception("Error en login con Google")
         return jsonify({
             'status': False,
             'message': f'Error: {str(e)}'
@@ -1673,9 +1606,7 @@ def registrar_simple():
             }), 400
             
     except Exception as e:
-        print(f"Error en registrar_simple: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en registrar_simple")
         return jsonify({
             'status': False,
             'message': f'Error: {str(e)}'
@@ -1777,9 +1708,7 @@ def registro_google_simple():
             }), 400
             
     except Exception as e:
-        print(f"Error en registro_google_simple: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en registro_google_simple")
         return jsonify({
             'status': False,
             'message': f'Error: {str(e)}'
@@ -1876,6 +1805,73 @@ def listar_usuarios():
             'message': f'Error: {str(e)}'
         }), 500
     
+@ws_usuario.route('/api/usuarios/exportar', methods=['GET'])
+def exportar_usuarios():
+    """
+    ---
+    tags:
+      - Usuarios
+    summary: Exportar usuarios
+    description: Descarga todos los usuarios con sus datos de persona y roles en CSV o NDJSON, enviados en streaming desde un cursor de servidor
+    parameters:
+      - name: formato
+        in: query
+        type: string
+        enum: [csv, ndjson]
+        required: false
+        description: Formato del archivo (por defecto csv)
+    responses:
+      200:
+        description: Archivo de usuarios
+      400:
+        description: Formato inválido
+      500:
+        description: Error en el servidor
+      503:
+        description: Demasiadas exportaciones en curso, reintentar más tarde
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({
+            'status': False,
+            'message': f"formato debe ser uno de: {', '.join(FORMATOS_EXPORTACION)}"
+        }), 400
+    
+    sql = """
+        SELECT 
+            u.id_usuario,
+            u.nomusuario,
+            u.email,
+            u.estado,
+            p.nombres,
+            p.apellidos,
+            p.telefono,
+            (
+                SELECT string_agg(r.nombre, ', ' ORDER BY r.nombre)
+                FROM usuario_rol ur
+                INNER JOIN rol r ON ur.id_rol = r.id_rol
+                WHERE ur.id_usuario = u.id_usuario AND ur.estado = TRUE
+            ) as roles,
+            u.created_at
+        FROM usuario u
+        INNER JOIN persona p ON u.id_persona = p.id_persona
+        ORDER BY u.id_usuario
+    """
+    
+    try:
+        return responder_exportacion(sql, [], formato, 'usuarios')
+    except ExportacionesOcupadas as e:
+        return jsonify({
+            'status': False,
+            'data': None,
+            'message': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'status': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+    
 @ws_usuario.route('/api/usuario/actualizar-nombre/<int:id_usuario>', methods=['PUT'])
 def actualizar_nombre_usuario(id_usuario):
     """
@@ -2008,13 +2004,6 @@ def registrar_token():
                 'message': 'Faltan datos obligatorios (id_usuario, dispositivo, token)'
             }), 400
         
-        print(f"\n{'='*60}")
-        print(f"📱 REGISTRANDO TOKEN FCM")
-        print(f"{'='*60}")
-        print(f"   ID Usuario: {id_usuario}")
-        print(f"   Dispositivo: {dispositivo}")
-        print(f"   Token: {token[:20]}...")
-        
         con = Conexion().open
         cursor = con.cursor()
         
@@ -2036,8 +2025,6 @@ def registrar_token():
                     WHERE id_usuario = %s AND dispositivo = %s AND estado = TRUE
                 """, [id_usuario, dispositivo])
                 
-                print(f"   ⚠️  Tokens antiguos desactivados")
-                
                 # Insertar el nuevo token
                 cursor.execute("""
                     INSERT INTO usuario_fcm (id_usuario, dispositivo, token, estado)
@@ -2045,8 +2032,7 @@ def registrar_token():
                 """, [id_usuario, dispositivo, token])
                 
                 con.commit()
-                print(f"   ✅ Nuevo token registrado")
-                print(f"{'='*60}\n")
+                log.info("Token FCM registrado: usuario %s (%s)", id_usuario, dispositivo)
                 
                 cursor.close()
                 con.close()
@@ -2056,9 +2042,6 @@ def registrar_token():
                     'message': 'Token registrado correctamente'
                 }), 200
             else:
-                print(f"   ℹ️  Token ya existe y está activo")
-                print(f"{'='*60}\n")
-                
                 cursor.close()
                 con.close()
                 
@@ -2074,9 +2057,7 @@ def registrar_token():
             raise e
             
     except Exception as e:
-        print(f"❌ Error al registrar token: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error al registrar token FCM")
         return jsonify({
             'status': False,
             'message': f'Error: {str(e)}'
@@ -1,11 +1,16 @@
+import logging
 from flask import Blueprint, request, jsonify
 import os
-from models.venta import Venta
+from datetime import date, timedelta
+from conexionBD import unidad_trabajo_actual
+from models.venta import Venta, GRANULARIDADES_REPORTE, CUPON_YA_USADO
 from models.carrito import Carrito
-from conexionBD import Conexion
+from tools.exportacion import responder_exportacion, FORMATOS_EXPORTACION, ExportacionesOcupadas
 
 ws_venta = Blueprint('ws_venta', __name__)
 
+log = logging.getLogger(__name__)
+
 @ws_venta.route('/ventas/crear-multiple', methods=['POST'])
 def crear_venta_multiple():
     """
@@ -70,6 +75,8 @@ def crear_venta_multiple():
                   description: Errores al crear alguna venta
       400:
         description: Faltan datos requeridos
+      409:
+        description: El cupón ya fue usado en otra compra
       500:
         description: Error en el servidor
     """
@@ -80,13 +87,7 @@ def crear_venta_multiple():
         sucursales = data.get('sucursales')
         id_cupon = data.get('id_cupon')
         
-        print(f"\n{'='*60}")
-        print(f"📥 PETICIÓN RECIBIDA - CREAR VENTA MÚLTIPLE")
-        print(f"{'='*60}")
-        print(f"ID Usuario: {id_usuario}")
-        print(f"ID Tarjeta: {id_tarjeta}")
-        print(f"Sucursales: {sucursales}")
-        print(f"ID Cupón: {id_cupon if id_cupon else 'Sin cupón'}")
+        log.info("Crear venta múltiple: usuario=%s sucursales=%s cupón=%s", id_usuario, sucursales, id_cupon)
         
         if not all([id_usuario, id_tarjeta, sucursales]):
             return jsonify({
@@ -94,119 +95,46 @@ def crear_venta_multiple():
                 'message': 'Faltan datos requeridos'
             }), 400
         
+        try:
+            if not isinstance(sucursales, list):
+                raise TypeError('sucursales no es una lista')
+            ids_sucursales = [int(id_sucursal) for id_sucursal in sucursales]
+        except (TypeError, ValueError):
+            return jsonify({
+                'status': False,
+                'message': 'sucursales debe ser una lista de IDs enteros'
+            }), 400
+        
         venta_model = Venta()
-        ventas_creadas = []
-        errores = []
-        id_sucursal_cupon = None  # ✅ NUEVA VARIABLE
         
-        # ✅ SI HAY CUPÓN, OBTENER SU SUCURSAL
-        if id_cupon:
-            try:
-                con = Conexion().open
-                cursor = con.cursor()
-                cursor.execute("SELECT id_sucursal FROM cupon WHERE id_cupon = %s", [id_cupon])
-                cupon_info = cursor.fetchone()
-                if cupon_info:
-                    id_sucursal_cupon = cupon_info['id_sucursal']
-                cursor.close()
-                con.close()
-                print(f"   ✅ Sucursal del cupón: {id_sucursal_cupon}")
-            except Exception as e:
-                print(f"   ⚠️ Error al obtener sucursal del cupón: {str(e)}")
+        # ✅ TODAS LAS SUCURSALES EN UNA SOLA LLAMADA (el cupón solo aplica en su sucursal)
+        ventas_creadas, errores = venta_model.crear_ventas_por_sucursal(
+            id_usuario, ids_sucursales, id_tarjeta, id_cupon
+        )
         
-        for id_sucursal in sucursales:
-            print(f"\n🏪 Procesando sucursal ID: {id_sucursal}")
-            
-            # ✅ SOLO APLICAR CUPÓN EN LA SUCURSAL CORRECTA
-            cupon_para_esta_venta = id_cupon if (id_sucursal == id_sucursal_cupon) else None
-            
-            if cupon_para_esta_venta:
-                print(f"   🎫 Aplicando cupón {id_cupon} en esta sucursal")
-            else:
-                print(f"   ℹ️ Sin cupón para esta sucursal")
-            
-            exito, resultado = venta_model.crear_venta_completa(
-                id_usuario, id_sucursal, id_tarjeta, cupon_para_esta_venta  # ✅ AQUÍ PASAMOS EL CUPÓN
-            )
-            
-            if exito:
-                print(f"✅ Venta creada exitosamente:")
-                print(f"   - ID Venta: {resultado.get('id_venta')}")
-                print(f"   - Código: {resultado.get('codigo_venta')}")
-                print(f"   - Total: {resultado.get('total', 0)}")
-                print(f"   - Descuento: {resultado.get('descuento', 0)}")
-                
-                ventas_creadas.append(resultado)
-            else:
-                print(f"❌ Error: {resultado}")
-                errores.append({
-                    'id_sucursal': id_sucursal,
-                    'error': resultado
-                })
-        
-        # ✅ REGISTRAR USO DEL CUPÓN
+        # ✅ REGISTRO DEL CUPÓN EN LA MISMA TRANSACCIÓN QUE LAS VENTAS (en la venta que recibió el descuento)
         if ventas_creadas and id_cupon:
-            try:
-                print(f"\n{'='*60}")
-                print(f"🎫 REGISTRANDO USO DE CUPÓN")
-                print(f"{'='*60}")
-                
-                # Buscar la venta que tiene el cupón aplicado (la que tiene descuento > 0)
-                venta_con_cupon = None
-                for venta in ventas_creadas:
-                    if venta.get('descuento', 0) > 0:
-                        venta_con_cupon = venta
-                        break
-                
-                if venta_con_cupon:
-                    con = Conexion().open
-                    cursor = con.cursor()
-                    
-                    # Verificar si ya usó el cupón
-                    cursor.execute("""
-                        SELECT COUNT(*) as usado
-                        FROM cupon_usuario
-                        WHERE id_cupon = %s AND id_usuario = %s
-                    """, [id_cupon, id_usuario])
-                    
-                    resultado_check = cursor.fetchone()
-                    
-                    if resultado_check['usado'] > 0:
-                        print("⚠️ Usuario ya usó este cupón previamente (no debería llegar aquí)")
-                    else:
-                        # Insertar registro
-                        cursor.execute("""
-                            INSERT INTO cupon_usuario (id_cupon, id_usuario, id_venta, fecha_uso)
-                            VALUES (%s, %s, %s, NOW())
-                        """, [id_cupon, id_usuario, venta_con_cupon['id_venta']])
-                        
-                        # Incrementar contador
-                        cursor.execute("""
-                            UPDATE cupon
-                            SET cantidad_usada = cantidad_usada + 1
-                            WHERE id_cupon = %s
-                        """, [id_cupon])
-                        
-                        con.commit()
-                        print(f"✅ Cupón registrado en venta {venta_con_cupon['id_venta']}")
-                    
-                    cursor.close()
-                    con.close()
-                else:
-                    print("⚠️ No se encontró venta con descuento aplicado")
-                
-                print(f"{'='*60}\n")
-                
-            except Exception as e:
-                print(f"⚠️ Error al registrar cupón: {str(e)}")
-                import traceback
-                traceback.print_exc()
+            venta_con_cupon = next((v for v in ventas_creadas if v.get('descuento', 0) > 0), None)
+            if venta_con_cupon is None:
+                log.warning("No se encontró venta con descuento aplicado (cupón %s)", id_cupon)
+            else:
+                exito, mensaje = venta_model.registrar_uso_cupon(id_cupon, id_usuario, venta_con_cupon['id_venta'])
+                if not exito:
+                    # ✅ SIN CUPÓN NO HAY COMPRA: DESHACER TAMBIÉN LAS VENTAS
+                    unidad = unidad_trabajo_actual()
+                    if unidad is not None:
+                        unidad.descartar()
+                    if mensaje == CUPON_YA_USADO:
+                        return jsonify({
+                            'status': False,
+                            'message': CUPON_YA_USADO
+                        }), 409
+                    return jsonify({
+                        'status': False,
+                        'message': f'No se pudo registrar el cupón: {mensaje}'
+                    }), 500
         
-        print(f"\n{'='*60}")
-        print(f"📊 RESUMEN:")
-        print(f"   Ventas creadas: {len(ventas_creadas)}")
-        print(f"   Errores: {len(errores)}")
-        print(f"{'='*60}\n")
+        log.info("Venta múltiple: %d ventas creadas, %d errores", len(ventas_creadas), len(errores))
         
         if ventas_creadas:
             return jsonify({
@@ -225,9 +153,7 @@ def crear_venta_multiple():
             }), 400
             
     except Exception as e:
-        print(f"\n💥 ERROR CRÍTICO: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
@@ -279,49 +205,29 @@ def listar_ventas(id_usuario):
         description: Error en el servidor
     """
     try:
-        print(f"\n{'='*60}")
-        print(f"📥 PETICIÓN: Listar ventas usuario {id_usuario}")
-        print(f"{'='*60}")
-        
         user_agent = request.headers.get('User-Agent', '').lower()
         is_android = 'okhttp' in user_agent or 'android' in user_agent
         
-        print(f"User-Agent: {user_agent}")
-        print(f"Es Android: {is_android}")
-        
         if os.environ.get('RENDER'):
             base_url = "https://usat-comercial-api.onrender.com"
-            print(f"🌍 Entorno: RENDER (Producción)")
         else:
             base_url = "http://10.0.2.2:3007" if is_android else "http://localhost:3007"
-            print(f"💻 Entorno: LOCAL (Desarrollo)")
-        
-        print(f"Base URL: {base_url}")
         
         venta = Venta()
         exito, resultado = venta.listar_por_usuario(id_usuario)
         
         if exito:
-            print(f"\n✅ Productos obtenidos: {len(resultado)}")
+            detalle = log.isEnabledFor(logging.DEBUG)
             
-            for i, producto in enumerate(resultado):
+            for producto in resultado:
                 url_img = producto.get('url_img_producto', '')
-                print(f"\n📦 Producto {i+1}:")
-                print(f"   - Nombre: {producto.get('nombre_producto')}")
-                print(f"   - URL Original: {url_img}")
-                
-                if url_img:
-                    if not url_img.startswith('http'):
-                        if not url_img.startswith('/'):
-                            url_img = '/' + url_img
-                        producto['url_img_producto'] = base_url + url_img
-                        print(f"   - URL Procesada: {producto['url_img_producto']}")
-                else:
-                    print(f"   - ⚠️ Sin imagen")
-            
-            print(f"\n{'='*60}")
-            print(f"📤 RESPUESTA ENVIADA")
-            print(f"{'='*60}\n")
+                if url_img and not url_img.startswith('http'):
+                    if not url_img.startswith('/'):
+                        url_img = '/' + url_img
+                    producto['url_img_producto'] = base_url + url_img
+                if detalle:
+                    log.debug("Compra %s: %s -> %s", producto['id_detalle_venta'],
+                              producto['nombre_producto'], producto['url_img_producto'] or 'sin imagen')
             
             return jsonify({
                 'status': True,
@@ -329,16 +235,14 @@ def listar_ventas(id_usuario):
                 'message': 'Productos listados correctamente'
             }), 200
         else:
-            print(f"\n❌ Error al listar productos: {resultado}")
+            log.error("Error al listar compras del usuario %s: %s", id_usuario, resultado)
             return jsonify({
                 'status': False,
                 'data': [],
                 'message': resultado
             }), 500
     except Exception as e:
-        print(f"\n💥 ERROR CRÍTICO: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
@@ -508,13 +412,31 @@ def obtener_reporte_por_sucursal(id_sucursal):
     tags:
       - Reportes
     summary: Obtener reporte de ventas por sucursal
-    description: Genera un reporte completo de ventas para una sucursal específica incluyendo totales, descuentos e impuestos
+    description: Totales, descuentos, impuestos, productos y cupones de una sucursal por período, desde los acumulados diarios
     parameters:
       - name: id_sucursal
         in: path
         type: integer
         required: true
         description: ID de la sucursal
+      - name: desde
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Fecha inicial YYYY-MM-DD (por defecto 30 días antes de hasta)
+      - name: hasta
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Fecha final YYYY-MM-DD, inclusive (por defecto hoy)
+      - name: granularidad
+        in: query
+        type: string
+        enum: [dia, semana, mes, anio]
+        required: false
+        description: Agrupación de los períodos (por defecto dia)
     responses:
       200:
         description: Reporte generado correctamente
@@ -530,13 +452,15 @@ def obtener_reporte_por_sucursal(id_sucursal):
               items:
                 type: object
                 properties:
-                  id_venta:
-                    type: integer
-                  codigo_venta:
-                    type: string
-                  fecha_venta:
+                  periodo:
                     type: string
-                    format: date-time
+                    format: date
+                  ventas:
+                    type: integer
+                  ventas_canceladas:
+                    type: integer
+                  ventas_entregadas:
+                    type: integer
                   subtotal:
                     type: number
                   descuento:
@@ -545,114 +469,152 @@ def obtener_reporte_por_sucursal(id_sucursal):
                     type: number
                   total:
                     type: number
-                  nombre_usuario:
-                    type: string
-                  cantidad_productos:
+                  total_cancelado:
+                    type: number
+                  productos:
                     type: integer
-                  estado:
-                    type: boolean
+                  unidades:
+                    type: integer
+                  cupones_usados:
+                    type: integer
+            resumen:
+              type: object
+      400:
+        description: Fechas o granularidad inválidas
       500:
         description: Error en el servidor
     """
+    granularidad = request.args.get('granularidad', 'dia')
+    if granularidad not in GRANULARIDADES_REPORTE:
+        return jsonify({
+            'status': False,
+            'data': [],
+            'message': f"granularidad debe ser uno de: {', '.join(GRANULARIDADES_REPORTE)}"
+        }), 400
+    
     try:
-        print(f"\n{'='*60}")
-        print(f"📊 GENERANDO REPORTE DE VENTAS")
-        print(f"{'='*60}")
-        print(f"ID Sucursal: {id_sucursal}")
-        
-        con = Conexion().open
-        cursor = con.cursor()
-        
-        # ✅ CORREGIDO: Calcular subtotal, impuesto y descuento si son NULL
-        cursor.execute("""
-            SELECT 
-                v.id_venta,
-                v.codigo_qr as codigo_venta,
-                v.created_at as fecha_venta,
-                -- ✅ Si subtotal es NULL, calcular desde detalles
-                COALESCE(
-                    v.subtotal,
-                    (SELECT COALESCE(SUM(dv.sub_total), 0) 
-                     FROM detalle_venta dv 
-                     WHERE dv.id_venta = v.id_venta AND dv.estado = TRUE)
-                ) as subtotal,
-                -- ✅ Descuento (si es NULL, es 0)
-                COALESCE(v.descuento, 0) as descuento,
-                -- ✅ Si impuesto es NULL, calcular como (subtotal - descuento) * 0.18
-                COALESCE(
-                    v.impuesto,
-                    (COALESCE(v.subtotal, (SELECT COALESCE(SUM(dv.sub_total), 0) 
-                                            FROM detalle_venta dv 
-                                            WHERE dv.id_venta = v.id_venta AND dv.estado = TRUE)) 
-                     - COALESCE(v.descuento, 0)) * 0.18
-                ) as impuesto,
-                v.total,
-                v.estado,
-                u.nomusuario as nombre_usuario,
-                (SELECT COUNT(*) FROM detalle_venta dv WHERE dv.id_venta = v.id_venta AND dv.estado = TRUE) as cantidad_productos
-            FROM venta v
-            INNER JOIN usuario u ON v.id_usuario = u.id_usuario
-            WHERE v.id_sucursal = %s
-            ORDER BY v.created_at DESC
-        """, [id_sucursal])
-        
-        resultados = cursor.fetchall()
-        
-        cursor.close()
-        con.close()
-        
-        print(f"✅ Ventas encontradas: {len(resultados)}")
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else date.today()
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') else hasta - timedelta(days=30)
+    except ValueError:
+        return jsonify({
+            'status': False,
+            'data': [],
+            'message': 'desde y hasta deben tener el formato YYYY-MM-DD'
+        }), 400
+    
+    if desde > hasta:
+        return jsonify({
+            'status': False,
+            'data': [],
+            'message': 'desde no puede ser posterior a hasta'
+        }), 400
+    
+    try:
+        venta = Venta()
+        exito, reporte = venta.reporte_por_sucursal(id_sucursal, desde, hasta, granularidad)
         
-        if resultados:
-            ventas = []
-            for row in resultados:
-                subtotal = float(row['subtotal']) if row['subtotal'] else 0.0
-                descuento = float(row['descuento']) if row['descuento'] else 0.0
-                impuesto = float(row['impuesto']) if row['impuesto'] else 0.0
-                total = float(row['total']) if row['total'] else 0.0
-                
-                # ✅ DEBUG: Imprimir valores calculados
-                print(f"\n📦 Venta {row['codigo_venta']}:")
-                print(f"   Subtotal: {subtotal}")
-                print(f"   Descuento: {descuento}")
-                print(f"   Impuesto: {impuesto}")
-                print(f"   Total: {total}")
-                
-                venta = {
-                    'id_venta': row['id_venta'],
-                    'codigo_venta': row['codigo_venta'],
-                    'fecha_venta': str(row['fecha_venta']) if row['fecha_venta'] else '',
-                    'subtotal': subtotal,
-                    'descuento': descuento,
-                    'impuesto': impuesto,
-                    'total': total,
-                    'estado': row['estado'],
-                    'nombre_usuario': row['nombre_usuario'],
-                    'cantidad_productos': row['cantidad_productos']
-                }
-                ventas.append(venta)
-            
-            print(f"{'='*60}\n")
-            
-            return jsonify({
-                'status': True,
-                'data': ventas,
-                'message': 'Reporte generado correctamente'
-            }), 200
-        else:
+        if not exito:
             return jsonify({
-                'status': True,
+                'status': False,
                 'data': [],
-                'message': 'No hay ventas para esta sucursal'
-            }), 200
+                'message': reporte
+            }), 500
+        
+        return jsonify({
+            'status': True,
+            'data': reporte['periodos'],
+            'resumen': reporte['resumen'],
+            'filtros': {
+                'desde': desde.isoformat(),
+                'hasta': hasta.isoformat(),
+                'granularidad': granularidad
+            },
+            'message': 'Reporte generado correctamente' if reporte['periodos'] else 'No hay ventas para esta sucursal en el período'
+        }), 200
             
     except Exception as e:
-        print(f"\n💥 ERROR CRÍTICO: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error en %s", request.endpoint)
         
         return jsonify({
             'status': False,
             'data': [],
             'message': f'Error: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@ws_venta.route('/ventas/exportar/<int:id_sucursal>', methods=['GET'])
+def exportar_ventas_sucursal(id_sucursal):
+    """
+    ---
+    tags:
+      - Reportes
+    summary: Exportar ventas de una sucursal
+    description: Descarga venta por venta en CSV o NDJSON, enviada en streaming desde un cursor de servidor (sin límite de filas)
+    parameters:
+      - name: id_sucursal
+        in: path
+        type: integer
+        required: true
+        description: ID de la sucursal
+      - name: desde
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Fecha inicial YYYY-MM-DD (sin ella, desde la primera venta)
+      - name: hasta
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Fecha final YYYY-MM-DD, inclusive
+      - name: formato
+        in: query
+        type: string
+        enum: [csv, ndjson]
+        required: false
+        description: Formato del archivo (por defecto csv)
+    responses:
+      200:
+        description: Archivo de ventas
+      400:
+        description: Formato o fechas inválidas
+      500:
+        description: Error en el servidor
+      503:
+        description: Demasiadas exportaciones en curso, reintentar más tarde
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({
+            'status': False,
+            'data': None,
+            'message': f"formato debe ser uno de: {', '.join(FORMATOS_EXPORTACION)}"
+        }), 400
+    
+    try:
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') else None
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else None
+    except ValueError:
+        return jsonify({
+            'status': False,
+            'data': None,
+            'message': 'desde y hasta deben tener el formato YYYY-MM-DD'
+        }), 400
+    
+    try:
+        sql, parametros = Venta().consulta_exportacion(id_sucursal, desde, hasta)
+        return responder_exportacion(sql, parametros, formato, f'ventas_sucursal_{id_sucursal}')
+    except ExportacionesOcupadas as e:
+        return jsonify({
+            'status': False,
+            'data': None,
+            'message': str(e)
+        }), 503
+    except Exception as e:
+        log.exception("Error al exportar ventas de la sucursal %s", id_sucursal)
+        return jsonify({
+            'status': False,
+            'data': None,
+            'message': f'Error: {str(e)}'
+        }), 500
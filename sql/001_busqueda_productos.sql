@@ -0,0 +1,99 @@
+-- ==========================================
+-- BÚSQUEDA DE PRODUCTOS (/productos/buscar)
+-- Full-text en español sin acentos + trigramas para errores de tipeo.
+-- Idempotente: se puede ejecutar varias veces.
+--   psql "$DATABASE_URL" -f sql/001_busqueda_productos.sql
+-- ==========================================
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- unaccent() es STABLE; para usarla en índices se envuelve como IMMUTABLE
+CREATE OR REPLACE FUNCTION f_unaccent(text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS
+$$ SELECT public.unaccent('public.unaccent', $1) $$;
+
+-- Configuración de texto: español + sin acentos
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION es_unaccent ( COPY = spanish );
+        ALTER TEXT SEARCH CONFIGURATION es_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+
+-- Documento de búsqueda desnormalizado (incluye nombres de marca y categoría)
+ALTER TABLE producto_sucursal ADD COLUMN IF NOT EXISTS busqueda tsvector;
+ALTER TABLE producto_sucursal ADD COLUMN IF NOT EXISTS busqueda_texto text;
+
+CREATE OR REPLACE FUNCTION fn_producto_sucursal_busqueda()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+DECLARE
+    v_marca text;
+    v_categoria text;
+BEGIN
+    SELECT nombre INTO v_marca FROM marca WHERE id_marca = NEW.id_marca;
+    SELECT nombre INTO v_categoria FROM categoria_producto WHERE id_categoria = NEW.id_categoria;
+
+    NEW.busqueda :=
+        setweight(to_tsvector('es_unaccent', coalesce(NEW.nombre, '')), 'A') ||
+        setweight(to_tsvector('es_unaccent', coalesce(v_marca, '')), 'B') ||
+        setweight(to_tsvector('es_unaccent', coalesce(v_categoria, '')), 'B') ||
+        setweight(to_tsvector('es_unaccent', coalesce(NEW.material, '')), 'C');
+
+    NEW.busqueda_texto := lower(f_unaccent(concat_ws(' ', NEW.nombre, v_marca, v_categoria, NEW.material)));
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_producto_sucursal_busqueda ON producto_sucursal;
+CREATE TRIGGER trg_producto_sucursal_busqueda
+    BEFORE INSERT OR UPDATE OF nombre, material, id_marca, id_categoria ON producto_sucursal
+    FOR EACH ROW EXECUTE FUNCTION fn_producto_sucursal_busqueda();
+
+-- Si cambia el nombre de una marca o categoría se recalculan sus productos
+CREATE OR REPLACE FUNCTION fn_refrescar_busqueda_marca()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+    UPDATE producto_sucursal SET id_marca = id_marca WHERE id_marca = NEW.id_marca;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION fn_refrescar_busqueda_categoria()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+    UPDATE producto_sucursal SET id_categoria = id_categoria WHERE id_categoria = NEW.id_categoria;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_marca_busqueda ON marca;
+CREATE TRIGGER trg_marca_busqueda
+    AFTER UPDATE OF nombre ON marca
+    FOR EACH ROW WHEN (OLD.nombre IS DISTINCT FROM NEW.nombre)
+    EXECUTE FUNCTION fn_refrescar_busqueda_marca();
+
+DROP TRIGGER IF EXISTS trg_categoria_busqueda ON categoria_producto;
+CREATE TRIGGER trg_categoria_busqueda
+    AFTER UPDATE OF nombre ON categoria_producto
+    FOR EACH ROW WHEN (OLD.nombre IS DISTINCT FROM NEW.nombre)
+    EXECUTE FUNCTION fn_refrescar_busqueda_categoria();
+
+-- Cargar el documento de los productos existentes
+UPDATE producto_sucursal SET nombre = nombre WHERE busqueda IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_producto_sucursal_busqueda
+    ON producto_sucursal USING GIN (busqueda);
+
+CREATE INDEX IF NOT EXISTS idx_producto_sucursal_busqueda_trgm
+    ON producto_sucursal USING GIN (busqueda_texto gin_trgm_ops);
@@ -0,0 +1,37 @@
+-- ==========================================
+-- COLA DE TRABAJOS EN SEGUNDO PLANO
+-- La API encola (INSERT en la misma transacción del request) y el proceso
+-- "worker" del Procfile los toma con FOR UPDATE SKIP LOCKED.
+-- Idempotente: se puede ejecutar varias veces.
+--   psql "$DATABASE_URL" -f sql/002_cola_trabajos.sql
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS trabajo (
+    id_trabajo      bigserial PRIMARY KEY,
+    tipo            varchar(40) NOT NULL,
+    payload         jsonb NOT NULL DEFAULT '{}'::jsonb,
+    datos           bytea,                        -- contenido binario (p. ej. la imagen a subir)
+    estado          varchar(12) NOT NULL DEFAULT 'pendiente',
+    intentos        integer NOT NULL DEFAULT 0,
+    max_intentos    integer NOT NULL DEFAULT 5,
+    ejecutar_en     timestamptz NOT NULL DEFAULT now(),
+    tomado_en       timestamptz,
+    tomado_por      varchar(100),
+    resultado       jsonb,
+    ultimo_error    text,
+    fecha_creacion  timestamptz NOT NULL DEFAULT now(),
+    fecha_fin       timestamptz,
+    CONSTRAINT ck_trabajo_estado CHECK (estado IN ('pendiente', 'en_proceso', 'completado', 'muerto'))
+);
+
+-- Lo único que recorre el worker: pendientes listos, en orden de llegada
+CREATE INDEX IF NOT EXISTS idx_trabajo_pendiente
+    ON trabajo (ejecutar_en, id_trabajo) WHERE estado = 'pendiente';
+
+-- Recuperación de trabajos de un worker que murió a mitad de ejecución
+CREATE INDEX IF NOT EXISTS idx_trabajo_en_proceso
+    ON trabajo (tomado_en) WHERE estado = 'en_proceso';
+
+-- Consulta de la cola de muertos (dead-letter) desde /trabajos/listar
+CREATE INDEX IF NOT EXISTS idx_trabajo_muerto
+    ON trabajo (fecha_fin DESC) WHERE estado = 'muerto';
@@ -0,0 +1,10 @@
+-- ==========================================
+-- SINCRONIZACIÓN INCREMENTAL DEL CHAT
+-- /mensaje/listar y /mensaje/listar-web con after_id / before_id + limit
+-- recorren solo la ventana pedida de la conversación.
+-- Idempotente: se puede ejecutar varias veces.
+--   psql "$DATABASE_URL" -f sql/003_mensajes_delta.sql
+-- ==========================================
+
+CREATE INDEX IF NOT EXISTS idx_mensaje_conversacion_id
+    ON mensaje (id_conversacion, id_mensaje);
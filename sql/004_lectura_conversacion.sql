@@ -0,0 +1,31 @@
+-- ==========================================
+-- MARCAS DE LECTURA POR PARTICIPANTE
+-- Cada lado de la conversación guarda el último id_mensaje que leyó; un
+-- mensaje está leído si su id no supera la marca del otro lado. Leer solo
+-- escribe cuando la marca avanza (no se actualiza mensaje por mensaje).
+-- Idempotente: se puede ejecutar varias veces.
+--   psql "$DATABASE_URL" -f sql/004_lectura_conversacion.sql
+-- ==========================================
+
+ALTER TABLE conversacion ADD COLUMN IF NOT EXISTS ultimo_leido_usuario bigint NOT NULL DEFAULT 0;
+ALTER TABLE conversacion ADD COLUMN IF NOT EXISTS ultimo_leido_sucursal bigint NOT NULL DEFAULT 0;
+ALTER TABLE conversacion ADD COLUMN IF NOT EXISTS fecha_leido_usuario timestamp;
+ALTER TABLE conversacion ADD COLUMN IF NOT EXISTS fecha_leido_sucursal timestamp;
+
+-- Punto de partida: hasta dónde ya estaba leído con el flag por mensaje
+UPDATE conversacion c
+SET ultimo_leido_usuario = COALESCE((
+        SELECT MAX(m.id_mensaje) FROM mensaje m
+        WHERE m.id_conversacion = c.id_conversacion
+          AND m.tipo_emisor = 'SUCURSAL' AND m.leido = TRUE
+    ), 0),
+    ultimo_leido_sucursal = COALESCE((
+        SELECT MAX(m.id_mensaje) FROM mensaje m
+        WHERE m.id_conversacion = c.id_conversacion
+          AND m.tipo_emisor = 'USUARIO' AND m.leido = TRUE
+    ), 0)
+WHERE c.ultimo_leido_usuario = 0 AND c.ultimo_leido_sucursal = 0;
+
+-- Conteo de no leídos: mensajes del otro lado por encima de la marca
+CREATE INDEX IF NOT EXISTS idx_mensaje_conversacion_emisor_id
+    ON mensaje (id_conversacion, tipo_emisor, id_mensaje);
@@ -0,0 +1,113 @@
+-- ==========================================
+-- CONTADORES DE NO LEÍDOS POR (CONVERSACIÓN, PARTICIPANTE)
+-- Los mantienen triggers en la misma transacción que el mensaje o el avance
+-- de la marca de lectura (sql/004). El badge del usuario y el resumen por
+-- sucursal son una suma indexada, sin recorrer mensajes.
+-- Los ajustes son incrementos/decrementos (no recuentos) para que un envío
+-- y una lectura concurrentes no se pisen.
+-- Es la única fuente de no leídos: las columnas conversacion.mensajes_no_leidos_*
+-- ya no se leen ni se reinician desde la aplicación.
+-- Idempotente: se puede ejecutar varias veces.
+--   psql "$DATABASE_URL" -f sql/005_contadores_no_leidos.sql
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS conversacion_no_leidos (
+    id_conversacion integer NOT NULL REFERENCES conversacion (id_conversacion) ON DELETE CASCADE,
+    lado            varchar(10) NOT NULL,     -- quien tiene los mensajes pendientes de leer
+    id_usuario      integer NOT NULL,
+    id_sucursal     integer NOT NULL,
+    no_leidos       integer NOT NULL DEFAULT 0,
+    activa          boolean NOT NULL DEFAULT TRUE,
+    PRIMARY KEY (id_conversacion, lado),
+    CONSTRAINT ck_conversacion_no_leidos_lado CHECK (lado IN ('USUARIO', 'SUCURSAL'))
+);
+
+-- Solo las filas con pendientes entran al índice: quedan pequeños
+CREATE INDEX IF NOT EXISTS idx_no_leidos_usuario
+    ON conversacion_no_leidos (id_usuario) INCLUDE (no_leidos)
+    WHERE lado = 'USUARIO' AND activa AND no_leidos > 0;
+
+CREATE INDEX IF NOT EXISTS idx_no_leidos_sucursal
+    ON conversacion_no_leidos (id_sucursal) INCLUDE (no_leidos)
+    WHERE lado = 'SUCURSAL' AND activa AND no_leidos > 0;
+
+-- Mensaje nuevo: +1 para quien lo recibe
+CREATE OR REPLACE FUNCTION fn_no_leidos_mensaje()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+    INSERT INTO conversacion_no_leidos (id_conversacion, lado, id_usuario, id_sucursal, no_leidos, activa)
+    SELECT c.id_conversacion,
+           CASE WHEN NEW.tipo_emisor = 'USUARIO' THEN 'SUCURSAL' ELSE 'USUARIO' END,
+           c.id_usuario, c.id_sucursal, 1, c.estado
+    FROM conversacion c
+    WHERE c.id_conversacion = NEW.id_conversacion
+    ON CONFLICT (id_conversacion, lado)
+    DO UPDATE SET no_leidos = conversacion_no_leidos.no_leidos + 1;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_no_leidos_mensaje ON mensaje;
+CREATE TRIGGER trg_no_leidos_mensaje
+    AFTER INSERT ON mensaje
+    FOR EACH ROW EXECUTE FUNCTION fn_no_leidos_mensaje();
+
+-- Avance de marca: se restan los mensajes que quedaron entre la marca vieja y la nueva.
+-- Archivar/reactivar: se copia el estado.
+CREATE OR REPLACE FUNCTION fn_no_leidos_lectura()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+    IF NEW.ultimo_leido_usuario > OLD.ultimo_leido_usuario THEN
+        UPDATE conversacion_no_leidos n
+        SET no_leidos = GREATEST(n.no_leidos - (
+                SELECT COUNT(*) FROM mensaje m
+                WHERE m.id_conversacion = NEW.id_conversacion
+                  AND m.tipo_emisor = 'SUCURSAL'
+                  AND m.id_mensaje > OLD.ultimo_leido_usuario
+                  AND m.id_mensaje <= NEW.ultimo_leido_usuario
+            ), 0)
+        WHERE n.id_conversacion = NEW.id_conversacion AND n.lado = 'USUARIO';
+    END IF;
+
+    IF NEW.ultimo_leido_sucursal > OLD.ultimo_leido_sucursal THEN
+        UPDATE conversacion_no_leidos n
+        SET no_leidos = GREATEST(n.no_leidos - (
+                SELECT COUNT(*) FROM mensaje m
+                WHERE m.id_conversacion = NEW.id_conversacion
+                  AND m.tipo_emisor = 'USUARIO'
+                  AND m.id_mensaje > OLD.ultimo_leido_sucursal
+                  AND m.id_mensaje <= NEW.ultimo_leido_sucursal
+            ), 0)
+        WHERE n.id_conversacion = NEW.id_conversacion AND n.lado = 'SUCURSAL';
+    END IF;
+
+    IF NEW.estado IS DISTINCT FROM OLD.estado THEN
+        UPDATE conversacion_no_leidos
+        SET activa = COALESCE(NEW.estado, FALSE)
+        WHERE id_conversacion = NEW.id_conversacion;
+    END IF;
+
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_no_leidos_lectura ON conversacion;
+CREATE TRIGGER trg_no_leidos_lectura
+    AFTER UPDATE OF ultimo_leido_usuario, ultimo_leido_sucursal, estado ON conversacion
+    FOR EACH ROW EXECUTE FUNCTION fn_no_leidos_lectura();
+
+-- Carga inicial desde las marcas de lectura
+INSERT INTO conversacion_no_leidos (id_conversacion, lado, id_usuario, id_sucursal, no_leidos, activa)
+SELECT c.id_conversacion, l.lado, c.id_usuario, c.id_sucursal,
+       (SELECT COUNT(*) FROM mensaje m
+        WHERE m.id_conversacion = c.id_conversacion
+          AND m.tipo_emisor = l.emisor
+          AND m.id_mensaje > CASE WHEN l.lado = 'USUARIO' THEN c.ultimo_leido_usuario ELSE c.ultimo_leido_sucursal END),
+       COALESCE(c.estado, FALSE)
+FROM conversacion c
+CROSS JOIN (VALUES ('USUARIO', 'SUCURSAL'), ('SUCURSAL', 'USUARIO')) AS l (lado, emisor)
+ON CONFLICT (id_conversacion, lado) DO NOTHING;
@@ -0,0 +1,11 @@
+-- ==========================================
+-- BANDEJA DE CHATS POR EMPRESA
+-- /conversacion/listar-por-empresa pagina por (última actividad, id) de mayor
+-- a menor; este índice sirve esa ventana por sucursal sin ordenar todo.
+-- Idempotente: se puede ejecutar varias veces.
+--   psql "$DATABASE_URL" -f sql/006_bandeja_empresa.sql
+-- ==========================================
+
+CREATE INDEX IF NOT EXISTS idx_conversacion_sucursal_actividad
+    ON conversacion (id_sucursal, (COALESCE(fecha_ultimo_mensaje, created_at)) DESC, id_conversacion DESC)
+    WHERE estado = TRUE;
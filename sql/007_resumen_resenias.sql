@@ -0,0 +1,133 @@
+-- ==========================================
+-- RESUMEN DE CALIFICACIONES POR PRODUCTO
+-- Cantidad, suma e histograma 1-5 de las reseñas activas, por variante
+-- (id_prod_color) y acumulado por producto (id_prod_sucursal). Un trigger los
+-- ajusta en la misma transacción en que fn_resenia_crear / modificar /
+-- eliminar tocan resenia_producto: la reseña vieja resta y la nueva suma.
+-- Promedio, conteo y estadísticas pasan a ser una lectura por clave.
+-- Idempotente: se puede ejecutar varias veces (la carga final recalcula).
+-- Todo corre en una transacción con resenia_producto bloqueada para
+-- escritura: ninguna reseña entra entre el trigger y la carga (ni se cuenta
+-- dos veces ni se pierde).
+--   psql "$DATABASE_URL" -f sql/007_resumen_resenias.sql
+-- ==========================================
+
+BEGIN;
+
+LOCK TABLE resenia_producto, producto_color IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE IF NOT EXISTS resenia_resumen_color (
+    id_prod_color    integer PRIMARY KEY,
+    id_prod_sucursal integer NOT NULL,
+    total            integer NOT NULL DEFAULT 0,
+    suma             bigint  NOT NULL DEFAULT 0,
+    estrellas_1      integer NOT NULL DEFAULT 0,
+    estrellas_2      integer NOT NULL DEFAULT 0,
+    estrellas_3      integer NOT NULL DEFAULT 0,
+    estrellas_4      integer NOT NULL DEFAULT 0,
+    estrellas_5      integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS resenia_resumen_producto (
+    id_prod_sucursal integer PRIMARY KEY,
+    total            integer NOT NULL DEFAULT 0,
+    suma             bigint  NOT NULL DEFAULT 0,
+    estrellas_1      integer NOT NULL DEFAULT 0,
+    estrellas_2      integer NOT NULL DEFAULT 0,
+    estrellas_3      integer NOT NULL DEFAULT 0,
+    estrellas_4      integer NOT NULL DEFAULT 0,
+    estrellas_5      integer NOT NULL DEFAULT 0
+);
+
+-- Suma (p_signo = 1) o resta (p_signo = -1) una calificación en ambos niveles
+CREATE OR REPLACE FUNCTION fn_resenia_resumen_aplicar(p_id_prod_color integer, p_calificacion integer, p_signo integer)
+RETURNS void
+LANGUAGE plpgsql AS
+$$
+DECLARE
+    v_id_prod_sucursal integer;
+BEGIN
+    SELECT id_prod_sucursal INTO v_id_prod_sucursal
+    FROM producto_color WHERE id_prod_color = p_id_prod_color;
+
+    IF v_id_prod_sucursal IS NULL OR p_calificacion NOT BETWEEN 1 AND 5 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO resenia_resumen_color AS r (id_prod_color, id_prod_sucursal, total, suma,
+                                            estrellas_1, estrellas_2, estrellas_3, estrellas_4, estrellas_5)
+    VALUES (p_id_prod_color, v_id_prod_sucursal, p_signo, p_signo * p_calificacion,
+            (p_calificacion = 1)::int * p_signo, (p_calificacion = 2)::int * p_signo,
+            (p_calificacion = 3)::int * p_signo, (p_calificacion = 4)::int * p_signo,
+            (p_calificacion = 5)::int * p_signo)
+    ON CONFLICT (id_prod_color) DO UPDATE SET
+        total       = r.total + EXCLUDED.total,
+        suma        = r.suma + EXCLUDED.suma,
+        estrellas_1 = r.estrellas_1 + EXCLUDED.estrellas_1,
+        estrellas_2 = r.estrellas_2 + EXCLUDED.estrellas_2,
+        estrellas_3 = r.estrellas_3 + EXCLUDED.estrellas_3,
+        estrellas_4 = r.estrellas_4 + EXCLUDED.estrellas_4,
+        estrellas_5 = r.estrellas_5 + EXCLUDED.estrellas_5;
+
+    INSERT INTO resenia_resumen_producto AS r (id_prod_sucursal, total, suma,
+                                               estrellas_1, estrellas_2, estrellas_3, estrellas_4, estrellas_5)
+    VALUES (v_id_prod_sucursal, p_signo, p_signo * p_calificacion,
+            (p_calificacion = 1)::int * p_signo, (p_calificacion = 2)::int * p_signo,
+            (p_calificacion = 3)::int * p_signo, (p_calificacion = 4)::int * p_signo,
+            (p_calificacion = 5)::int * p_signo)
+    ON CONFLICT (id_prod_sucursal) DO UPDATE SET
+        total       = r.total + EXCLUDED.total,
+        suma        = r.suma + EXCLUDED.suma,
+        estrellas_1 = r.estrellas_1 + EXCLUDED.estrellas_1,
+        estrellas_2 = r.estrellas_2 + EXCLUDED.estrellas_2,
+        estrellas_3 = r.estrellas_3 + EXCLUDED.estrellas_3,
+        estrellas_4 = r.estrellas_4 + EXCLUDED.estrellas_4,
+        estrellas_5 = r.estrellas_5 + EXCLUDED.estrellas_5;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION fn_resenia_resumen()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.estado THEN
+        PERFORM fn_resenia_resumen_aplicar(OLD.id_prod_color, OLD.calificacion, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.estado THEN
+        PERFORM fn_resenia_resumen_aplicar(NEW.id_prod_color, NEW.calificacion, 1);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_resenia_resumen ON resenia_producto;
+CREATE TRIGGER trg_resenia_resumen
+    AFTER INSERT OR DELETE OR UPDATE OF id_prod_color, calificacion, estado ON resenia_producto
+    FOR EACH ROW EXECUTE FUNCTION fn_resenia_resumen();
+
+-- Carga inicial (y reparación si se vuelve a ejecutar): se vacía primero,
+-- así un producto que se quedó sin reseñas activas no conserva su resumen
+DELETE FROM resenia_resumen_color;
+DELETE FROM resenia_resumen_producto;
+
+INSERT INTO resenia_resumen_color (id_prod_color, id_prod_sucursal, total, suma,
+                                   estrellas_1, estrellas_2, estrellas_3, estrellas_4, estrellas_5)
+SELECT pc.id_prod_color, pc.id_prod_sucursal,
+       COUNT(r.id_resenia), COALESCE(SUM(r.calificacion), 0),
+       COUNT(*) FILTER (WHERE r.calificacion = 1), COUNT(*) FILTER (WHERE r.calificacion = 2),
+       COUNT(*) FILTER (WHERE r.calificacion = 3), COUNT(*) FILTER (WHERE r.calificacion = 4),
+       COUNT(*) FILTER (WHERE r.calificacion = 5)
+FROM resenia_producto r
+INNER JOIN producto_color pc ON r.id_prod_color = pc.id_prod_color
+WHERE r.estado = TRUE AND r.calificacion BETWEEN 1 AND 5
+GROUP BY pc.id_prod_color, pc.id_prod_sucursal;
+
+INSERT INTO resenia_resumen_producto (id_prod_sucursal, total, suma,
+                                      estrellas_1, estrellas_2, estrellas_3, estrellas_4, estrellas_5)
+SELECT id_prod_sucursal, SUM(total), SUM(suma),
+       SUM(estrellas_1), SUM(estrellas_2), SUM(estrellas_3), SUM(estrellas_4), SUM(estrellas_5)
+FROM resenia_resumen_color
+GROUP BY id_prod_sucursal;
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- ==========================================
+-- LISTADO PAGINADO DE RESEÑAS (/resenias/producto-sucursal)
+-- Paginación por llave sobre las reseñas activas de cada variante; las
+-- variantes de un producto se mezclan ya ordenadas en lugar de ordenar todo.
+-- Idempotente: se puede ejecutar varias veces.
+--   psql "$DATABASE_URL" -f sql/008_resenias_paginadas.sql
+-- ==========================================
+
+CREATE INDEX IF NOT EXISTS idx_resenia_color_fecha
+    ON resenia_producto (id_prod_color, fecha_resenia DESC, id_resenia DESC)
+    WHERE estado = TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_resenia_color_calificacion
+    ON resenia_producto (id_prod_color, calificacion, fecha_resenia DESC, id_resenia DESC)
+    WHERE estado = TRUE;
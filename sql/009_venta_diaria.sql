@@ -0,0 +1,251 @@
+-- ==========================================
+-- ACUMULADOS DIARIOS DE VENTAS POR SUCURSAL
+-- Una fila por (sucursal, día) con totales, descuentos, impuestos, productos
+-- y cupones. Los triggers suman y restan la contribución de cada fila en la
+-- misma transacción en que fn_crear_venta_completa, fn_cancelar_venta y
+-- fn_marcar_venta_entregada escriben: la fila vieja resta y la nueva suma
+-- (nunca se recalcula el día, así dos ventas simultáneas no se pisan).
+-- /ventas/reporte-por-sucursal lee de aquí por rango de fechas.
+-- Idempotente: se puede ejecutar varias veces (la carga final recalcula).
+-- Todo corre en una transacción con venta, detalle_venta y cupon_usuario
+-- bloqueadas para escritura: ninguna venta entra entre los triggers y la carga.
+--   psql "$DATABASE_URL" -f sql/009_venta_diaria.sql
+-- ==========================================
+
+BEGIN;
+
+LOCK TABLE venta, detalle_venta, cupon_usuario IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE IF NOT EXISTS venta_diaria (
+    id_sucursal        integer NOT NULL,
+    fecha              date    NOT NULL,
+    ventas             integer NOT NULL DEFAULT 0,    -- activas (no canceladas)
+    ventas_canceladas  integer NOT NULL DEFAULT 0,
+    ventas_entregadas  integer NOT NULL DEFAULT 0,
+    subtotal           numeric(14, 2) NOT NULL DEFAULT 0,
+    descuento          numeric(14, 2) NOT NULL DEFAULT 0,
+    impuesto           numeric(14, 2) NOT NULL DEFAULT 0,
+    total              numeric(14, 2) NOT NULL DEFAULT 0,
+    total_cancelado    numeric(14, 2) NOT NULL DEFAULT 0,
+    productos          integer NOT NULL DEFAULT 0,    -- líneas de detalle de ventas activas
+    unidades           integer NOT NULL DEFAULT 0,
+    cupones_usados     integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_sucursal, fecha)
+);
+
+CREATE OR REPLACE FUNCTION fn_venta_diaria_sumar(
+    p_id_sucursal integer, p_fecha date,
+    p_ventas integer, p_canceladas integer, p_entregadas integer,
+    p_subtotal numeric, p_descuento numeric, p_impuesto numeric, p_total numeric, p_total_cancelado numeric,
+    p_productos integer, p_unidades integer, p_cupones integer)
+RETURNS void
+LANGUAGE sql AS
+$$
+    INSERT INTO venta_diaria AS d (id_sucursal, fecha, ventas, ventas_canceladas, ventas_entregadas,
+                                   subtotal, descuento, impuesto, total, total_cancelado,
+                                   productos, unidades, cupones_usados)
+    VALUES (p_id_sucursal, p_fecha, p_ventas, p_canceladas, p_entregadas,
+            p_subtotal, p_descuento, p_impuesto, p_total, p_total_cancelado,
+            p_productos, p_unidades, p_cupones)
+    ON CONFLICT (id_sucursal, fecha) DO UPDATE SET
+        ventas            = d.ventas + EXCLUDED.ventas,
+        ventas_canceladas = d.ventas_canceladas + EXCLUDED.ventas_canceladas,
+        ventas_entregadas = d.ventas_entregadas + EXCLUDED.ventas_entregadas,
+        subtotal          = d.subtotal + EXCLUDED.subtotal,
+        descuento         = d.descuento + EXCLUDED.descuento,
+        impuesto          = d.impuesto + EXCLUDED.impuesto,
+        total             = d.total + EXCLUDED.total,
+        total_cancelado   = d.total_cancelado + EXCLUDED.total_cancelado,
+        productos         = d.productos + EXCLUDED.productos,
+        unidades          = d.unidades + EXCLUDED.unidades,
+        cupones_usados    = d.cupones_usados + EXCLUDED.cupones_usados;
+$$;
+
+-- Ventas antiguas sin subtotal/impuesto: el subtotal es la suma de sus líneas
+-- activas y el impuesto lo que queda entre total y (subtotal - descuento).
+-- Es lineal en el importe de las líneas, así el trigger de detalle puede
+-- aplicar solo la diferencia.
+CREATE OR REPLACE FUNCTION fn_venta_diaria_subtotal(p_subtotal numeric, p_importe_lineas numeric)
+RETURNS numeric
+LANGUAGE sql IMMUTABLE AS
+$$
+    SELECT COALESCE(p_subtotal, p_importe_lineas, 0);
+$$;
+
+CREATE OR REPLACE FUNCTION fn_venta_diaria_impuesto(p_impuesto numeric, p_total numeric,
+                                                    p_subtotal numeric, p_descuento numeric)
+RETURNS numeric
+LANGUAGE sql IMMUTABLE AS
+$$
+    SELECT COALESCE(p_impuesto,
+                    CASE WHEN p_total IS NULL THEN 0
+                         ELSE p_total - p_subtotal + COALESCE(p_descuento, 0) END);
+$$;
+
+-- Venta: montos y estados. Al cancelar o reactivar, sus líneas activas
+-- entran o salen de productos/unidades (lo que ve la transacción en ese momento).
+CREATE OR REPLACE FUNCTION fn_venta_diaria_venta()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+DECLARE
+    v_lineas integer;
+    v_unidades integer;
+    v_importe numeric;
+    v_subtotal numeric;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COUNT(*), COALESCE(SUM(cantidad), 0), COALESCE(SUM(sub_total), 0)
+        INTO v_lineas, v_unidades, v_importe
+        FROM detalle_venta WHERE id_venta = OLD.id_venta AND estado = TRUE;
+        v_subtotal := fn_venta_diaria_subtotal(OLD.subtotal, v_importe);
+
+        IF OLD.estado THEN
+            PERFORM fn_venta_diaria_sumar(OLD.id_sucursal, OLD.created_at::date,
+                -1, 0, -(COALESCE(OLD.entregado, FALSE))::int,
+                -v_subtotal, -COALESCE(OLD.descuento, 0),
+                -fn_venta_diaria_impuesto(OLD.impuesto, OLD.total, v_subtotal, OLD.descuento),
+                -COALESCE(OLD.total, 0), 0, -v_lineas, -v_unidades, 0);
+        ELSE
+            PERFORM fn_venta_diaria_sumar(OLD.id_sucursal, OLD.created_at::date,
+                0, -1, 0, 0, 0, 0, 0, -COALESCE(OLD.total, 0), 0, 0, 0);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COUNT(*), COALESCE(SUM(cantidad), 0), COALESCE(SUM(sub_total), 0)
+        INTO v_lineas, v_unidades, v_importe
+        FROM detalle_venta WHERE id_venta = NEW.id_venta AND estado = TRUE;
+        v_subtotal := fn_venta_diaria_subtotal(NEW.subtotal, v_importe);
+
+        IF NEW.estado THEN
+            PERFORM fn_venta_diaria_sumar(NEW.id_sucursal, NEW.created_at::date,
+                1, 0, (COALESCE(NEW.entregado, FALSE))::int,
+                v_subtotal, COALESCE(NEW.descuento, 0),
+                fn_venta_diaria_impuesto(NEW.impuesto, NEW.total, v_subtotal, NEW.descuento),
+                COALESCE(NEW.total, 0), 0, v_lineas, v_unidades, 0);
+        ELSE
+            PERFORM fn_venta_diaria_sumar(NEW.id_sucursal, NEW.created_at::date,
+                0, 1, 0, 0, 0, 0, 0, COALESCE(NEW.total, 0), 0, 0, 0);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_venta_diaria_venta ON venta;
+CREATE TRIGGER trg_venta_diaria_venta
+    AFTER INSERT OR DELETE OR UPDATE OF id_sucursal, created_at, estado, entregado,
+                                       subtotal, descuento, impuesto, total ON venta
+    FOR EACH ROW EXECUTE FUNCTION fn_venta_diaria_venta();
+
+-- Línea de detalle: cuenta solo si la línea y su venta están activas. Si la
+-- venta no tiene subtotal propio, el importe de la línea entra en el subtotal
+-- (y sale del impuesto derivado, si también es NULL y hay total).
+CREATE OR REPLACE FUNCTION fn_venta_diaria_detalle()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+DECLARE
+    v venta%ROWTYPE;
+    v_importe numeric;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.estado THEN
+        SELECT * INTO v FROM venta WHERE id_venta = OLD.id_venta;
+        IF FOUND AND v.estado THEN
+            v_importe := CASE WHEN v.subtotal IS NULL THEN COALESCE(OLD.sub_total, 0) ELSE 0 END;
+            PERFORM fn_venta_diaria_sumar(v.id_sucursal, v.created_at::date,
+                0, 0, 0, -v_importe, 0,
+                CASE WHEN v.impuesto IS NULL AND v.total IS NOT NULL THEN v_importe ELSE 0 END,
+                0, 0, -1, -COALESCE(OLD.cantidad, 0), 0);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.estado THEN
+        SELECT * INTO v FROM venta WHERE id_venta = NEW.id_venta;
+        IF FOUND AND v.estado THEN
+            v_importe := CASE WHEN v.subtotal IS NULL THEN COALESCE(NEW.sub_total, 0) ELSE 0 END;
+            PERFORM fn_venta_diaria_sumar(v.id_sucursal, v.created_at::date,
+                0, 0, 0, v_importe, 0,
+                CASE WHEN v.impuesto IS NULL AND v.total IS NOT NULL THEN -v_importe ELSE 0 END,
+                0, 0, 1, COALESCE(NEW.cantidad, 0), 0);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_venta_diaria_detalle ON detalle_venta;
+CREATE TRIGGER trg_venta_diaria_detalle
+    AFTER INSERT OR DELETE OR UPDATE OF id_venta, estado, cantidad, sub_total ON detalle_venta
+    FOR EACH ROW EXECUTE FUNCTION fn_venta_diaria_detalle();
+
+-- Uso de cupón (Venta.registrar_uso_cupon): se cuenta en el día de la venta
+CREATE OR REPLACE FUNCTION fn_venta_diaria_cupon()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+DECLARE
+    v venta%ROWTYPE;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT * INTO v FROM venta WHERE id_venta = OLD.id_venta;
+        IF FOUND THEN
+            PERFORM fn_venta_diaria_sumar(v.id_sucursal, v.created_at::date,
+                0, 0, 0, 0, 0, 0, 0, 0, 0, 0, -1);
+        END IF;
+    ELSE
+        SELECT * INTO v FROM venta WHERE id_venta = NEW.id_venta;
+        IF FOUND THEN
+            PERFORM fn_venta_diaria_sumar(v.id_sucursal, v.created_at::date,
+                0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_venta_diaria_cupon ON cupon_usuario;
+CREATE TRIGGER trg_venta_diaria_cupon
+    AFTER INSERT OR DELETE ON cupon_usuario
+    FOR EACH ROW EXECUTE FUNCTION fn_venta_diaria_cupon();
+
+-- Carga inicial (y reparación si se vuelve a ejecutar): se vacía primero,
+-- así un día que se quedó sin ventas no conserva sus acumulados
+DELETE FROM venta_diaria;
+
+INSERT INTO venta_diaria (id_sucursal, fecha, ventas, ventas_canceladas, ventas_entregadas,
+                          subtotal, descuento, impuesto, total, total_cancelado,
+                          productos, unidades, cupones_usados)
+SELECT v.id_sucursal, v.created_at::date,
+       COUNT(*) FILTER (WHERE v.estado),
+       COUNT(*) FILTER (WHERE NOT v.estado),
+       COUNT(*) FILTER (WHERE v.estado AND COALESCE(v.entregado, FALSE)),
+       COALESCE(SUM(m.subtotal) FILTER (WHERE v.estado), 0),
+       COALESCE(SUM(v.descuento) FILTER (WHERE v.estado), 0),
+       COALESCE(SUM(fn_venta_diaria_impuesto(v.impuesto, v.total, m.subtotal, v.descuento))
+                FILTER (WHERE v.estado), 0),
+       COALESCE(SUM(v.total) FILTER (WHERE v.estado), 0),
+       COALESCE(SUM(v.total) FILTER (WHERE NOT v.estado), 0),
+       COALESCE(SUM(d.lineas) FILTER (WHERE v.estado), 0),
+       COALESCE(SUM(d.unidades) FILTER (WHERE v.estado), 0),
+       COALESCE(SUM(cu.usos), 0)
+FROM venta v
+LEFT JOIN (
+    SELECT id_venta, COUNT(*) AS lineas, COALESCE(SUM(cantidad), 0) AS unidades,
+           COALESCE(SUM(sub_total), 0) AS importe
+    FROM detalle_venta WHERE estado = TRUE
+    GROUP BY id_venta
+) d ON d.id_venta = v.id_venta
+CROSS JOIN LATERAL (
+    SELECT fn_venta_diaria_subtotal(v.subtotal, d.importe) AS subtotal
+) m
+LEFT JOIN (
+    SELECT id_venta, COUNT(*) AS usos FROM cupon_usuario GROUP BY id_venta
+) cu ON cu.id_venta = v.id_venta
+GROUP BY v.id_sucursal, v.created_at::date;
+
+COMMIT;
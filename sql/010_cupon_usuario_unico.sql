@@ -0,0 +1,36 @@
+-- ==========================================
+-- UN USO DE CUPÓN POR USUARIO
+-- cupon_usuario solo se verificaba con SELECT antes del INSERT: dos compras
+-- simultáneas con el mismo cupón podían registrarlo dos veces. El índice
+-- único lo impide en la base y Venta.registrar_uso_cupon usa ON CONFLICT.
+-- Antes de crearlo se borran los usos duplicados (queda el más antiguo) y se
+-- recalcula cupon.cantidad_usada.
+-- Idempotente: se puede ejecutar varias veces.
+--   psql "$DATABASE_URL" -f sql/010_cupon_usuario_unico.sql
+-- ==========================================
+
+BEGIN;
+
+LOCK TABLE cupon_usuario IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM cupon_usuario cu
+USING cupon_usuario anterior
+WHERE anterior.id_cupon = cu.id_cupon
+  AND anterior.id_usuario = cu.id_usuario
+  AND (anterior.fecha_uso, anterior.ctid) < (cu.fecha_uso, cu.ctid);
+
+UPDATE cupon c
+SET cantidad_usada = u.usos
+FROM (
+    SELECT c2.id_cupon, COUNT(cu.id_cupon) AS usos
+    FROM cupon c2
+    LEFT JOIN cupon_usuario cu ON cu.id_cupon = c2.id_cupon
+    GROUP BY c2.id_cupon
+) u
+WHERE u.id_cupon = c.id_cupon
+  AND c.cantidad_usada > u.usos;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_cupon_usuario_cupon_usuario
+    ON cupon_usuario (id_cupon, id_usuario);
+
+COMMIT;
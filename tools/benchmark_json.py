@@ -0,0 +1,160 @@
+"""
+Benchmark del serializador JSON sobre payloads con la forma del catálogo,
+el carrito y el historial de compras.
+
+    python -m tools.benchmark_json --filas 500 --repeticiones 200
+
+Compara:
+- actual: conversión por fila (float / str, como hacían los modelos) + el
+  proveedor por defecto de Flask
+- rápido: filas tal como las entrega psycopg2 (Decimal, datetime) +
+  ProveedorJSONRapido (orjson si está instalado)
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from tools.json_rapido import ProveedorJSONRapido, orjson
+
+COLORES = ('Negro', 'Blanco', 'Azul marino', 'Rojo', 'Verde oliva')
+CATEGORIAS = ('Polos', 'Pantalones', 'Zapatillas', 'Casacas')
+
+
+# ---------- catálogo ----------
+
+def _filas_catalogo(n):
+    return [{
+        'id_prod_sucursal': i,
+        'id_temporada': i % 4 + 1,
+        'id_prod_color': i * 3,
+        'nombre': f'Producto de temporada número {i}',
+        'talla': ('S', 'M', 'L', 'XL')[i % 4],
+        'material': 'Algodón pima',
+        'url_img': f'https://res.cloudinary.com/demo/image/upload/v1/productos/{i}.jpg',
+        'genero': ('Hombre', 'Mujer', 'Unisex')[i % 3],
+        'precio': Decimal('59.90') + i,
+        'stock': i % 37,
+        'marca': 'Marca Perú',
+        'categoria': CATEGORIAS[i % len(CATEGORIAS)],
+        'color': COLORES[i % len(COLORES)]
+    } for i in range(n)]
+
+
+def _convertir_catalogo(filas):
+    return [dict(fila, precio=float(fila['precio'])) for fila in filas]
+
+
+# ---------- carrito ----------
+
+def _filas_carrito(n):
+    sucursales = []
+    for s in range(max(1, n // 10)):
+        productos = [{
+            'id_carrito': s * 100 + i,
+            'id_prod_color': i,
+            'id_prod_sucursal': i,
+            'producto_nombre': f'Producto {i}',
+            'cantidad': i % 3 + 1,
+            'precio': Decimal('39.90') + i,
+            'stock': 20,
+            'url_img': f'https://res.cloudinary.com/demo/image/upload/v1/productos/{i}.jpg',
+            'talla': 'M',
+            'genero': 'Unisex',
+            'material': 'Denim',
+            'marca': 'Marca Perú',
+            'categoria': CATEGORIAS[i % len(CATEGORIAS)],
+            'color': COLORES[i % len(COLORES)]
+        } for i in range(10)]
+        sucursales.append({
+            'id_sucursal': s,
+            'nombre_sucursal': f'Sucursal {s}',
+            'logo_sucursal': '',
+            'productos': productos,
+            'subtotal': sum(p['precio'] * p['cantidad'] for p in productos)
+        })
+    return sucursales
+
+
+def _convertir_carrito(sucursales):
+    convertidas = []
+    for sucursal in sucursales:
+        productos = [dict(p, precio=float(p['precio'])) for p in sucursal['productos']]
+        convertidas.append(dict(
+            sucursal,
+            productos=productos,
+            subtotal=sum(p['precio'] * p['cantidad'] for p in productos)
+        ))
+    return convertidas
+
+
+# ---------- historial de compras ----------
+
+def _filas_historial(n):
+    inicio = datetime(2025, 1, 1, 10, 30)
+    return [{
+        'id_detalle_venta': i,
+        'id_venta': i // 3,
+        'codigo_venta': f'VTA-{i:08d}',
+        'fecha_venta': inicio + timedelta(hours=i),
+        'total': Decimal('120.50') + i,
+        'estado': 'ENTREGADO',
+        'nombre_sucursal': f'Sucursal {i % 7}',
+        'nombre_producto': f'Producto {i}',
+        'url_img_producto': f'https://res.cloudinary.com/demo/image/upload/v1/productos/{i}.jpg',
+        'color': COLORES[i % len(COLORES)],
+        'talla': 'L'
+    } for i in range(n)]
+
+
+def _convertir_historial(filas):
+    return [dict(
+        fila,
+        fecha_venta=fila['fecha_venta'].isoformat(),
+        total=float(fila['total'])
+    ) for fila in filas]
+
+
+ESCENARIOS = (
+    ('catálogo', _filas_catalogo, _convertir_catalogo),
+    ('carrito', _filas_carrito, _convertir_carrito),
+    ('historial', _filas_historial, _convertir_historial)
+)
+
+
+def _medir(funcion, repeticiones):
+    mejor = None
+    for _ in range(3):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        transcurrido = (time.perf_counter() - inicio) / repeticiones
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del proveedor JSON')
+    parser.add_argument('--filas', type=int, default=500)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    actual = DefaultJSONProvider(app)
+    actual.ensure_ascii = False
+    rapido = ProveedorJSONRapido(app)
+    compacto = {'separators': (',', ':')}
+
+    print(f"🔧 Motor rápido: {'orjson' if orjson is not None else 'json (stdlib, orjson no instalado)'}")
+    print(f"{'payload':<12}{'actual (ms)':>14}{'rápido (ms)':>14}{'mejora':>10}")
+
+    for nombre, generar, convertir in ESCENARIOS:
+        filas = generar(args.filas)
+        ms_actual = _medir(lambda: actual.dumps({'data': convertir(filas)}, **compacto), args.repeticiones)
+        ms_rapido = _medir(lambda: rapido.dumps({'data': filas}, **compacto), args.repeticiones)
+        print(f"{nombre:<12}{ms_actual:>14.3f}{ms_rapido:>14.3f}{ms_actual / ms_rapido:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+import time
+from config import Config
+from tools.escucha_pg import obtener_escucha, notificar
+
+# ==========================================
+# SNAPSHOT EN MEMORIA DEL CATÁLOGO PÚBLICO
+# Cada worker guarda las filas del listado de productos y las sirve sin tocar
+# la BD hasta que un NOTIFY en CANAL_CATALOGO (emitido por las escrituras de
+# productos, variantes, marcas, categorías, colores o stock) lo invalida.
+# El sello para el ETag es una huella del contenido: todos los workers (y el
+# mismo worker tras reiniciar) dan el mismo sello para las mismas filas.
+# ==========================================
+
+CANAL_CATALOGO = 'catalogo_cambio'
+
+# Si la escucha está caída no hay garantía de enterarse de los cambios
+TTL_SIN_ESCUCHA = 10
+
+
+class SnapshotCatalogo:
+
+    def __init__(self, canal):
+        self.canal = canal
+        self._lock = threading.Lock()
+        self._version = 0
+        self._filas = None
+        self._cargado_en = 0
+        self._huella = None
+        self._derivados = {}
+        self._escucha = None
+
+    @property
+    def version(self):
+        """Sello de versión local; cambia con cada invalidación"""
+        return self._version
+
+    def sello(self):
+        """
+        Huella de las filas vigentes para un ETag, o None si no hay snapshot
+        servible (la próxima lectura recargará).
+        """
+        with self._lock:
+            if self._filas is None or self._escucha is None or self._expirado():
+                return None
+            return self._huella
+
+    def filas(self, cargar):
+        """
+        Devuelve (filas, version). `cargar` solo se llama si el snapshot
+        no existe, fue invalidado o expiró.
+        """
+        self._suscribir()
+        with self._lock:
+            if self._filas is not None and not self._expirado():
+                return self._filas, self._version
+            version = self._version
+
+        filas = cargar()
+        huella = _huella(filas)
+
+        with self._lock:
+            # Si llegó una invalidación durante la carga, estas filas ya nacen viejas
+            if self._version == version:
+                self._filas = filas
+                self._huella = huella
+                self._cargado_en = time.monotonic()
+                self._derivados = {}
+        return filas, version
+
+    def derivado(self, clave, version, construir):
+        """Memoriza una transformación de las filas (p. ej. la serialización por tipo de cliente)"""
+        with self._lock:
+            if version == self._version and clave in self._derivados:
+                return self._derivados[clave]
+        valor = construir()
+        with self._lock:
+            if version == self._version and self._filas is not None:
+                self._derivados[clave] = valor
+        return valor
+
+    def invalidar(self, cursor=None):
+        """
+        Descarta el snapshot local. Con `cursor`, además encola el NOTIFY para
+        los demás workers dentro de la misma transacción de la escritura.
+        """
+        if cursor is not None:
+            notificar(cursor, self.canal)
+        with self._lock:
+            self._version += 1
+            self._filas = None
+            self._huella = None
+            self._derivados = {}
+
+    def _expirado(self):
+        ttl = Config.CATALOGO_TTL if self._escucha.conectado else TTL_SIN_ESCUCHA
+        return time.monotonic() - self._cargado_en > ttl
+
+    def _suscribir(self):
+        # La escucha es por proceso: tras un fork hay que suscribirse de nuevo
+        escucha = obtener_escucha()
+        if self._escucha is not escucha:
+            escucha.suscribir(self.canal, lambda canal, payload: self.invalidar())
+            self._escucha = escucha
+
+
+def _huella(filas):
+    """sha1 de las filas (en el orden de la consulta)"""
+    contenido = json.dumps(filas, default=str, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+catalogo = SnapshotCatalogo(CANAL_CATALOGO)
@@ -0,0 +1,110 @@
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from tools.compresion import variantes_etag
+from tools.serializador_productos import cliente_actual
+
+# ==========================================
+# POLÍTICA DE CACHÉ HTTP POR ENDPOINT
+# Por defecto toda respuesta sale con no-store (datos privados: carrito,
+# tarjetas, ventas...). Los endpoints de datos de referencia se marcan con
+# @cache_publico: llevan ETag fuerte, max-age / stale-while-revalidate, y
+# un If-None-Match que coincide se responde 304.
+# - Con `version`: el ETag sale de la versión de los datos (p. ej. la huella
+#   del snapshot del catálogo) y el 304 se decide ANTES de ejecutar la vista.
+#   La versión debe depender solo de los datos, no del worker: así el ETag
+#   vale entre workers y tras un reinicio.
+# - Sin `version`: el ETag es el hash del cuerpo (se ahorra la transferencia).
+# ==========================================
+
+POLITICA_PRIVADA = 'no-store, no-cache, must-revalidate, max-age=0'
+
+# Lo que cambia la representación además de la URL (ver serializador_productos / perfil_respuesta)
+VARY = 'Accept-Encoding, User-Agent, X-Perfil-Respuesta'
+
+def _politica(max_age, stale_while_revalidate):
+    if max_age <= 0:
+        return 'public, no-cache'
+    politica = f'public, max-age={int(max_age)}'
+    if stale_while_revalidate:
+        politica += f', stale-while-revalidate={int(stale_while_revalidate)}'
+    return politica
+
+
+def _etag_version(sello):
+    # Del User-Agent solo importa si es Android (URLs absolutas), no la versión del navegador
+    variante = '|'.join((
+        str(sello),
+        request.host,
+        request.full_path,
+        'android' if cliente_actual().is_android else 'web',
+        request.headers.get('X-Perfil-Respuesta', '')
+    ))
+    return hashlib.sha1(variante.encode('utf-8')).hexdigest()
+
+
+def _coincide(etag):
+    """La variante del ETag (cruda o con sufijo de compresión) que trae If-None-Match, o None"""
+    for variante in variantes_etag(etag):
+        if variante in request.if_none_match:
+            return variante
+    return None
+
+
+def _no_modificado(etag, politica):
+    respuesta = make_response('', 304)
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = politica
+    respuesta.headers['Vary'] = VARY
+    return respuesta
+
+
+def cache_publico(max_age=0, stale_while_revalidate=0, version=None):
+    """
+    Marca una vista GET como cacheable. `version` es un callable que devuelve
+    un sello de los datos vigentes, o None si no puede garantizarlo (entonces
+    se usa el hash del cuerpo).
+    """
+    politica = _politica(max_age, stale_while_revalidate)
+
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            sello = version() if version is not None else None
+            if sello is not None:
+                etag = _etag_version(sello)
+                coincidente = _coincide(etag)
+                if coincidente:
+                    return _no_modificado(coincidente, politica)
+
+            respuesta = make_response(vista(*args, **kwargs))
+            if respuesta.status_code != 200 or respuesta.is_streamed:
+                return respuesta
+
+            # El sello solo vale si no cambió mientras corría la vista
+            if sello is not None and version() == sello:
+                etag = _etag_version(sello)
+            else:
+                etag = hashlib.sha1(respuesta.get_data()).hexdigest()
+
+            coincidente = _coincide(etag)
+            if coincidente:
+                return _no_modificado(coincidente, politica)
+
+            respuesta.set_etag(etag)
+            respuesta.headers['Cache-Control'] = politica
+            respuesta.headers['Vary'] = VARY
+            return respuesta
+
+        return envoltura
+
+    return decorador
+
+
+def aplicar_politica_por_defecto(respuesta):
+    """no-store para toda respuesta que no declaró su propia política"""
+    if 'Cache-Control' not in respuesta.headers:
+        respuesta.headers['Cache-Control'] = POLITICA_PRIVADA
+        respuesta.headers['Pragma'] = 'no-cache'
+        respuesta.headers['Expires'] = '-1'
+    return respuesta
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from tools.escucha_pg import obtener_escucha, notificar
+
+# ==========================================
+# PRIMERA PÁGINA DE RESEÑAS EN MEMORIA
+# Cada worker guarda la primera página ya serializada de cada producto
+# (por orden y límite) y la sirve sin tocar la BD hasta que un NOTIFY en
+# CANAL_RESENIAS con el id_prod_sucursal (emitido por Resenia.crear /
+# modificar / eliminar) la invalida. Acotada a RESENIAS_CACHE_MAXIMO
+# entradas; se descartan las menos usadas.
+# ==========================================
+
+CANAL_RESENIAS = 'resenia_cambio'
+
+# Si la escucha está caída no hay garantía de enterarse de los cambios
+TTL_SIN_ESCUCHA = 10
+
+
+class CachePrimeraPagina:
+
+    def __init__(self, canal):
+        self.canal = canal
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entradas = OrderedDict()    # (id_prod_sucursal, orden, limite) -> (valor, cargado_en)
+        self._escucha = None
+
+    def obtener(self, clave, cargar):
+        """
+        Devuelve el valor cacheado para `clave` (su primer elemento es el
+        id_prod_sucursal). `cargar` solo se llama si no existe o expiró.
+        """
+        self._suscribir()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and not self._expirado(entrada[1]):
+                self._entradas.move_to_end(clave)
+                return entrada[0]
+            version = self._version
+
+        valor = cargar()
+
+        with self._lock:
+            # Si llegó una invalidación durante la carga, este valor ya nace viejo
+            if self._version == version:
+                self._entradas[clave] = (valor, time.monotonic())
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > Config.RESENIAS_CACHE_MAXIMO:
+                    self._entradas.popitem(last=False)
+        return valor
+
+    def invalidar(self, id_prod_sucursal=None, cursor=None):
+        """
+        Descarta las páginas de un producto (o todas si es None). Con `cursor`,
+        además encola el NOTIFY para los demás workers dentro de la misma
+        transacción de la escritura.
+        """
+        if cursor is not None:
+            notificar(cursor, self.canal, str(id_prod_sucursal))
+        with self._lock:
+            self._version += 1
+            if id_prod_sucursal is None:
+                self._entradas.clear()
+            else:
+                for clave in [c for c in self._entradas if c[0] == id_prod_sucursal]:
+                    del self._entradas[clave]
+
+    def _recibir(self, canal, payload):
+        # payload None: la escucha se reconectó y pudo perder avisos
+        self.invalidar(int(payload) if payload else None)
+
+    def _expirado(self, cargado_en):
+        ttl = Config.RESENIAS_CACHE_TTL if self._escucha.conectado else TTL_SIN_ESCUCHA
+        return time.monotonic() - cargado_en > ttl
+
+    def _suscribir(self):
+        # La escucha es por proceso: tras un fork hay que suscribirse de nuevo
+        escucha = obtener_escucha()
+        if self._escucha is not escucha:
+            escucha.suscribir(self.canal, self._recibir)
+            self._escucha = escucha
+
+
+resenias_cache = CachePrimeraPagina(CANAL_RESENIAS)
@@ -0,0 +1,123 @@
+import json
+import queue
+import threading
+from tools.escucha_pg import obtener_escucha, notificar
+
+# ==========================================
+# EVENTOS DEL CHAT EN TIEMPO REAL (SSE)
+# Mensaje.enviar emite un NOTIFY en CANAL_CHAT dentro de su transacción; la
+# escucha única del worker lo reparte a las colas de los streams abiertos
+# para esa conversación o esa sucursal.
+# ==========================================
+
+CANAL_CHAT = 'chat_mensaje'
+
+# Eventos pendientes por stream antes de descartar (el cliente se resincroniza)
+EVENTOS_POR_STREAM = 100
+
+EVENTO_RESYNC = {'tipo': 'resync'}
+
+
+def conversacion(id_conversacion):
+    return ('conversacion', int(id_conversacion))
+
+
+def sucursal(id_sucursal):
+    return ('sucursal', int(id_sucursal))
+
+
+def emitir_mensaje(cursor, id_conversacion, id_mensaje, tipo_emisor):
+    """Encola el aviso del nuevo mensaje en la transacción del cursor (se entrega solo si hay COMMIT)"""
+    cursor.execute("""
+        SELECT id_sucursal FROM conversacion WHERE id_conversacion = %s
+    """, [id_conversacion])
+    row = cursor.fetchone()
+    notificar(cursor, CANAL_CHAT, json.dumps({
+        'tipo': 'mensaje',
+        'id_conversacion': int(id_conversacion),
+        'id_sucursal': row['id_sucursal'] if row else None,
+        'id_mensaje': id_mensaje,
+        'tipo_emisor': tipo_emisor
+    }))
+
+
+def emitir_lectura(cursor, id_conversacion, id_sucursal, tipo_lector, ultimo_leido):
+    """Aviso de que un lado avanzó su marca de lectura (confirmaciones de lectura en vivo)"""
+    notificar(cursor, CANAL_CHAT, json.dumps({
+        'tipo': 'leido',
+        'id_conversacion': int(id_conversacion),
+        'id_sucursal': id_sucursal,
+        'tipo_lector': tipo_lector,
+        'ultimo_leido': ultimo_leido
+    }))
+
+
+class DifusionChat:
+
+    def __init__(self, canal):
+        self.canal = canal
+        self._lock = threading.Lock()
+        self._suscriptores = {}      # (tipo, id) -> set(colas)
+        self._abiertos = 0
+        self._escucha = None
+
+    def abrir(self, claves, maximo):
+        """Registra un stream para las claves dadas. Devuelve su cola, o None si se alcanzó `maximo`"""
+        self._suscribir()
+        cola = queue.Queue(maxsize=EVENTOS_POR_STREAM)
+        with self._lock:
+            if self._abiertos >= maximo:
+                return None
+            self._abiertos += 1
+            for clave in claves:
+                self._suscriptores.setdefault(clave, set()).add(cola)
+        return cola
+
+    def cerrar(self, cola, claves):
+        with self._lock:
+            self._abiertos -= 1
+            for clave in claves:
+                colas = self._suscriptores.get(clave)
+                if colas is not None:
+                    colas.discard(cola)
+                    if not colas:
+                        del self._suscriptores[clave]
+
+    def _repartir(self, canal, payload):
+        if payload is None:
+            # La escucha se reconectó: pudieron perderse mensajes
+            with self._lock:
+                destinos = set().union(*self._suscriptores.values()) if self._suscriptores else set()
+            evento = EVENTO_RESYNC
+        else:
+            evento = json.loads(payload)
+            claves = [conversacion(evento['id_conversacion'])]
+            if evento.get('id_sucursal') is not None:
+                claves.append(sucursal(evento['id_sucursal']))
+            with self._lock:
+                destinos = set()
+                for clave in claves:
+                    destinos |= self._suscriptores.get(clave, set())
+
+        for cola in destinos:
+            try:
+                cola.put_nowait(evento)
+            except queue.Full:
+                # Cliente lento: se vacía su cola y se le pide recargar
+                try:
+                    while True:
+                        cola.get_nowait()
+                except queue.Empty:
+                    pass
+                cola.put_nowait(EVENTO_RESYNC)
+
+    def _suscribir(self):
+        # La escucha es por proceso: tras un fork hay que suscribirse de nuevo
+        escucha = obtener_escucha()
+        with self._lock:
+            if self._escucha is not escucha:
+                escucha.suscribir(self.canal, self._repartir)
+                self._escucha = escucha
+
+
+difusion_chat = DifusionChat(CANAL_CHAT)
@@ -0,0 +1,311 @@
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import psycopg2
+from config import Config
+from conexionBD import Conexion
+from tools.escucha_pg import obtener_escucha, notificar
+from tools.registro import fijar_id, restaurar_id
+
+# ==========================================
+# COLA DE TRABAJOS RESPALDADA EN POSTGRESQL (tabla "trabajo")
+# - encolar(): INSERT en la transacción del request + NOTIFY; si el request
+#   falla, el trabajo tampoco existe.
+# - WorkerTrabajos: proceso aparte (worker.py) que toma trabajos con
+#   FOR UPDATE SKIP LOCKED, reintenta con backoff exponencial y, agotados
+#   los intentos, los deja en estado 'muerto' para revisarlos y reintentarlos.
+# ==========================================
+
+log = logging.getLogger(__name__)
+
+CANAL_TRABAJOS = 'trabajo_nuevo'
+
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+COMPLETADO = 'completado'
+MUERTO = 'muerto'
+
+BACKOFF_BASE = 10       # segundos antes del primer reintento
+BACKOFF_MAXIMO = 3600
+
+SQL_TOMAR = """
+    UPDATE trabajo
+    SET estado = 'en_proceso',
+        intentos = intentos + 1,
+        tomado_en = now(),
+        tomado_por = %s
+    WHERE id_trabajo = (
+        SELECT id_trabajo
+        FROM trabajo
+        WHERE estado = 'pendiente' AND ejecutar_en <= now()
+        ORDER BY ejecutar_en, id_trabajo
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id_trabajo, tipo, payload, datos, intentos, max_intentos
+"""
+
+SQL_RECUPERAR_VENCIDOS = """
+    UPDATE trabajo
+    SET estado = CASE WHEN intentos >= max_intentos THEN 'muerto' ELSE 'pendiente' END,
+        fecha_fin = CASE WHEN intentos >= max_intentos THEN now() END,
+        ultimo_error = 'Tiempo de ejecución agotado (el worker no respondió)',
+        tomado_en = NULL,
+        tomado_por = NULL
+    WHERE estado = 'en_proceso'
+      AND tomado_en < now() - make_interval(secs => %s)
+    RETURNING id_trabajo, tipo, payload, estado
+"""
+
+_manejadores = {}
+_al_morir = {}
+_al_completar = {}
+
+
+class ErrorPermanente(Exception):
+    """Error que no se arregla reintentando: el trabajo pasa directo a 'muerto'"""
+
+
+def manejador(tipo, al_morir=None, al_completar=None):
+    """
+    Registra la función que ejecuta los trabajos de `tipo`: fn(payload, datos) -> dict | None.
+    al_morir(payload), opcional, deshace lo que el request dejó preparado
+    cuando el trabajo pasa a 'muerto' (error permanente o intentos agotados).
+    al_completar(cursor, payload, resultado), opcional, aplica el resultado en
+    la misma transacción que marca el trabajo como completado; no corre si
+    el trabajo ya no pertenece a este worker.
+    """
+    def registrar(funcion):
+        _manejadores[tipo] = funcion
+        if al_morir is not None:
+            _al_morir[tipo] = al_morir
+        if al_completar is not None:
+            _al_completar[tipo] = al_completar
+        return funcion
+    return registrar
+
+
+def _ejecutar_al_morir(id_trabajo, tipo, payload):
+    funcion = _al_morir.get(tipo)
+    if funcion is None:
+        return
+    try:
+        funcion(payload)
+    except Exception:
+        log.exception("Error al deshacer el trabajo muerto %s (%s)", id_trabajo, tipo)
+
+
+def encolar(tipo, payload=None, datos=None, max_intentos=None):
+    """
+    Inserta un trabajo y avisa a los workers. Dentro de un request usa la
+    transacción del request, así que solo se ejecuta si el request confirma.
+    Devuelve el id_trabajo.
+    """
+    con = Conexion().open
+    cursor = con.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO trabajo (tipo, payload, datos, max_intentos)
+            VALUES (%s, %s::jsonb, %s, %s)
+            RETURNING id_trabajo
+        """, [
+            tipo,
+            json.dumps(payload or {}, default=str),
+            psycopg2.Binary(datos) if datos is not None else None,
+            max_intentos or Config.TRABAJOS_MAX_INTENTOS
+        ])
+        id_trabajo = cursor.fetchone()['id_trabajo']
+        notificar(cursor, CANAL_TRABAJOS, tipo)
+        con.commit()
+        return id_trabajo
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        cursor.close()
+        con.close()
+
+
+def _backoff(intentos):
+    return min(BACKOFF_BASE * 2 ** (intentos - 1), BACKOFF_MAXIMO)
+
+
+class WorkerTrabajos:
+
+    def __init__(self, hilos=None):
+        self.nombre = f"{socket.gethostname()}:{os.getpid()}"
+        self.hilos = hilos or Config.TRABAJOS_HILOS
+        self._aviso = threading.Event()
+        self._detener = threading.Event()
+
+    def ejecutar(self):
+        """Bloquea hasta recibir SIGTERM/SIGINT; cada hilo termina su trabajo actual antes de salir"""
+        signal.signal(signal.SIGTERM, self._al_detener)
+        signal.signal(signal.SIGINT, self._al_detener)
+
+        obtener_escucha().suscribir(CANAL_TRABAJOS, lambda canal, payload: self._aviso.set())
+
+        log.info("Worker de trabajos %s con %d hilos (tipos: %s)",
+                 self.nombre, self.hilos, ', '.join(sorted(_manejadores)))
+
+        hilos = [threading.Thread(target=self._bucle, name=f'trabajos-{i}') for i in range(self.hilos)]
+        for hilo in hilos:
+            hilo.start()
+        while any(hilo.is_alive() for hilo in hilos):
+            for hilo in hilos:
+                hilo.join(timeout=1)
+        log.info("Worker de trabajos detenido")
+
+    def _al_detener(self, signum, frame):
+        log.info("Deteniendo worker de trabajos...")
+        self._detener.set()
+        self._aviso.set()
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                self._aviso.clear()
+                trabajo = self._tomar()
+                if trabajo is not None:
+                    self._procesar(trabajo)
+                    continue
+                self._recuperar_vencidos()
+            except Exception:
+                log.exception("Error en el bucle del worker")
+                self._detener.wait(Config.TRABAJOS_SONDEO)
+                continue
+            # Sin trabajos: esperar un NOTIFY (o sondear por si la escucha está caída)
+            self._aviso.wait(Config.TRABAJOS_SONDEO)
+
+    def _tomar(self):
+        con = Conexion().open
+        cursor = con.cursor()
+        try:
+            cursor.execute(SQL_TOMAR, [self.nombre])
+            trabajo = cursor.fetchone()
+            con.commit()
+            return trabajo
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            cursor.close()
+            con.close()
+
+    def _recuperar_vencidos(self):
+        con = Conexion().open
+        cursor = con.cursor()
+        try:
+            cursor.execute(SQL_RECUPERAR_VENCIDOS, [Config.TRABAJOS_VISIBILIDAD])
+            recuperados = cursor.fetchall()
+            con.commit()
+        finally:
+            cursor.close()
+            con.close()
+
+        if recuperados:
+            log.warning("Trabajos recuperados de workers caídos: %d", len(recuperados))
+        for trabajo in recuperados:
+            if trabajo['estado'] == MUERTO:
+                _ejecutar_al_morir(trabajo['id_trabajo'], trabajo['tipo'], trabajo['payload'])
+
+    def _procesar(self, trabajo):
+        # Todo lo que se registre mientras corre el trabajo lleva su id
+        token = fijar_id(f"trabajo-{trabajo['id_trabajo']}")
+        try:
+            self._ejecutar_trabajo(trabajo)
+        finally:
+            restaurar_id(token)
+
+    def _ejecutar_trabajo(self, trabajo):
+        id_trabajo, tipo = trabajo['id_trabajo'], trabajo['tipo']
+        funcion = _manejadores.get(tipo)
+        log.info("Trabajo %s (%s) intento %s/%s", id_trabajo, tipo, trabajo['intentos'], trabajo['max_intentos'])
+
+        try:
+            if funcion is None:
+                raise ErrorPermanente(f"Tipo de trabajo desconocido: {tipo}")
+            datos = bytes(trabajo['datos']) if trabajo['datos'] is not None else None
+            resultado = funcion(trabajo['payload'], datos)
+        except ErrorPermanente as e:
+            self._fallar(trabajo, str(e), permanente=True)
+        except Exception as e:
+            log.exception("Trabajo %s (%s) lanzó una excepción", id_trabajo, tipo)
+            self._fallar(trabajo, f"{type(e).__name__}: {str(e)}",
+                         permanente=False, espera=_backoff(trabajo['intentos']))
+        else:
+            try:
+                self._completar(trabajo, resultado)
+            except Exception as e:
+                log.exception("Trabajo %s (%s): no se pudo aplicar el resultado", id_trabajo, tipo)
+                self._fallar(trabajo, f"{type(e).__name__}: {str(e)}",
+                             permanente=False, espera=_backoff(trabajo['intentos']))
+
+    def _completar(self, trabajo, resultado):
+        """Marca el trabajo como completado si sigue siendo de este worker; devuelve si lo era"""
+        id_trabajo = trabajo['id_trabajo']
+        con = Conexion().open
+        cursor = con.cursor()
+        try:
+            # Los datos binarios ya no hacen falta una vez completado
+            cursor.execute("""
+                UPDATE trabajo
+                SET estado = 'completado', resultado = %s::jsonb, datos = NULL,
+                    ultimo_error = NULL, fecha_fin = now()
+                WHERE id_trabajo = %s AND tomado_por = %s AND estado = 'en_proceso'
+            """, [json.dumps(resultado, default=str) if resultado is not None else None,
+                  id_trabajo, self.nombre])
+            if cursor.rowcount == 0:
+                # Se venció y otro worker lo tomó (o ya lo resolvió): su estado manda
+                con.rollback()
+                log.warning("Trabajo %s ya no pertenece a %s; resultado descartado", id_trabajo, self.nombre)
+                return False
+
+            al_completar = _al_completar.get(trabajo['tipo'])
+            if al_completar is not None:
+                al_completar(cursor, trabajo['payload'], resultado)
+            con.commit()
+            log.info("Trabajo %s completado", id_trabajo)
+            return True
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            cursor.close()
+            con.close()
+
+    def _fallar(self, trabajo, error, permanente, espera=0):
+        id_trabajo = trabajo['id_trabajo']
+        con = Conexion().open
+        cursor = con.cursor()
+        try:
+            cursor.execute("""
+                UPDATE trabajo
+                SET estado = CASE WHEN %s OR intentos >= max_intentos THEN 'muerto' ELSE 'pendiente' END,
+                    fecha_fin = CASE WHEN %s OR intentos >= max_intentos THEN now() END,
+                    ejecutar_en = now() + make_interval(secs => %s),
+                    ultimo_error = %s,
+                    tomado_en = NULL,
+                    tomado_por = NULL
+                WHERE id_trabajo = %s AND tomado_por = %s AND estado = 'en_proceso'
+                RETURNING estado
+            """, [permanente, permanente, espera, error[:2000], id_trabajo, self.nombre])
+            fila = cursor.fetchone()
+            con.commit()
+        finally:
+            cursor.close()
+            con.close()
+
+        if fila is None:
+            log.warning("Trabajo %s ya no pertenece a %s; fallo descartado (%s)", id_trabajo, self.nombre, error)
+            return
+        estado = fila['estado']
+
+        if estado == MUERTO:
+            log.error("Trabajo %s movido a la cola de muertos: %s", id_trabajo, error)
+            _ejecutar_al_morir(id_trabajo, trabajo['tipo'], trabajo['payload'])
+        else:
+            log.warning("Trabajo %s falló (%s); reintento en %ss", id_trabajo, error, espera)
@@ -0,0 +1,122 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import request
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ==========================================
+# COMPRESIÓN DE RESPUESTAS
+# after_request que comprime con brotli o gzip según Accept-Encoding. No
+# toca respuestas en streaming (SSE del chat, exportaciones), ni archivos,
+# ni cuerpos menores a COMPRESION_MINIMO. Los bytes comprimidos se guardan
+# por ETag (o hash del cuerpo), así el catálogo repetido no se recomprime.
+# ==========================================
+
+TIPOS_COMPRIMIBLES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript'
+}
+
+# Sufijo del ETag por codificación: una representación comprimida es otra entidad
+SUFIJOS_ETAG = {
+    'br': '-br',
+    'gzip': '-gzip'
+}
+
+
+def variantes_etag(etag):
+    """El ETag base y sus variantes comprimidas (para comparar con If-None-Match)"""
+    return [etag] + [etag + sufijo for sufijo in SUFIJOS_ETAG.values()]
+
+
+def _comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=Config.COMPRESION_NIVEL_BROTLI)
+    # mtime=0: misma entrada, mismos bytes
+    return gzip.compress(datos, compresslevel=Config.COMPRESION_NIVEL_GZIP, mtime=0)
+
+
+class CacheComprimidos:
+    """LRU de cuerpos comprimidos acotado por tamaño total"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()    # (clave, codificacion) -> bytes
+        self._bytes = 0
+
+    def obtener(self, clave, codificacion, datos):
+        llave = (clave, codificacion)
+        with self._lock:
+            comprimido = self._entradas.get(llave)
+            if comprimido is not None:
+                self._entradas.move_to_end(llave)
+                return comprimido
+
+        comprimido = _comprimir(datos, codificacion)
+
+        maximo = Config.COMPRESION_CACHE_MB * 1024 * 1024
+        if len(comprimido) <= maximo:
+            with self._lock:
+                if llave not in self._entradas:
+                    self._entradas[llave] = comprimido
+                    self._bytes += len(comprimido)
+                while self._bytes > maximo:
+                    _, descartado = self._entradas.popitem(last=False)
+                    self._bytes -= len(descartado)
+        return comprimido
+
+
+comprimidos = CacheComprimidos()
+
+
+def _codificacion_aceptada():
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas.quality('br') > 0:
+        return 'br'
+    if aceptadas.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def comprimir_respuesta(response):
+    if (response.status_code != 200
+            or response.is_streamed
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in TIPOS_COMPRIMIBLES):
+        return response
+
+    datos = response.get_data()
+    if len(datos) < Config.COMPRESION_MINIMO:
+        return response
+
+    # La respuesta depende de Accept-Encoding aunque este cliente no comprima
+    response.vary.add('Accept-Encoding')
+
+    codificacion = _codificacion_aceptada()
+    if codificacion is None:
+        return response
+
+    etag, _ = response.get_etag()
+    clave = etag or hashlib.sha1(datos).hexdigest()
+
+    response.set_data(comprimidos.obtener(clave, codificacion, datos))
+    response.headers['Content-Encoding'] = codificacion
+    if etag:
+        response.set_etag(etag + SUFIJOS_ETAG[codificacion])
+    return response
+
+
+def registrar_compresion(app):
+    """Registrar antes que los demás after_request: Flask los corre en orden inverso y este debe ir al final"""
+    app.after_request(comprimir_respuesta)
@@ -0,0 +1,118 @@
+import logging
+import os
+import select
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+from conexionBD import conectar
+
+# ==========================================
+# LISTEN/NOTIFY DE POSTGRESQL
+# Un solo hilo por worker mantiene una conexión dedicada con LISTEN en todos
+# los canales suscritos y reparte cada NOTIFY a sus callbacks.
+# ==========================================
+
+log = logging.getLogger(__name__)
+
+
+class EscuchaPostgres(threading.Thread):
+
+    def __init__(self):
+        super().__init__(name='escucha-postgres', daemon=True)
+        self._suscripciones = {}     # canal -> [callback(canal, payload)]
+        self._lock = threading.Lock()
+        self._despertar_r, self._despertar_w = os.pipe()
+        self._pendientes = set()
+        self.conectado = False
+
+    def suscribir(self, canal, callback):
+        with self._lock:
+            self._suscripciones.setdefault(canal, []).append(callback)
+            self._pendientes.add(canal)
+        os.write(self._despertar_w, b'1')
+
+    def desuscribir(self, canal, callback):
+        with self._lock:
+            callbacks = self._suscripciones.get(canal, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def run(self):
+        espera = 1
+        while True:
+            con = None
+            try:
+                con = conectar()
+                con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = con.cursor()
+                with self._lock:
+                    self._pendientes = set(self._suscripciones)
+                self.conectado = True
+                espera = 1
+                # Al (re)conectar se pudieron perder avisos: payload None = "recargar todo"
+                self._repartir(None, None)
+
+                while True:
+                    self._escuchar_pendientes(cursor)
+                    listos, _, _ = select.select([con, self._despertar_r], [], [], 60)
+                    if not listos:
+                        cursor.execute("SELECT 1")
+                        continue
+                    if self._despertar_r in listos:
+                        os.read(self._despertar_r, 64)
+                    if con in listos:
+                        con.poll()
+                        while con.notifies:
+                            aviso = con.notifies.pop(0)
+                            self._repartir(aviso.channel, aviso.payload)
+            except Exception as e:
+                self.conectado = False
+                log.warning("Escucha Postgres desconectada: %s (reintento en %ss)", e, espera)
+                time.sleep(espera)
+                espera = min(espera * 2, 60)
+            finally:
+                if con is not None and not con.closed:
+                    con.close()
+
+    def _escuchar_pendientes(self, cursor):
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, set()
+        for canal in pendientes:
+            cursor.execute(f'LISTEN "{canal}"')
+
+    def _repartir(self, canal, payload):
+        with self._lock:
+            if canal is None:
+                destinos = [(c, cb) for c, cbs in self._suscripciones.items() for cb in cbs]
+            else:
+                destinos = [(canal, cb) for cb in self._suscripciones.get(canal, [])]
+        for canal_destino, callback in destinos:
+            try:
+                callback(canal_destino, payload)
+            except Exception:
+                log.exception("Error en callback de '%s'", canal_destino)
+
+
+_escucha = None
+_escucha_pid = None
+_escucha_lock = threading.Lock()
+
+
+def obtener_escucha():
+    """Hilo de escucha del proceso actual (se arranca al primer uso en cada worker)"""
+    global _escucha, _escucha_pid
+    pid = os.getpid()
+    if _escucha is not None and _escucha_pid == pid:
+        return _escucha
+    with _escucha_lock:
+        if _escucha is None or _escucha_pid != pid:
+            _escucha = EscuchaPostgres()
+            _escucha.start()
+            _escucha_pid = pid
+    return _escucha
+
+
+def notificar(cursor, canal, payload=''):
+    """Encola un NOTIFY en la transacción del cursor (se entrega solo si hay COMMIT)"""
+    cursor.execute("SELECT pg_notify(%s, %s)", [canal, payload])
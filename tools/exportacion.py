@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import threading
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Response
+from config import Config
+from conexionBD import conectar
+
+# ==========================================
+# EXPORTACIÓN EN STREAMING (CSV / NDJSON)
+# La consulta se abre como cursor de servidor (DECLARE ... CURSOR) en una
+# conexión dedicada (conectar(), fuera del pool y de la unidad de trabajo del
+# request), y las filas se traen de a FILAS_POR_LOTE mientras se van
+# escribiendo en la respuesta: la memoria del worker no crece con el tamaño
+# de la exportación. Una descarga lenta no retiene conexiones del pool; como
+# cada una ocupa una conexión a Postgres, a lo sumo EXPORTACIONES_MAXIMO
+# corren a la vez por worker.
+# ==========================================
+
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+FILAS_POR_LOTE = 2000
+
+_cupos = threading.BoundedSemaphore(Config.EXPORTACIONES_MAXIMO)
+
+
+class ExportacionesOcupadas(Exception):
+    """Ya hay EXPORTACIONES_MAXIMO exportaciones en curso en este worker"""
+
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, (list, dict)):
+        return json.dumps(valor, ensure_ascii=False)
+    return valor
+
+
+class ExportacionServidor:
+    """
+    Cursor de servidor listo para recorrer. Se ejecuta al crearlo, así un
+    error en la consulta se responde como 500 antes de empezar a enviar.
+    """
+
+    def __init__(self, sql, parametros=None):
+        self.columnas = None
+        self._con = None
+        if not _cupos.acquire(blocking=False):
+            raise ExportacionesOcupadas('Hay demasiadas exportaciones en curso, intenta en unos minutos')
+        self._cupo = True
+        try:
+            self._con = conectar()
+            self._con.set_session(readonly=True)
+            self._cursor = self._con.cursor(name=f"exportacion_{uuid.uuid4().hex}")
+            self._cursor.execute(sql, parametros or [])
+        except Exception:
+            self.cerrar()
+            raise
+
+    def lotes(self):
+        """Genera listas de filas (dicts); cierra la conexión al terminar"""
+        try:
+            while True:
+                filas = self._cursor.fetchmany(FILAS_POR_LOTE)
+                if self.columnas is None:
+                    # En un cursor de servidor la descripción llega con el primer FETCH
+                    self.columnas = [columna.name for columna in self._cursor.description or []]
+                if not filas:
+                    break
+                yield filas
+        finally:
+            self.cerrar()
+
+    def cerrar(self):
+        # Cerrar la conexión descarta la transacción y el cursor; se llama
+        # desde el generador y desde call_on_close, solo la primera vez cuenta
+        con, self._con = self._con, None
+        if con is not None:
+            con.close()
+        if self._cupo:
+            self._cupo = False
+            _cupos.release()
+
+
+def _generar_csv(exportacion):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # BOM para que Excel reconozca UTF-8
+    buffer.write('\ufeff')
+    encabezado = False
+
+    for filas in exportacion.lotes():
+        if not encabezado:
+            escritor.writerow(exportacion.columnas)
+            encabezado = True
+        for fila in filas:
+            escritor.writerow([_valor_csv(valor) for valor in fila.values()])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if not encabezado:
+        # Sin filas: solo el encabezado
+        escritor.writerow(exportacion.columnas)
+        yield buffer.getvalue()
+
+
+def _generar_ndjson(exportacion):
+    for filas in exportacion.lotes():
+        yield ''.join(
+            json.dumps(fila, ensure_ascii=False, default=_valor_json) + '\n'
+            for fila in filas
+        )
+
+
+def responder_exportacion(sql, parametros, formato, nombre_archivo):
+    """Response que envía el resultado de `sql` fila a fila en el formato pedido"""
+    exportacion = ExportacionServidor(sql, parametros)
+    generador = _generar_csv(exportacion) if formato == 'csv' else _generar_ndjson(exportacion)
+
+    response = Response(generador, mimetype=FORMATOS_EXPORTACION[formato])
+    response.headers['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{formato}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Si el cliente corta antes de empezar, el generador nunca corre su finally
+    response.call_on_close(exportacion.cerrar)
+    return response
@@ -0,0 +1,116 @@
+import dataclasses
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ==========================================
+# PROVEEDOR JSON DE LA APP
+# Serializa con orjson si está instalado (y con json de la stdlib si no),
+# entendiendo directamente lo que devuelve psycopg2: Decimal -> número,
+# datetime/date/time -> ISO 8601, UUID -> texto. Así los modelos pueden
+# entregar las filas sin convertir campo por campo.
+# Un datetime sin zona se toma como UTC (igual que el "GMT" que ponía el
+# proveedor por defecto de Flask) y sale con "Z": new Date() en el navegador
+# lo lee como UTC y no como hora local.
+# Se registra en app.py con: app.json = ProveedorJSONRapido(app)
+# respuesta_json_crudo() envuelve JSON que ya viene armado desde Postgres.
+# ==========================================
+
+
+def valor_json(valor):
+    """Tipos que ni orjson ni json saben serializar por sí solos"""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, datetime):
+        if valor.tzinfo is None or valor.utcoffset() == timedelta(0):
+            return valor.replace(tzinfo=None).isoformat() + 'Z'
+        return valor.isoformat()
+    if isinstance(valor, (date, time)):
+        return valor.isoformat()
+    if isinstance(valor, UUID):
+        return str(valor)
+    if dataclasses.is_dataclass(valor) and not isinstance(valor, type):
+        return dataclasses.asdict(valor)
+    if hasattr(valor, '__html__'):
+        return str(valor.__html__())
+    raise TypeError(f"Objeto de tipo {type(valor).__name__} no serializable a JSON")
+
+
+def _opciones_orjson(indent=None):
+    opciones = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+    if indent:
+        opciones |= orjson.OPT_INDENT_2
+    return opciones
+
+
+class ProveedorJSONRapido(DefaultJSONProvider):
+    # orjson no escapa a ASCII ni ordena claves; la stdlib se alinea con eso
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        # orjson solo admite formato compacto o indentado; otros argumentos van a la stdlib
+        if orjson is not None and not kwargs.keys() - {'indent', 'separators'}:
+            try:
+                return orjson.dumps(
+                    obj,
+                    default=valor_json,
+                    option=_opciones_orjson(kwargs.get('indent'))
+                ).decode('utf-8')
+            except TypeError:
+                # Enteros de más de 64 bits, etc.
+                pass
+        return json.dumps(obj, **self._argumentos_stdlib(kwargs))
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indentar = (self.compact is None and self._app.debug) or self.compact is False
+
+        if orjson is not None:
+            try:
+                # Bytes directo al Response, sin pasar por str
+                datos = orjson.dumps(
+                    obj,
+                    default=valor_json,
+                    option=_opciones_orjson(indentar) | orjson.OPT_APPEND_NEWLINE
+                )
+                return self._app.response_class(datos, mimetype=self.mimetype)
+            except TypeError:
+                pass
+
+        argumentos = {'indent': 2} if indentar else {'separators': (',', ':')}
+        texto = json.dumps(obj, **self._argumentos_stdlib(argumentos))
+        return self._app.response_class(f"{texto}\n", mimetype=self.mimetype)
+
+    def _argumentos_stdlib(self, kwargs):
+        kwargs = dict(kwargs)
+        kwargs.setdefault('default', valor_json)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return kwargs
+
+
+def respuesta_json_crudo(datos_json, message, status=True):
+    """
+    Respuesta con el sobre {'status', 'data', 'message'} alrededor de JSON ya
+    serializado (p. ej. el json_agg que devuelve Postgres), sin parsearlo
+    """
+    cuerpo = '{"status":%s,"data":%s,"message":%s}\n' % (
+        'true' if status else 'false',
+        datos_json,
+        current_app.json.dumps(message)
+    )
+    return current_app.response_class(cuerpo, mimetype='application/json')
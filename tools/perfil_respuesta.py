@@ -0,0 +1,52 @@
+from flask import request
+
+# ==========================================
+# PERFIL DE RESPUESTA NEGOCIADO POR EL CLIENTE
+# - Sin indicar nada: formato legado con todos los alias (idProducto, urlImg, ...)
+# - Header "X-Perfil-Respuesta: compacto" o ?perfil=compacto: solo nombres canónicos
+# - ?fields=id_prod_sucursal,nombre,precio: compacto y solo con esos campos
+# ==========================================
+
+HEADER_PERFIL = 'X-Perfil-Respuesta'
+PERFIL_COMPACTO = 'compacto'
+
+# Campos canónicos de un producto en los listados del catálogo
+CAMPOS_PRODUCTO = (
+    'id_prod_sucursal',
+    'id_temporada',
+    'id_prod_color',
+    'nombre',
+    'talla',
+    'material',
+    'url_img',
+    'genero',
+    'precio',
+    'stock',
+    'marca',
+    'categoria',
+    'color'
+)
+
+
+def campos_solicitados(campos_validos=CAMPOS_PRODUCTO):
+    """
+    Devuelve None si el cliente espera el formato legado, o la tupla de
+    campos canónicos a incluir (en el orden de `campos_validos`).
+    """
+    fields = request.args.get('fields')
+    if fields:
+        pedidos = {campo.strip() for campo in fields.split(',')}
+        campos = tuple(campo for campo in campos_validos if campo in pedidos)
+        return campos or campos_validos
+
+    perfil = request.args.get('perfil') or request.headers.get(HEADER_PERFIL, '')
+    if perfil.lower() == PERFIL_COMPACTO:
+        return campos_validos
+    return None
+
+
+def recortar(productos, campos, campos_validos=CAMPOS_PRODUCTO):
+    """Aplica el sparse fieldset sobre diccionarios canónicos"""
+    if campos == campos_validos:
+        return productos
+    return [{campo: producto[campo] for campo in campos} for producto in productos]
@@ -0,0 +1,139 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+from flask import g, request
+from config import Config
+
+# ==========================================
+# REGISTRO (LOGGING) DE LA APLICACIÓN
+# Cada módulo usa su propio logger:
+#     log = logging.getLogger(__name__)
+# Los registros pasan por una cola en memoria y un hilo aparte los escribe en
+# stdout, así el request no espera la escritura. Cada línea lleva el id del
+# request (header X-Request-ID, o uno generado) para correlacionar.
+# Nivel con LOG_NIVEL (INFO en producción: los log.debug por fila no se
+# formatean ni se encolan). LOG_FORMATO=json para una línea JSON por registro.
+# ==========================================
+
+HEADER_ID_REQUEST = 'X-Request-ID'
+
+_id_contexto = contextvars.ContextVar('id_registro', default='-')
+
+_listener = None
+_manejador_cola = None
+
+
+class FiltroIdRequest(logging.Filter):
+    """Agrega el id de correlación al registro en el hilo que lo emite"""
+
+    def filter(self, record):
+        record.id_request = _id_contexto.get()
+        return True
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (y cuenta) si la cola está llena en vez de bloquear"""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        registro = {
+            'fecha': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'id_request': getattr(record, 'id_request', '-'),
+            'mensaje': record.getMessage()
+        }
+        return json.dumps(registro, ensure_ascii=False)
+
+
+def _formateador():
+    if Config.LOG_FORMATO == 'json':
+        return FormatoJSON()
+    return logging.Formatter('%(asctime)s %(levelname)s [%(id_request)s] %(name)s: %(message)s')
+
+
+def _iniciar_listener():
+    global _listener
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(_formateador())
+    _listener = logging.handlers.QueueListener(_manejador_cola.queue, salida, respect_handler_level=False)
+    _listener.start()
+
+
+def _detener_listener():
+    # Vacía la cola antes de salir para no perder los últimos registros
+    if _listener is not None:
+        _listener.stop()
+
+
+def configurar_registro():
+    """Instala la cola y el hilo escritor en el logger raíz (una vez por proceso)"""
+    global _manejador_cola
+    if _manejador_cola is not None:
+        return
+
+    _manejador_cola = ManejadorCola(queue.Queue(maxsize=Config.LOG_COLA_MAXIMO))
+    _manejador_cola.addFilter(FiltroIdRequest())
+
+    raiz = logging.getLogger()
+    raiz.handlers[:] = [_manejador_cola]
+    raiz.setLevel(Config.LOG_NIVEL)
+
+    _iniciar_listener()
+    atexit.register(_detener_listener)
+    # Un proceso hijo no hereda el hilo escritor: se arranca uno nuevo
+    os.register_at_fork(after_in_child=_iniciar_listener)
+
+
+def fijar_id(id_registro):
+    """Id de correlación para lo que se registre en este contexto (request o trabajo)"""
+    return _id_contexto.set(id_registro)
+
+
+def restaurar_id(token):
+    _id_contexto.reset(token)
+
+
+def registrar_id_request(app):
+    """Asigna el id de cada request y lo devuelve en el header X-Request-ID"""
+
+    @app.before_request
+    def asignar_id_request():
+        # El id del cliente/proxy se acota: termina en cada línea del log
+        id_request = (request.headers.get(HEADER_ID_REQUEST) or uuid.uuid4().hex[:16])[:64]
+        g.id_request = id_request
+        g.token_id_request = fijar_id(id_request)
+
+    @app.after_request
+    def devolver_id_request(response):
+        id_request = g.get('id_request')
+        if id_request:
+            response.headers[HEADER_ID_REQUEST] = id_request
+        return response
+
+    @app.teardown_request
+    def limpiar_id_request(exc):
+        token = g.pop('token_id_request', None)
+        if token is not None:
+            try:
+                restaurar_id(token)
+            except ValueError:
+                # El teardown corrió en otro contexto: el del request ya no existe
+                pass
@@ -0,0 +1,105 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+from flask import g, request, has_request_context
+from tools.perfil_respuesta import recortar, CAMPOS_PRODUCTO
+
+# ==========================================
+# SERIALIZADOR ÚNICO DE FILAS DE PRODUCTO
+# Lo usan todos los endpoints del catálogo (listado, paginado, por temporada,
+# relacionados y detalle). El tipo de cliente se resuelve una vez por request
+# y las URLs absolutas de imagen quedan memorizadas.
+# ==========================================
+
+Cliente = namedtuple('Cliente', ['is_android', 'base_url'])
+
+# ✅ BASE_URL SEGÚN ENTORNO (el entorno no cambia en caliente: se evalúa al importar)
+if os.environ.get('RENDER'):
+    BASE_URL_ANDROID = "https://usat-comercial-api.onrender.com"
+else:
+    BASE_URL_ANDROID = "http://10.0.2.2:3007"
+
+CLIENTE_WEB = Cliente(False, "")
+CLIENTE_ANDROID = Cliente(True, BASE_URL_ANDROID)
+
+# Los relacionados no incluyen la temporada
+CAMPOS_RELACIONADOS = tuple(c for c in CAMPOS_PRODUCTO if c != 'id_temporada')
+
+# Alias del formato legado: (alias, campo canónico)
+ALIAS_LISTADO = (
+    ('idProducto', 'id_prod_sucursal'),
+    ('idProdColor', 'id_prod_color'),
+    ('nombreProducto', 'nombre'),
+    ('urlImg', 'url_img'),
+    ('imagen', 'url_img'),
+    ('nombreCategoria', 'categoria')
+)
+ALIAS_RELACIONADOS = (('idProdSucursal', 'id_prod_sucursal'),) + ALIAS_LISTADO
+
+
+def cliente_actual():
+    """Tipo de cliente del request (Android necesita URLs absolutas)"""
+    if not has_request_context():
+        return CLIENTE_WEB
+    cliente = g.get('cliente_catalogo')
+    if cliente is None:
+        user_agent = request.headers.get('User-Agent', '').lower()
+        is_android = 'okhttp' in user_agent or 'android' in user_agent
+        cliente = CLIENTE_ANDROID if is_android else CLIENTE_WEB
+        g.cliente_catalogo = cliente
+    return cliente
+
+
+@lru_cache(maxsize=16384)
+def _url_absoluta(url_img, base_url):
+    if url_img.startswith('http'):
+        return url_img
+    if not url_img.startswith('/'):
+        url_img = '/' + url_img
+    return base_url + url_img
+
+
+def url_imagen(url_img, cliente):
+    """URL de imagen lista para el cliente (solo Android recibe la URL completa)"""
+    if not url_img:
+        return ''
+    if not cliente.is_android:
+        return url_img
+    return _url_absoluta(url_img, cliente.base_url)
+
+
+def _canonico(row, cliente):
+    return {
+        "id_prod_sucursal": row['id_prod_sucursal'],
+        "id_temporada": row['id_temporada'],
+        "id_prod_color": row['id_prod_color'] if row['id_prod_color'] else None,
+        "nombre": row['nombre'],
+        "talla": row['talla'] if row['talla'] else '',
+        "material": row['material'] if row['material'] else '',
+        "url_img": url_imagen(row['url_img'], cliente),
+        "genero": row['genero'] if row['genero'] else 'Sin definir',
+        "precio": float(row['precio']) if row['precio'] else 0.0,
+        "stock": row['stock'] if row['stock'] else 0,
+        "marca": row['marca'] if row['marca'] else '',
+        "categoria": row['categoria'] if row['categoria'] else '',
+        "color": row['color'] if row['color'] else 'Sin color'
+    }
+
+
+def serializar_listado(filas, cliente, campos=None, campos_endpoint=CAMPOS_PRODUCTO, aliases=ALIAS_LISTADO):
+    """
+    Convierte filas del catálogo. Con `campos` (perfil compacto) devuelve solo esos
+    nombres canónicos; sin `campos` devuelve los del endpoint más los alias legados.
+    """
+    productos = [_canonico(row, cliente) for row in filas]
+
+    if campos is not None:
+        return recortar(productos, campos)
+
+    sobrantes = [c for c in CAMPOS_PRODUCTO if c not in campos_endpoint]
+    for producto in productos:
+        for campo in sobrantes:
+            del producto[campo]
+        for alias, campo in aliases:
+            producto[alias] = producto[campo]
+    return productos
@@ -0,0 +1,263 @@
+import io
+import logging
+import uuid
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+import cloudinary.exceptions
+from psycopg2 import sql
+import firebase.fcm as fcm
+from config import Config
+from conexionBD import Conexion
+from models.venta import Venta, CUPON_YA_USADO
+from tools.cola_trabajos import manejador, encolar, ErrorPermanente
+
+# ==========================================
+# TIPOS DE TRABAJO EN SEGUNDO PLANO
+# Las funciones públicas las usan las rutas para encolar; las marcadas con
+# @manejador las ejecuta el proceso worker (worker.py).
+# ==========================================
+
+log = logging.getLogger(__name__)
+
+SUBIR_IMAGEN = 'subir_imagen'
+NOTIFICACION_PUSH = 'notificacion_push'
+POST_VENTA = 'post_venta'
+
+AUDIENCIA_USUARIOS_ACTIVOS = 'usuarios_activos'
+
+
+# ------------------------------------------
+# Imágenes en Cloudinary
+# ------------------------------------------
+
+# Carpeta de Cloudinary -> (tabla, columna) donde la ruta guarda la URL
+DESTINOS_IMAGEN = {
+    'empresas/logos': ('empresa', 'img_logo'),
+    'empresas/banners': ('empresa', 'img_banner'),
+    'sucursales/logos': ('sucursal', 'img_logo'),
+    'sucursales/banners': ('sucursal', 'img_banner'),
+    'usuarios': ('usuario', 'img_logo'),
+    'productos': ('producto_color', 'url_img'),
+    'categorias': ('categoria_producto', 'img')
+}
+
+
+def _formato_imagen(datos):
+    """Formato según los primeros bytes (no según la extensión que manda el cliente)"""
+    if datos.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if datos.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if datos.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if datos[:4] == b'RIFF' and datos[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def subir_a_cloudinary(file, folder):
+    """
+    Valida la imagen, encola su subida y devuelve de inmediato la URL
+    provisional (el public_id se genera aquí). La ruta guarda esa URL; el
+    worker la reemplaza por el secure_url al subir, o deja la columna en NULL
+    si Cloudinary la rechaza o se agotan los intentos.
+
+    Args:
+        file: Archivo de Flask (request.files)
+        folder: Carpeta en Cloudinary (ej: 'sucursales/logos')
+
+    Returns:
+        str: URL provisional de Cloudinary o None si no es una imagen válida o falla
+    """
+    try:
+        if not file:
+            return None
+
+        datos = file.read()
+        if not datos:
+            return None
+
+        if len(datos) > Config.IMAGEN_MAX_MB * 1024 * 1024:
+            log.warning("Imagen rechazada por tamaño (%d bytes): %s", len(datos), file.filename)
+            return None
+
+        formato = _formato_imagen(datos)
+        if formato is None:
+            log.warning("Archivo rechazado, no es PNG/JPEG/GIF/WEBP: %s", file.filename)
+            return None
+
+        public_id = f"centro_comercial/{folder}/{uuid.uuid4().hex}"
+        url, _ = cloudinary.utils.cloudinary_url(public_id, resource_type='image', secure=True)
+        id_trabajo = encolar(SUBIR_IMAGEN, {
+            'public_id': public_id,
+            'archivo': file.filename,
+            'carpeta': folder,
+            'url_provisional': url
+        }, datos=datos)
+
+        log.info("Subida a Cloudinary encolada (trabajo %s): %s (%s) -> %s", id_trabajo, file.filename, formato, url)
+        return url
+
+    except Exception:
+        log.exception("Error al encolar subida a Cloudinary")
+        return None
+
+
+def _actualizar_url_provisional(cursor, payload, url):
+    """Cambia la URL provisional por `url` (None la borra) donde la ruta la haya guardado"""
+    destino = DESTINOS_IMAGEN.get(payload.get('carpeta'))
+    if destino is None or not payload.get('url_provisional'):
+        return 0
+
+    tabla, columna = destino
+    # Si la imagen ya se cambió por otra, la URL provisional no aparece y no se toca nada
+    cursor.execute(sql.SQL("UPDATE {tabla} SET {columna} = %s WHERE {columna} = %s").format(
+        tabla=sql.Identifier(tabla),
+        columna=sql.Identifier(columna)
+    ), [url, payload['url_provisional']])
+    return cursor.rowcount
+
+
+def _reemplazar_url_provisional(payload, url):
+    """_actualizar_url_provisional en su propia transacción"""
+    con = Conexion().open
+    try:
+        cursor = con.cursor()
+        filas = _actualizar_url_provisional(cursor, payload, url)
+        con.commit()
+        cursor.close()
+        return filas
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+
+def _descartar_imagen(payload):
+    filas = _reemplazar_url_provisional(payload, None)
+    log.warning("Subida de %s fallida: URL provisional borrada en %d fila(s)", payload.get('archivo'), filas)
+
+
+def _confirmar_imagen(cursor, payload, resultado):
+    # Junto con el 'completado': un worker que perdió el trabajo no toca la URL
+    filas = _actualizar_url_provisional(cursor, payload, resultado['secure_url'])
+    log.info("Subida de %s lista: URL definitiva en %d fila(s)", payload.get('archivo'), filas)
+
+
+@manejador(SUBIR_IMAGEN, al_morir=_descartar_imagen, al_completar=_confirmar_imagen)
+def _subir_imagen(payload, datos):
+    if not datos:
+        raise ErrorPermanente('El trabajo no contiene la imagen')
+    try:
+        resultado = cloudinary.uploader.upload(
+            io.BytesIO(datos),
+            public_id=payload['public_id'],
+            resource_type='image',
+            overwrite=True,
+            invalidate=True
+        )
+    except cloudinary.exceptions.BadRequest as e:
+        # Archivo inválido o rechazado: reintentar no sirve
+        raise ErrorPermanente(f"Cloudinary rechazó la imagen: {str(e)}")
+
+    return {'secure_url': resultado['secure_url'], 'bytes': resultado.get('bytes')}
+
+
+# ------------------------------------------
+# Notificaciones push
+# ------------------------------------------
+
+def encolar_notificacion(titulo, cuerpo, audiencia=AUDIENCIA_USUARIOS_ACTIVOS, id_usuario=None):
+    """Encola una notificación para todos los usuarios activos o para un usuario"""
+    payload = {'titulo': titulo, 'cuerpo': cuerpo}
+    if id_usuario is not None:
+        payload['id_usuario'] = id_usuario
+    else:
+        payload['audiencia'] = audiencia
+    return encolar(NOTIFICACION_PUSH, payload)
+
+
+def _tokens_destino(payload):
+    con = Conexion().open
+    cursor = con.cursor()
+    try:
+        if payload.get('id_usuario') is not None:
+            cursor.execute("""
+                SELECT DISTINCT token FROM usuario_fcm
+                WHERE id_usuario = %s AND estado = TRUE
+            """, [payload['id_usuario']])
+        elif payload.get('audiencia') == AUDIENCIA_USUARIOS_ACTIVOS:
+            cursor.execute("""
+                SELECT DISTINCT uf.token
+                FROM usuario_fcm uf
+                INNER JOIN usuario u ON uf.id_usuario = u.id_usuario
+                WHERE uf.estado = TRUE AND u.estado = TRUE
+            """)
+        else:
+            raise ErrorPermanente(f"Audiencia no soportada: {payload.get('audiencia')}")
+        return [row['token'] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        con.close()
+
+
+def desactivar_tokens_no_registrados(resultados):
+    """Marca como inactivos los tokens que FCM ya no reconoce"""
+    tokens = resultados.get('no_registrados')
+    if not tokens:
+        return 0
+
+    con = Conexion().open
+    try:
+        cursor = con.cursor()
+        cursor.execute("""
+            UPDATE usuario_fcm SET estado = FALSE
+            WHERE token = ANY(%s) AND estado = TRUE
+        """, [tokens])
+        desactivados = cursor.rowcount
+        con.commit()
+        cursor.close()
+        log.info("Tokens FCM desactivados: %d", desactivados)
+        return desactivados
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+
+@manejador(NOTIFICACION_PUSH)
+def _notificacion_push(payload, datos):
+    tokens = _tokens_destino(payload)
+    if not tokens:
+        return {'destinatarios': 0}
+
+    resultados = fcm.obtener_cliente().enviar_lote(tokens, payload['titulo'], payload['cuerpo'])
+    desactivados = desactivar_tokens_no_registrados(resultados)
+
+    # Solo se reintenta si FCM no aceptó nada (caído); un reintento parcial duplicaría avisos
+    if resultados['exitosos'] == 0 and resultados['fallidos'] > len(resultados['no_registrados']):
+        raise RuntimeError(f"FCM no aceptó ninguna de las {len(tokens)} notificaciones")
+
+    return {
+        'destinatarios': len(tokens),
+        'exitosos': resultados['exitosos'],
+        'fallidos': resultados['fallidos'],
+        'tokens_desactivados': desactivados
+    }
+
+
+# ------------------------------------------
+# Tareas posteriores a la compra
+# ------------------------------------------
+
+@manejador(POST_VENTA)
+def _post_venta(payload, datos):
+    # El cupón ya se registra en la transacción de la compra; esto solo
+    # termina los trabajos que quedaron encolados antes de ese cambio
+    exito, mensaje = Venta().registrar_uso_cupon(payload['id_cupon'], payload['id_usuario'], payload['id_venta_cupon'])
+    if not exito and mensaje != CUPON_YA_USADO:
+        raise RuntimeError(mensaje)
+    return {'cupon': mensaje}
@@ -0,0 +1,15 @@
+from config import Config
+from tools.cola_trabajos import WorkerTrabajos
+from tools.registro import configurar_registro
+import tools.trabajos  # registra los manejadores de cada tipo de trabajo
+
+# ==========================================
+# PROCESO DE TRABAJOS EN SEGUNDO PLANO
+# Procfile: "worker: python worker.py"
+# Requiere sql/002_cola_trabajos.sql aplicado en la base de datos.
+# ==========================================
+
+if __name__ == '__main__':
+    configurar_registro()
+    Config.print_config()
+    WorkerTrabajos().ejecutar()